@@ -0,0 +1,192 @@
+"""
+Bulk import and export of inventory items as CSV or NDJSON.
+
+Both directions stream: imports read the body one row at a time and write
+every INVENTORY_IMPORT_BATCH_SIZE rows with one unordered bulk_write, and
+exports iterate a MongoDB cursor, so memory use does not grow with the size of
+the catalog.
+
+Items are keyed by (name, location), with a unique index and "" for no
+location (see models/InventoryItem.py). An imported row updates the item with
+that name and location, or creates it, and only sets the columns the row
+provides. reserved_quantity is exported but never imported: it is owned by
+the reservations (see agent/inventory_reservations.py).
+"""
+import io
+import os
+import csv
+import json
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models.InventoryItem import InventoryItem
+from .inventory_index import index as inventory_index
+
+IMPORT_BATCH_SIZE = int(os.getenv("INVENTORY_IMPORT_BATCH_SIZE", "1000"))
+# Row errors listed in an import summary; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+DUPLICATE_KEY = 11000
+
+EXPORT_FIELDS = ["name", "location", "quantity", "reserved_quantity", "cost", "reserved"]
+FORMATS = ("csv", "ndjson")
+
+TRUE_VALUES = {"true", "1", "yes", "y"}
+FALSE_VALUES = {"false", "0", "no", "n", ""}
+
+
+def read_csv(stream):
+    """Rows of a CSV byte stream with a header line, as (line number, dict)"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(stream):
+    """Rows of an NDJSON byte stream, as (line number, dict or error string)"""
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, "Invalid JSON"
+
+
+def parse_row(row):
+    """
+    Validate an imported row.
+
+    Returns:
+        (fields to set, error message); fields is None when the row is invalid
+    """
+    if isinstance(row, str):
+        return None, row
+    if not isinstance(row, dict):
+        return None, "Row must be an object"
+    # CSV cells are strings and a blank cell means the column is not set
+    row = {key: value for key, value in row.items() if key and value not in (None, "")}
+
+    name = str(row.get("name", "")).strip()
+    if not name:
+        return None, "name is required"
+    fields = {"name": name, "location": str(row.get("location", "")).strip()}
+
+    if "quantity" in row:
+        try:
+            quantity = int(row["quantity"])
+        except (TypeError, ValueError):
+            return None, "quantity must be a whole number"
+        if quantity < 0:
+            return None, "quantity cannot be negative"
+        fields["quantity"] = quantity
+    if "cost" in row:
+        fields["cost"] = str(row["cost"]).strip()
+    if "reserved" in row:
+        reserved = row["reserved"]
+        if isinstance(reserved, str):
+            if reserved.strip().lower() not in TRUE_VALUES | FALSE_VALUES:
+                return None, "reserved must be true or false"
+            reserved = reserved.strip().lower() in TRUE_VALUES
+        fields["reserved"] = bool(reserved)
+    return fields, None
+
+
+def _write_batch(batch, summary):
+    """Upsert one batch of {(name, location): (line number, fields)}"""
+    now = datetime.now(timezone.utc)
+    lines = []
+    operations = []
+    for (name, location), (line_number, fields) in batch.items():
+        lines.append(line_number)
+        operations.append(UpdateOne(
+            {"name": name, "location": location},
+            {
+                "$set": {**fields, "updated_at": now},
+                "$setOnInsert": {"reserved_quantity": 0},
+            },
+            upsert=True,
+        ))
+    try:
+        result = InventoryItem._get_collection().bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Unordered: the other rows of the batch were still written
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") == DUPLICATE_KEY:
+                # Two upserts of a new (name, location) raced; the other one created it
+                summary["conflicts"] += 1
+                message = "Another item with this name and location was created at the same time; import the row again"
+            else:
+                message = error.get("errmsg", "Write failed")
+            _add_error(summary, lines[error["index"]], message)
+        summary["created"] += e.details.get("nUpserted", 0)
+        summary["updated"] += e.details.get("nMatched", 0)
+        return
+    summary["created"] += result.upserted_count
+    summary["updated"] += result.matched_count
+
+
+def _add_error(summary, line_number, error):
+    summary["failed"] += 1
+    if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+        summary["errors"].append({"line": line_number, "error": error})
+
+
+def import_items(rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Upsert (line number, row) pairs in batches keyed by name and location.
+
+    Within a batch a later row for the same item wins. Rows are consumed
+    lazily, so a generator over a request body is never held in memory.
+
+    Returns:
+        Summary dict: rows, created, updated, failed, conflicts (failed on the
+        unique name and location), errors (first MAX_REPORTED_ERRORS)
+    """
+    summary = {"rows": 0, "created": 0, "updated": 0, "failed": 0, "conflicts": 0, "errors": []}
+    batch = {}
+    for line_number, row in rows:
+        summary["rows"] += 1
+        fields, error = parse_row(row)
+        if error:
+            _add_error(summary, line_number, error)
+            continue
+        key = (fields["name"], fields["location"])
+        if key in batch:
+            # Merge so columns set only by the earlier row are kept
+            fields = {**batch.pop(key)[1], **fields}
+        batch[key] = (line_number, fields)
+        if len(batch) >= batch_size:
+            _write_batch(batch, summary)
+            batch = {}
+    if batch:
+        _write_batch(batch, summary)
+
+    # Bulk writes bypass the save signals; pick the rows up by updated_at
+    inventory_index.refresh()
+    return summary
+
+
+def export_items(fmt="csv"):
+    """Generate an export of every item, one CSV/NDJSON line at a time"""
+    items = InventoryItem.objects.only(*EXPORT_FIELDS).order_by('name', 'location').as_pymongo()
+    if fmt == "ndjson":
+        for doc in items:
+            yield json.dumps({field: doc.get(field, _default(field)) for field in EXPORT_FIELDS}) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for doc in items:
+        writer.writerow([doc.get(field, _default(field)) for field in EXPORT_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header of an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _default(field):
+    return {"quantity": 0, "reserved_quantity": 0, "reserved": False}.get(field, "")
@@ -0,0 +1,298 @@
+"""
+In-memory fuzzy search index over inventory names and locations.
+
+Names and locations are broken into padded character trigrams with postings
+from each trigram to the item ids, so a lookup touches only the items sharing
+trigrams with the query instead of running a case-insensitive regex over the
+whole collection. Near-matches rank too: "A100" finds
+"NVIDIA A100 GPU", and "Storage Rm B" finds "Storage Room B".
+
+Matches are scored by the fraction of the query's trigrams the field
+contains (exact substrings score highest), with a small bonus for query
+words that prefix a field word; items containing less than
+INVENTORY_SEARCH_MIN_SCORE of the trigrams are not matches. Only the
+postings of the rarest query trigrams are scanned for candidates, and ranked
+results are kept for repeated queries until the index changes. MongoDB is
+only used to hydrate the matching ids.
+
+The index is built on first use, updated on every InventoryItem save/delete
+in this process (mongoengine signals), picks up writes made elsewhere by
+reading items with a newer updated_at every INVENTORY_INDEX_REFRESH_SECONDS,
+and is rebuilt from scratch every INVENTORY_INDEX_REBUILD_SECONDS.
+Fuzzy ranking is for lookups only; writes pick their item with
+exact_matches(), which never accepts a near-miss.
+
+Queryset writes that change a name or location must call index_item(), and
+bulk writes refresh().
+"""
+import os
+import re
+import math
+import time
+import threading
+from collections import OrderedDict
+from datetime import timezone
+from mongoengine import signals
+from models.InventoryItem import InventoryItem
+
+MIN_SCORE = float(os.getenv("INVENTORY_SEARCH_MIN_SCORE", "0.5"))
+REFRESH_SECONDS = float(os.getenv("INVENTORY_INDEX_REFRESH_SECONDS", "5"))
+REBUILD_SECONDS = float(os.getenv("INVENTORY_INDEX_REBUILD_SECONDS", "600"))
+RESULT_CACHE_SIZE = int(os.getenv("INVENTORY_SEARCH_CACHE_SIZE", "1024"))
+
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    return NON_ALNUM.sub(" ", (text or "").lower()).strip()
+
+
+def tokens(text):
+    return normalize(text).split()
+
+
+def trigrams(text):
+    grams = set()
+    for token in tokens(text):
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class _FieldIndex:
+    """Trigram postings for one text field"""
+
+    def __init__(self):
+        self.postings = {}
+        self.values = {}
+
+    def add(self, item_id, text):
+        self.remove(item_id)
+        grams = trigrams(text)
+        # Leading space so word starts can be found with a substring test
+        self.values[item_id] = (" " + normalize(text), grams)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(item_id)
+
+    def remove(self, item_id):
+        value = self.values.pop(item_id, None)
+        if value is None:
+            return
+        for gram in value[1]:
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def scores(self, query):
+        """
+        Item id -> score for every item containing at least MIN_SCORE of the query's trigrams.
+
+        Scores are the contained fraction of trigrams (1 for an exact
+        substring) plus up to 0.1 for query words that prefix a field word.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return {}
+        needed = max(1, math.ceil(MIN_SCORE * len(query_grams)))
+        # A match contains `needed` of the query trigrams, so it is in the
+        # postings of at least one of the len - needed + 1 rarest ones
+        rarest = sorted(query_grams, key=lambda gram: len(self.postings.get(gram, ())))
+        candidates = set()
+        for gram in rarest[:len(query_grams) - needed + 1]:
+            candidates.update(self.postings.get(gram, ()))
+
+        query_text = normalize(query)
+        # " token" inside " text" means the token starts a word of the text
+        word_starts = [" " + token for token in tokens(query)]
+        total = len(query_grams)
+        results = {}
+        for item_id in candidates:
+            text, grams = self.values[item_id]
+            count = len(query_grams & grams)
+            if count < needed:
+                continue
+            score = 1.0 if count == total and query_text in text else count / total
+            prefixed = sum(1 for start in word_starts if start in text)
+            results[item_id] = score + 0.1 * prefixed / len(word_starts)
+        return results
+
+    def containing(self, query):
+        """Ids of the items whose text contains every word of the query, in order, as whole words"""
+        query_grams = trigrams(query)
+        if not query_grams:
+            return set()
+        rarest = min(query_grams, key=lambda gram: len(self.postings.get(gram, ())))
+        phrase = f" {normalize(query)} "
+        return {
+            item_id for item_id in self.postings.get(rarest, ())
+            if phrase in self.values[item_id][0] + " "
+        }
+
+
+class InventoryIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self._built_at = None
+        self._refreshed_at = 0.0
+
+    def _reset(self):
+        self._names = _FieldIndex()
+        self._locations = _FieldIndex()
+        self._items = {}
+        self._synced_until = None
+        # Ranked results of recent searches, dropped whenever the index changes
+        self._results = OrderedDict()
+
+    def _add(self, doc):
+        updated_at = doc.get("updated_at")
+        if updated_at is not None and updated_at.tzinfo is not None:
+            # Stored as naive UTC, like the values read back from MongoDB
+            updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+        if updated_at is not None and (self._synced_until is None or updated_at > self._synced_until):
+            self._synced_until = updated_at
+
+        item_id = doc["_id"]
+        fields = (doc.get("name") or "", doc.get("location") or "")
+        if self._items.get(item_id) == fields:
+            return
+        self._items[item_id] = fields
+        self._names.add(item_id, fields[0])
+        self._locations.add(item_id, fields[1])
+        self._results.clear()
+
+    def build(self):
+        """Load every inventory item into a fresh index"""
+        docs = list(InventoryItem.objects.only('id', 'name', 'location', 'updated_at').as_pymongo())
+        with self._lock:
+            self._reset()
+            for doc in docs:
+                self._add(doc)
+            self._built_at = self._refreshed_at = time.monotonic()
+        print(f"[INVENTORY INDEX] Indexed {len(docs)} items")
+
+    def refresh(self):
+        """Index items written since the last sync (e.g. by another process)"""
+        with self._lock:
+            if self._built_at is None:
+                # Nothing to bring up to date; the first search builds the index
+                return
+            since = self._synced_until
+        items = InventoryItem.objects.only('id', 'name', 'location', 'updated_at')
+        if since is not None:
+            # Inclusive: several writes can share a timestamp
+            items = items.filter(updated_at__gte=since)
+        docs = list(items.as_pymongo())
+        with self._lock:
+            for doc in docs:
+                self._add(doc)
+            self._refreshed_at = time.monotonic()
+
+    def _ensure_current(self):
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at >= REBUILD_SECONDS:
+            self.build()
+        elif now - self._refreshed_at >= REFRESH_SECONDS:
+            self.refresh()
+
+    def upsert(self, item_id, name, location, updated_at=None):
+        with self._lock:
+            if self._built_at is not None:
+                self._add({"_id": item_id, "name": name, "location": location, "updated_at": updated_at})
+
+    def remove(self, item_id):
+        with self._lock:
+            if self._items.pop(item_id, None) is not None:
+                self._names.remove(item_id)
+                self._locations.remove(item_id)
+                self._results.clear()
+
+    def search(self, query=None, location=None, limit=None):
+        """
+        Ranked ids of the items matching a name query and/or a location.
+
+        Returns:
+            List of ObjectIds, best match first, or None if neither filter was given
+        """
+        if not query and not location:
+            return None
+        self._ensure_current()
+        key = (normalize(query), normalize(location))
+        with self._lock:
+            ranked = self._results.get(key)
+            if ranked is None:
+                ranked = self._rank(query, location)
+                self._results[key] = ranked
+                if len(self._results) > RESULT_CACHE_SIZE:
+                    self._results.popitem(last=False)
+            else:
+                self._results.move_to_end(key)
+        return ranked[:limit] if limit else list(ranked)
+
+    def exact_matches(self, query, location=None):
+        """
+        Ids of the items whose name contains the query as whole words (and
+        location contains the location, when given). Unlike search(), near
+        misses never qualify, so this is what writes should select items with.
+        """
+        self._ensure_current()
+        with self._lock:
+            ids = self._names.containing(query)
+            if location:
+                ids &= self._locations.containing(location)
+            return sorted(ids, key=lambda item_id: self._items[item_id][0].lower())
+
+    def _rank(self, query, location):
+        name_scores = self._names.scores(query) if query else None
+        location_scores = self._locations.scores(location) if location else None
+        if name_scores is not None and location_scores is not None:
+            scores = {
+                item_id: (score + location_scores[item_id]) / 2
+                for item_id, score in name_scores.items() if item_id in location_scores
+            }
+        else:
+            scores = name_scores if name_scores is not None else location_scores
+        return sorted(scores, key=lambda item_id: (-scores[item_id], self._items[item_id][0].lower()))
+
+
+index = InventoryIndex()
+
+
+def search_items(query=None, location=None, limit=None, fields=InventoryItem.LIST_FIELDS):
+    """
+    Raw inventory documents matching a fuzzy name and/or location query, best match first.
+
+    Without a query or location every item is returned in natural order.
+    """
+    ids = index.search(query, location, limit)
+    if ids is None:
+        return list(InventoryItem.objects.only(*fields).as_pymongo())
+    return search_items_by_id(ids, fields)
+
+
+def search_items_by_id(ids, fields=InventoryItem.LIST_FIELDS):
+    """Raw inventory documents for ranked ids, in the same order"""
+    if not ids:
+        return []
+    docs = {doc["_id"]: doc for doc in InventoryItem.objects(id__in=ids).only(*fields).as_pymongo()}
+    # Ids deleted by another process since the last sync are skipped
+    return [docs[item_id] for item_id in ids if item_id in docs]
+
+
+def index_item(item_id, name, location, updated_at=None):
+    """Update the index after a write that bypassed InventoryItem.save()"""
+    index.upsert(item_id, name, location, updated_at)
+
+
+def _on_save(sender, document, **kwargs):
+    index.upsert(document.id, document.name, document.location, document.updated_at)
+
+
+def _on_delete(sender, document, **kwargs):
+    index.remove(document.id)
+
+
+signals.post_save.connect(_on_save, sender=InventoryItem)
+signals.post_delete.connect(_on_delete, sender=InventoryItem)
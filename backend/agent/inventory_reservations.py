@@ -0,0 +1,176 @@
+"""
+Atomic inventory quantity changes and work order reservations.
+
+Quantities are only changed with conditional $inc updates, never read,
+modified and saved, so concurrent technicians and agent runs cannot overwrite
+each other's changes. A decrement only matches while the item still has
+enough units; otherwise nothing is written and InsufficientInventory is raised.
+
+A reservation holds units of an item for a work order until it expires.
+Holding moves the units from `quantity` to `reserved_quantity`; releasing or
+expiring a hold moves them back, and consuming it drops them. A reservation
+leaves the `held` state with a conditional update before its units are moved,
+so a hold is returned to stock at most once even when the sweeper and a
+technician race on it.
+
+Configured with environment variables:
+    INVENTORY_RESERVATION_TTL_MINUTES     Default hold duration (default 60)
+    INVENTORY_RESERVATION_SWEEP_SECONDS   Interval of the expiry sweeper (0 disables, default 60)
+"""
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from mongoengine import DoesNotExist
+from models.InventoryItem import InventoryItem
+from models.InventoryReservation import InventoryReservation
+
+RESERVATION_TTL_MINUTES = float(os.getenv("INVENTORY_RESERVATION_TTL_MINUTES", "60"))
+SWEEP_INTERVAL_SECONDS = float(os.getenv("INVENTORY_RESERVATION_SWEEP_SECONDS", "60"))
+
+
+class InsufficientInventory(ValueError):
+    def __init__(self, item_id, available, requested):
+        self.item_id = item_id
+        self.available = available
+        self.requested = requested
+        super().__init__(f"Only {available} units in stock, {requested} requested")
+
+
+def _decrement_failed(item_id, requested):
+    """Raise the error explaining why a guarded decrement matched nothing"""
+    item = InventoryItem.objects(id=item_id).only('quantity').first()
+    if item is None:
+        raise DoesNotExist(f"Inventory item {item_id} not found")
+    raise InsufficientInventory(item_id, item.quantity or 0, requested)
+
+
+def adjust_quantity(item_id, change):
+    """
+    Add units to an item (negative to remove them) in one conditional $inc.
+
+    Returns:
+        The updated InventoryItem
+
+    Raises:
+        DoesNotExist if there is no such item
+        InsufficientInventory if removing more units than are in stock
+    """
+    filters = {"id": item_id}
+    if change < 0:
+        filters["quantity__gte"] = -change
+    item = InventoryItem.objects(**filters).modify(
+        new=True, inc__quantity=change, set__updated_at=datetime.now(timezone.utc)
+    )
+    if item is None:
+        _decrement_failed(item_id, -change)
+    return item
+
+
+def hold(item_id, work_order_id, quantity, ttl_minutes=None):
+    """
+    Hold units of an item for a work order.
+
+    Returns:
+        The new InventoryReservation
+
+    Raises:
+        DoesNotExist if there is no such item
+        InsufficientInventory if fewer units are in stock
+    """
+    if quantity <= 0:
+        raise ValueError("Reservation quantity must be positive")
+    now = datetime.now(timezone.utc)
+    item = InventoryItem.objects(id=item_id, quantity__gte=quantity).modify(
+        new=True, inc__quantity=-quantity, inc__reserved_quantity=quantity, set__updated_at=now
+    )
+    if item is None:
+        _decrement_failed(item_id, quantity)
+
+    ttl = RESERVATION_TTL_MINUTES if ttl_minutes is None else ttl_minutes
+    reservation = InventoryReservation(
+        item=item.id,
+        work_order=work_order_id,
+        quantity=quantity,
+        status="held",
+        created_at=now,
+        expires_at=now + timedelta(minutes=ttl),
+    )
+    try:
+        reservation.save()
+    except Exception:
+        # The hold was never recorded, so put the units back
+        InventoryItem.objects(id=item.id).update_one(
+            inc__quantity=quantity, inc__reserved_quantity=-quantity, set__updated_at=datetime.now(timezone.utc)
+        )
+        raise
+    return reservation
+
+
+def _end(reservation_id, status, restock, **conditions):
+    """Move a held reservation to `status` and settle its units; None if it was no longer held"""
+    now = datetime.now(timezone.utc)
+    reservation = InventoryReservation.objects(id=reservation_id, status="held", **conditions).modify(
+        new=True, set__status=status, set__ended_at=now
+    )
+    if reservation is None:
+        return None
+    updates = {"inc__reserved_quantity": -reservation.quantity, "set__updated_at": now}
+    if restock:
+        updates["inc__quantity"] = reservation.quantity
+    # The raw id, so the item is not dereferenced
+    InventoryItem.objects(id=reservation.to_mongo()["item"]).update_one(**updates)
+    return reservation
+
+
+def release(reservation_id):
+    """Return a held reservation's units to stock; None if it was no longer held"""
+    return _end(reservation_id, "released", restock=True)
+
+
+def consume(reservation_id):
+    """Mark a held reservation's units as used; None if it was no longer held"""
+    return _end(reservation_id, "consumed", restock=False)
+
+
+def release_work_order(work_order_id):
+    """
+    Release every hold of a work order.
+
+    Returns:
+        Number of reservations released
+    """
+    reservation_ids = InventoryReservation.objects(work_order=work_order_id, status="held").scalar('id')
+    return sum(1 for reservation_id in list(reservation_ids) if release(reservation_id))
+
+
+def expire_reservations(limit=500):
+    """
+    Return the units of holds past their expiry to stock.
+
+    Returns:
+        Number of reservations expired
+    """
+    now = datetime.now(timezone.utc)
+    reservation_ids = InventoryReservation.objects(status="held", expires_at__lte=now).scalar('id').limit(limit)
+    # Re-checked per hold in case it was extended or ended since the query
+    return sum(1 for reservation_id in list(reservation_ids) if _end(reservation_id, "expired", restock=True, expires_at__lte=now))
+
+
+def _sweep_loop(stop_event):
+    while not stop_event.wait(SWEEP_INTERVAL_SECONDS):
+        try:
+            expired = expire_reservations()
+            if expired:
+                print(f"[INVENTORY] Released {expired} expired reservations")
+        except Exception:
+            traceback.print_exc()
+
+
+def start_sweeper():
+    """Release expired reservations periodically in a background thread."""
+    stop_event = threading.Event()
+    if SWEEP_INTERVAL_SECONDS <= 0:
+        return stop_event
+    threading.Thread(target=_sweep_loop, args=(stop_event,), name="reservation-sweeper", daemon=True).start()
+    return stop_event
@@ -0,0 +1,196 @@
+"""
+Mongo-backed job queue for long running agent work.
+
+Routes enqueue a Job document and return immediately; a pool of worker threads
+claims queued jobs with an atomic find-and-modify, holds a lease on the job
+while it runs and renews it with a heartbeat.
+
+None of the job kinds are safe to run twice: a handler creates work orders and
+plans and calls tools with real side effects before it returns, so a second
+attempt would duplicate them. A job therefore runs once. If it raises, or its
+lease expires because the worker crashed or the process was killed, it is
+marked failed with the reason instead of being repeated. Finished jobs are
+removed by a TTL index a week after they end (models/Job.py).
+"""
+import os
+import socket
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+from mongoengine import DoesNotExist, Q
+from models.Job import Job
+from models.WorkOrder import WorkOrder
+from models.PlanStep import PlanStep
+from .main_agent import Context, run_agent, run_agent_from_step, handle_reported_issue
+
+LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+
+_wakeup = threading.Event()
+_workers = []
+
+
+def enqueue(kind, payload, work_order=None):
+    """Create a queued job and return it."""
+    now = datetime.now(timezone.utc)
+    job = Job(
+        kind=kind,
+        payload=payload,
+        work_order=work_order,
+        status="queued",
+        progress={"stage": "queued"},
+        created_at=now,
+        updated_at=now,
+    )
+    job.save()
+    _wakeup.set()
+    return job
+
+
+def claim_job(worker_id):
+    """
+    Atomically lease the oldest runnable job.
+
+    A job is runnable when it is queued, or when it is running but its lease has
+    expired. Jobs that come back with their attempts exhausted are failed by the
+    worker loop instead of being run again.
+
+    Returns:
+        The leased Job, or None if nothing is runnable
+    """
+    now = datetime.now(timezone.utc)
+    runnable = Q(status="queued") | Q(status="running", lease_expires_at__lt=now)
+    return Job.objects(runnable).order_by('created_at').modify(
+        new=True,
+        set__status="running",
+        set__lease_owner=worker_id,
+        set__lease_expires_at=now + timedelta(seconds=LEASE_SECONDS),
+        set__started_at=now,
+        set__updated_at=now,
+        inc__attempts=1,
+    )
+
+
+def renew_lease(job, worker_id):
+    """Extend the lease on a job; returns False if the lease was lost."""
+    now = datetime.now(timezone.utc)
+    updated = Job.objects(id=job.id, lease_owner=worker_id, status="running").update_one(
+        set__lease_expires_at=now + timedelta(seconds=LEASE_SECONDS),
+        set__updated_at=now,
+    )
+    return updated == 1
+
+
+def _progress_reporter(job):
+    def progress(**fields):
+        updates = {"set__updated_at": datetime.now(timezone.utc)}
+        for key, value in fields.items():
+            if key == "work_order":
+                updates["set__work_order"] = value
+            else:
+                updates[f"set__progress__{key}"] = value
+        Job.objects(id=job.id).update_one(**updates)
+    return progress
+
+
+def _finish(job, worker_id, status, result=None, error=None):
+    now = datetime.now(timezone.utc)
+    Job.objects(id=job.id, lease_owner=worker_id).update_one(
+        set__status=status,
+        set__result=result or {},
+        set__error=error,
+        set__progress__stage=status,
+        set__finished_at=now,
+        set__updated_at=now,
+        unset__lease_expires_at=True,
+    )
+
+
+def _run_create_work_order(job, progress):
+    context = Context(
+        work_order_title=job.payload.get("work_order_title"),
+        work_order_description=job.payload.get("work_order_description") or "",
+        messages=[]
+    )
+    work_order = run_agent(context, progress=progress)
+    return {"work_order_id": str(work_order.id)}
+
+
+def _run_confirm_step(job, progress):
+    run_agent_from_step(job.payload["step_id"], job.payload["work_order_id"], progress=progress)
+    return {"work_order_id": job.payload["work_order_id"]}
+
+
+def _run_report_issue(job, progress):
+    work_order = WorkOrder.objects.get(id=job.payload["work_order_id"])
+    problematic_step = PlanStep.objects.get(id=job.payload["step_id"], work_order=work_order)
+    return handle_reported_issue(
+        work_order=work_order,
+        problematic_step=problematic_step,
+        issue_description=job.payload["issue_description"],
+        progress=progress
+    )
+
+
+JOB_HANDLERS = {
+    "create_work_order": _run_create_work_order,
+    "confirm_step": _run_confirm_step,
+    "report_issue": _run_report_issue,
+}
+
+
+def run_job(job, worker_id):
+    """Execute a leased job, renewing its lease until the handler returns."""
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(LEASE_SECONDS / 3):
+            if not renew_lease(job, worker_id):
+                return
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    try:
+        result = JOB_HANDLERS[job.kind](job, _progress_reporter(job))
+        _finish(job, worker_id, "succeeded", result=result)
+    except DoesNotExist as e:
+        _finish(job, worker_id, "failed", error=f"WorkOrder or PlanStep not found: {str(e)}")
+    except Exception as e:
+        traceback.print_exc()
+        _finish(job, worker_id, "failed", error=str(e))
+    finally:
+        stop_heartbeat.set()
+
+
+def _worker_loop(worker_id, stop_event):
+    while not stop_event.is_set():
+        try:
+            job = claim_job(worker_id)
+        except Exception:
+            traceback.print_exc()
+            job = None
+        if job is None:
+            _wakeup.wait(POLL_INTERVAL_SECONDS)
+            _wakeup.clear()
+            continue
+        if job.attempts > job.max_attempts:
+            # Lease expired on the final attempt, most likely the worker died mid-run
+            _finish(job, worker_id, "failed", error=job.error or "Job was interrupted (worker lease expired) and cannot be safely rerun")
+            continue
+        print(f"[JOB] {worker_id} running {job.kind} job {job.id} (attempt {job.attempts})")
+        run_job(job, worker_id)
+
+
+def start_workers(count=None):
+    """Start the worker pool in background threads; returns the stop event."""
+    if count is None:
+        count = int(os.getenv("JOB_WORKERS", "2"))
+    stop_event = threading.Event()
+    prefix = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    for i in range(count):
+        worker_id = f"{prefix}-{i}"
+        thread = threading.Thread(target=_worker_loop, args=(worker_id, stop_event), name=f"job-worker-{i}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+    return stop_event
@@ -0,0 +1,212 @@
+"""
+Content-addressed, disk-backed cache for LLM completions.
+
+Completions are stored in a SQLite file keyed on a SHA-256 of the model, the
+normalized messages and the request parameters, so a resubmitted ticket or a
+retried job gets the earlier answer back without another LLM round trip.
+Entries expire after LLM_CACHE_TTL_SECONDS and the least recently used ones
+are evicted once the store holds more than LLM_CACHE_MAX_ENTRIES.
+
+The same store backs both LLM paths:
+- CachedOpenAI wraps the OpenAI client used for plan generation
+- LangChainCache plugs into ChatNVIDIA through LangChain's cache= hook
+
+Set LLM_CACHE_DISABLED=1 to bypass it everywhere, or wrap calls in
+bypass_cache() to skip it for a single request.
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from langchain_core.caches import BaseCache
+from langchain_core.messages import messages_from_dict, message_to_dict
+from langchain_core.outputs import ChatGeneration
+from openai.types.chat import ChatCompletion
+from .llm_gateway import completion_chunks, collect_stream
+
+CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".llm_cache.sqlite3")
+)
+CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "0") == "1"
+
+_bypass = ContextVar("llm_cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_cache():
+    """Skip the cache (both lookup and store) for calls made inside the block"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def cache_enabled():
+    return not CACHE_DISABLED and not _bypass.get()
+
+
+def normalize_messages(messages):
+    """Messages as plain role/content dicts with surrounding whitespace trimmed"""
+    normalized = []
+    for message in messages:
+        message = dict(message)
+        if isinstance(message.get("content"), str):
+            message["content"] = message["content"].strip()
+        normalized.append(message)
+    return normalized
+
+
+def cache_key(*parts):
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CompletionStore:
+    """SQLite store of cached completions with TTL expiry and LRU eviction"""
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used_at)")
+        return self._connection
+
+    def get(self, key):
+        """Cached value for a key, or None on a miss or an expired entry"""
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    connection.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            connection.execute("UPDATE completions SET last_used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            # Expired entries first, then the least recently used beyond the cap
+            connection.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl_seconds,))
+            connection.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM completions")
+
+    def stats(self):
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+store = CompletionStore()
+
+
+def cache_stats():
+    """Hit/miss counters and size of the shared completion cache"""
+    return store.stats()
+
+
+class _CachedCompletions:
+    def __init__(self, completions, store):
+        self._completions = completions
+        self._store = store
+
+    def create(self, **kwargs):
+        if not cache_enabled():
+            return self._completions.create(**kwargs)
+        stream = kwargs.get("stream")
+        # Streamed and plain requests share entries: a hit is served as a single chunk
+        params = {name: value for name, value in kwargs.items() if name not in ("model", "messages", "stream")}
+        key = cache_key("openai", kwargs.get("model"), normalize_messages(kwargs.get("messages", [])), params)
+        cached = self._store.get(key)
+        if cached is not None:
+            result = ChatCompletion.model_validate_json(cached)
+            return completion_chunks(result) if stream else result
+        result = self._completions.create(**kwargs)
+        if stream:
+            return collect_stream(result, lambda completion: self._store.put(key, completion.model_dump_json()))
+        self._store.put(key, result.model_dump_json())
+        return result
+
+
+class _CachedChat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class CachedOpenAI:
+    """OpenAI client whose chat.completions.create answers repeated requests from the cache"""
+
+    def __init__(self, client, store=store):
+        self._client = client
+        self.chat = _CachedChat(_CachedCompletions(client.chat.completions, store))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class LangChainCache(BaseCache):
+    """LangChain cache backed by the completion store, for ChatNVIDIA(cache=...)"""
+
+    def __init__(self, store=store):
+        self._store = store
+
+    def lookup(self, prompt, llm_string):
+        if not cache_enabled():
+            return None
+        cached = self._store.get(cache_key("langchain", llm_string, prompt))
+        if cached is None:
+            return None
+        return [ChatGeneration(message=message) for message in messages_from_dict(json.loads(cached))]
+
+    def update(self, prompt, llm_string, return_val):
+        if not cache_enabled():
+            return
+        messages = [generation.message for generation in return_val if isinstance(generation, ChatGeneration)]
+        if len(messages) != len(return_val):
+            # Only chat generations are cached
+            return
+        self._store.put(
+            cache_key("langchain", llm_string, prompt),
+            json.dumps([message_to_dict(message) for message in messages])
+        )
+
+    def clear(self, **kwargs):
+        self._store.clear()
@@ -0,0 +1,212 @@
+"""
+Record/replay stand-in for the LLM endpoint.
+
+LLM_CASSETTE_MODE=record sends requests as usual and appends every request
+and response of the OpenAI client and the ChatNVIDIA agent model to the
+cassette at LLM_CASSETTE_PATH (JSON lines). LLM_CASSETTE_MODE=replay answers
+from the cassette without touching the network, so a run exercises the real
+agent loop, tools and MongoDB writes with the model taken out.
+
+Replayed calls can sleep to simulate the model (LLM_CASSETTE_LATENCY):
+- "none" (default) or "recorded" (the duration measured when recording)
+- "fixed:SECONDS", "uniform:LOW,HIGH", "normal:MEAN,STDDEV", "lognormal:MU,SIGMA"
+
+Prompts carry work order and step ids that differ between runs, so requests
+are matched with ObjectIds masked out, and the ids found in a recorded
+request are rewritten to the ones in the live request before its response is
+served. A request with no exact match gets the next unused entry for its call
+site, in recorded order.
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import defaultdict, deque
+from langchain_core.messages import messages_from_dict, message_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from openai.types.chat import ChatCompletion
+from .llm_gateway import GatewayChatNVIDIA, completion_chunks, collect_stream
+from .metrics import current_call_site, observe_llm_call
+
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off")
+CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "llm_cassette.jsonl")
+CASSETTE_LATENCY = os.getenv("LLM_CASSETTE_LATENCY", "none")
+
+OBJECT_ID = re.compile(r"\b[0-9a-f]{24}\b")
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+def latency_sampler(spec):
+    """Build a function returning the seconds to sleep for a replayed call"""
+    name, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if name == "none":
+        return lambda recorded: 0.0
+    if name == "recorded":
+        return lambda recorded: recorded or 0.0
+    if name == "fixed":
+        return lambda recorded: values[0]
+    if name == "uniform":
+        return lambda recorded: random.uniform(values[0], values[1])
+    if name == "normal":
+        return lambda recorded: max(0.0, random.gauss(values[0], values[1]))
+    if name == "lognormal":
+        return lambda recorded: random.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown LLM_CASSETTE_LATENCY: {spec}")
+
+
+def _request_key(kind, request):
+    masked = OBJECT_ID.sub("<id>", json.dumps(request, sort_keys=True, default=str))
+    return hashlib.sha256(f"{kind}:{masked}".encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path=CASSETTE_PATH, mode=CASSETTE_MODE, latency=CASSETTE_LATENCY):
+        self.path = path
+        self.mode = mode
+        self._sample_latency = latency_sampler(latency)
+        self._lock = threading.Lock()
+        self._by_key = defaultdict(deque)
+        self._by_site = defaultdict(deque)
+        self._used = set()
+        self._id_map = {}
+        if mode == "replay":
+            self._load()
+
+    def _load(self):
+        with open(self.path) as f:
+            for position, line in enumerate(f):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                entry["position"] = position
+                self._by_key[entry["key"]].append(entry)
+                self._by_site[(entry["kind"], entry["call_site"])].append(entry)
+        print(f"[CASSETTE] Replaying {sum(len(q) for q in self._by_site.values())} LLM calls from {self.path}")
+
+    def record(self, kind, call_site, request, response, duration):
+        entry = {
+            "kind": kind,
+            "call_site": call_site,
+            "key": _request_key(kind, request),
+            "request": request,
+            "response": response,
+            "duration": duration,
+        }
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+    def _next_unused(self, queue):
+        while queue and queue[0]["position"] in self._used:
+            queue.popleft()
+        return queue[0] if queue else None
+
+    def replay(self, kind, call_site, request):
+        """Recorded response for a request, with ids mapped to the live run"""
+        key = _request_key(kind, request)
+        with self._lock:
+            entry = self._next_unused(self._by_key[key])
+            if entry is None:
+                entry = self._next_unused(self._by_site[(kind, call_site)])
+                if entry is None:
+                    raise CassetteMiss(f"No recorded {kind} response left for call site {call_site}")
+                print(f"[CASSETTE] No exact match for {kind}/{call_site}, using recorded call #{entry['position']}")
+            self._used.add(entry["position"])
+            # Pair ids position by position: recorded prompt ids -> live prompt ids
+            live_ids = OBJECT_ID.findall(json.dumps(request, sort_keys=True, default=str))
+            recorded_ids = OBJECT_ID.findall(json.dumps(entry["request"], sort_keys=True, default=str))
+            for recorded_id, live_id in zip(recorded_ids, live_ids):
+                self._id_map[recorded_id] = live_id
+            id_map = dict(self._id_map)
+        response = OBJECT_ID.sub(lambda m: id_map.get(m.group(0), m.group(0)), json.dumps(entry["response"]))
+        delay = self._sample_latency(entry.get("duration"))
+        if delay:
+            time.sleep(delay)
+        return json.loads(response), delay
+
+
+cassette = Cassette() if CASSETTE_MODE in ("record", "replay") else None
+
+
+class _CassetteCompletions:
+    def __init__(self, completions):
+        self._completions = completions
+
+    def create(self, **kwargs):
+        call_site = current_call_site()
+        stream = kwargs.get("stream")
+        request = {
+            "model": kwargs.get("model"),
+            "messages": kwargs.get("messages", []),
+            "params": {name: value for name, value in kwargs.items() if name not in ("model", "messages", "stream")},
+        }
+        if cassette.mode == "replay":
+            response, delay = cassette.replay("openai", call_site, request)
+            result = ChatCompletion.model_validate(response)
+            observe_llm_call(call_site, delay, result)
+            return completion_chunks(result) if stream else result
+        start = time.perf_counter()
+        result = self._completions.create(**kwargs)
+        if stream:
+            # Recorded as the assembled completion once the stream has been read
+            return collect_stream(result, lambda completion: cassette.record(
+                "openai", call_site, request, completion.model_dump(mode="json"), time.perf_counter() - start
+            ))
+        cassette.record("openai", call_site, request, result.model_dump(mode="json"), time.perf_counter() - start)
+        return result
+
+
+class _CassetteChat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class CassetteOpenAI:
+    """OpenAI-compatible client that records to or replays from the cassette"""
+
+    def __init__(self, client):
+        self._client = client
+        self.chat = _CassetteChat(_CassetteCompletions(client.chat.completions))
+
+
+def _langchain_request(messages, stop, kwargs):
+    serialized = []
+    for message in messages:
+        data = message_to_dict(message)
+        # Run-specific message ids are not part of the prompt
+        data["data"].pop("id", None)
+        serialized.append(data)
+    tools = [tool.get("function", {}).get("name") for tool in kwargs.get("tools") or []]
+    return {"messages": serialized, "stop": stop, "tools": tools}
+
+
+class CassetteChatNVIDIA(GatewayChatNVIDIA):
+    """Agent model that records to or replays from the cassette when one is configured"""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if cassette is None:
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        call_site = current_call_site("step_execution")
+        request = _langchain_request(messages, stop, kwargs)
+        if cassette.mode == "replay":
+            response, delay = cassette.replay("langchain", call_site, request)
+            result = ChatResult(
+                generations=[ChatGeneration(message=message) for message in messages_from_dict(response["generations"])],
+                llm_output=response.get("llm_output"),
+            )
+            observe_llm_call(call_site, delay, result)
+            return result
+        start = time.perf_counter()
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        cassette.record("langchain", call_site, request, {
+            "generations": [message_to_dict(generation.message) for generation in result.generations],
+            "llm_output": result.llm_output,
+        }, time.perf_counter() - start)
+        return result
@@ -0,0 +1,432 @@
+"""
+Single gateway for every call to the LLM endpoint.
+
+The gateway owns the pooled HTTP sessions for both LLM clients and bounds how
+hard we hit the endpoint:
+- at most LLM_MAX_CONCURRENCY requests in flight across sync and async callers
+- a global token bucket starting at LLM_RATE_PER_SECOND that halves on every
+  429/503 and grows back additively on each success (down to LLM_MIN_RATE,
+  up to LLM_MAX_RATE)
+- a deadline per call (LLM_DEADLINE_SECONDS by default) covering queueing,
+  retries and backoff; each attempt's HTTP timeout is capped by what is left
+- retries with exponential backoff for throttling, 5xx, timeouts and
+  connection errors, honouring Retry-After
+
+Planning calls use gateway_openai_client() (an OpenAI-compatible client) and
+the execution agent uses GatewayChatNVIDIA. ChatNVIDIA does not take a timeout
+per call, so its sync requests pick the attempt's timeout up from the shared
+session and its async requests are cancelled with asyncio.wait_for. Streamed completions (stream=True)
+go through the same limits until the response starts; the body is then read
+outside the concurrency slot.
+"""
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from openai import OpenAI, AsyncOpenAI, APITimeoutError, APIConnectionError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from langchain_nvidia_ai_endpoints import ChatNVIDIA
+from .metrics import llm_call_site, current_call_site, observe_llm_call
+
+BASE_URL = os.getenv("LLM_BASE_URL", "https://integrate.api.nvidia.com/v1")
+TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "180"))
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", "4"))
+MIN_RATE = float(os.getenv("LLM_MIN_RATE", "0.25"))
+MAX_RATE = float(os.getenv("LLM_MAX_RATE", "20"))
+RATE_INCREASE = float(os.getenv("LLM_RATE_INCREASE", "0.2"))
+
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    pass
+
+
+# HTTP timeout of the gateway attempt running in this context, if any
+_attempt_timeout = ContextVar("llm_attempt_timeout", default=None)
+
+
+@contextmanager
+def attempt_timeout(timeout):
+    """Cap the requests sent through the gateway session in this block at timeout seconds"""
+    token = _attempt_timeout.set(timeout)
+    try:
+        yield
+    finally:
+        _attempt_timeout.reset(token)
+
+
+class _GatewaySession(requests.Session):
+    """Session whose requests are bounded by the current gateway attempt's timeout"""
+
+    def request(self, method, url, **kwargs):
+        timeout = _attempt_timeout.get()
+        if timeout is not None:
+            # Replaces the client's own timeout, which is None (wait forever) by default
+            kwargs["timeout"] = timeout
+        return super().request(method, url, **kwargs)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate backs off multiplicatively and recovers additively"""
+
+    def __init__(self, rate=RATE_PER_SECOND, min_rate=MIN_RATE, max_rate=MAX_RATE, increase=RATE_INCREASE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Burst capacity follows the rate so a shrunk bucket cannot release a backlog at once
+        capacity = max(1.0, self.rate)
+        self._tokens = min(capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, deadline):
+        """
+        Take a token, possibly ahead of time.
+
+        Returns:
+            Seconds the caller must wait before sending
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                raise LLMDeadlineExceeded("LLM call deadline exceeded waiting for rate limit")
+            self._tokens -= 1
+            return wait
+
+    def on_throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+def status_of(error):
+    """HTTP status carried by an LLM client error, if any"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        # ChatNVIDIA raises plain Exceptions formatted as "[status] title ..."
+        match = re.match(r"\s*\[(\d{3})\]", str(error))
+        status = int(match.group(1)) if match else None
+    return status
+
+
+def retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    if isinstance(error, (APITimeoutError, APIConnectionError, requests.Timeout, requests.ConnectionError)):
+        return True
+    return status_of(error) in RETRY_STATUSES
+
+
+def completion_chunks(completion):
+    """Serve a complete ChatCompletion as a stream of one chunk"""
+    choice = completion.choices[0]
+    return iter([ChatCompletionChunk.model_validate({
+        "id": completion.id,
+        "object": "chat.completion.chunk",
+        "created": completion.created,
+        "model": completion.model,
+        "choices": [{
+            "index": 0,
+            "delta": {"role": "assistant", "content": choice.message.content},
+            "finish_reason": choice.finish_reason,
+        }],
+        "usage": completion.usage.model_dump() if completion.usage else None,
+    })])
+
+
+def collect_stream(chunks, on_complete):
+    """
+    Pass a chunk stream through unchanged, then call on_complete with the
+    ChatCompletion the chunks add up to once the stream is exhausted.
+    """
+    content = []
+    last = None
+    finish_reason = None
+    usage = None
+    for chunk in chunks:
+        last = chunk
+        if chunk.usage is not None:
+            usage = chunk.usage.model_dump()
+        if chunk.choices:
+            content.append(chunk.choices[0].delta.content or "")
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+        yield chunk
+    if last is None:
+        return
+    on_complete(ChatCompletion.model_validate({
+        "id": last.id,
+        "object": "chat.completion",
+        "created": last.created,
+        "model": last.model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(content)},
+            "finish_reason": finish_reason or "stop",
+        }],
+        "usage": usage,
+    }))
+
+
+class LLMGateway:
+    def __init__(self):
+        self.limiter = AdaptiveRateLimiter()
+        self.max_concurrency = MAX_CONCURRENCY
+        self._slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+        self._lock = threading.Lock()
+        self._openai = None
+        self._async_openai = None
+        self._session = None
+
+    # Pooled clients
+
+    def openai_client(self):
+        with self._lock:
+            if self._openai is None:
+                self._openai = OpenAI(
+                    base_url=BASE_URL,
+                    api_key=os.getenv("NVIDIA_API_KEY"),
+                    # Retries are done here so they share the rate limiter and deadline
+                    max_retries=0,
+                    timeout=TIMEOUT_SECONDS,
+                    http_client=httpx.Client(limits=httpx.Limits(
+                        max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS
+                    )),
+                )
+            return self._openai
+
+    def async_openai_client(self):
+        with self._lock:
+            if self._async_openai is None:
+                self._async_openai = AsyncOpenAI(
+                    base_url=BASE_URL,
+                    api_key=os.getenv("NVIDIA_API_KEY"),
+                    max_retries=0,
+                    timeout=TIMEOUT_SECONDS,
+                    http_client=httpx.AsyncClient(limits=httpx.Limits(
+                        max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS
+                    )),
+                )
+            return self._async_openai
+
+    def requests_session(self):
+        """Shared keep-alive session for ChatNVIDIA (which otherwise opens one per request)"""
+        with self._lock:
+            if self._session is None:
+                self._session = _GatewaySession()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS)
+                self._session.mount("https://", adapter)
+                self._session.mount("http://", adapter)
+            return self._session
+
+    # Call paths
+
+    def _deadline(self, deadline_seconds):
+        return time.monotonic() + (DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds)
+
+    def _attempt_timeout(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMDeadlineExceeded("LLM call deadline exceeded")
+        return min(TIMEOUT_SECONDS, remaining)
+
+    def _backoff(self, error, attempt, deadline):
+        """Seconds to wait before retrying, or None if the error should be raised"""
+        if status_of(error) in THROTTLE_STATUSES:
+            self.limiter.on_throttled()
+        if attempt >= MAX_RETRIES or not is_retryable(error):
+            return None
+        delay = retry_after(error) or min(30.0, (2 ** attempt) * 0.5) * (0.5 + random.random() / 2)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def call(self, fn, deadline_seconds=None):
+        """
+        Run fn(timeout) under the concurrency limit, rate limit, deadline and retry policy.
+
+        Args:
+            fn: Callable sending one request; receives the HTTP timeout for the attempt
+            deadline_seconds: Overall budget for the call, defaults to LLM_DEADLINE_SECONDS
+        """
+        call_site = current_call_site()
+        start = time.perf_counter()
+        try:
+            result = self._call(fn, deadline_seconds)
+        except Exception as e:
+            observe_llm_call(call_site, time.perf_counter() - start, error=e)
+            raise
+        observe_llm_call(call_site, time.perf_counter() - start, result)
+        return result
+
+    async def acall(self, fn, deadline_seconds=None):
+        """Async version of call(); fn(timeout) returns an awaitable"""
+        call_site = current_call_site()
+        start = time.perf_counter()
+        try:
+            result = await self._acall(fn, deadline_seconds)
+        except Exception as e:
+            observe_llm_call(call_site, time.perf_counter() - start, error=e)
+            raise
+        observe_llm_call(call_site, time.perf_counter() - start, result)
+        return result
+
+    def _call(self, fn, deadline_seconds):
+        deadline = self._deadline(deadline_seconds)
+        attempt = 0
+        while True:
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise LLMDeadlineExceeded("LLM call deadline exceeded waiting for a connection slot")
+            try:
+                time.sleep(self.limiter.reserve(deadline))
+                result = fn(self._attempt_timeout(deadline))
+            except Exception as e:
+                error = e
+            else:
+                self.limiter.on_success()
+                return result
+            finally:
+                self._slots.release()
+            delay = self._backoff(error, attempt, deadline)
+            if delay is None:
+                raise error
+            print(f"[LLM GATEWAY] Retrying after {delay:.1f}s (status {status_of(error)}): {str(error)[:200]}")
+            time.sleep(delay)
+            attempt += 1
+
+    async def _acall(self, fn, deadline_seconds):
+        deadline = self._deadline(deadline_seconds)
+        attempt = 0
+        while True:
+            # Shares the slot pool with sync callers without blocking the event loop
+            while not self._slots.acquire(blocking=False):
+                if time.monotonic() >= deadline:
+                    raise LLMDeadlineExceeded("LLM call deadline exceeded waiting for a connection slot")
+                await asyncio.sleep(0.05)
+            try:
+                await asyncio.sleep(self.limiter.reserve(deadline))
+                result = await fn(self._attempt_timeout(deadline))
+            except Exception as e:
+                error = e
+            else:
+                self.limiter.on_success()
+                return result
+            finally:
+                self._slots.release()
+            delay = self._backoff(error, attempt, deadline)
+            if delay is None:
+                raise error
+            print(f"[LLM GATEWAY] Retrying after {delay:.1f}s (status {status_of(error)}): {str(error)[:200]}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def chat_completion(self, deadline_seconds=None, **kwargs):
+        client = self.openai_client()
+        if kwargs.get("stream"):
+            return self._stream(client, deadline_seconds, kwargs)
+        return self.call(lambda timeout: client.chat.completions.create(timeout=timeout, **kwargs), deadline_seconds)
+
+    def _stream(self, client, deadline_seconds, kwargs):
+        """Open a streamed completion; the call is observed once the stream has been read"""
+        call_site = current_call_site()
+        start = time.perf_counter()
+        try:
+            stream = self._call(lambda timeout: client.chat.completions.create(timeout=timeout, **kwargs), deadline_seconds)
+        except Exception as e:
+            observe_llm_call(call_site, time.perf_counter() - start, error=e)
+            raise
+        return collect_stream(stream, lambda completion: observe_llm_call(call_site, time.perf_counter() - start, completion))
+
+    async def achat_completion(self, deadline_seconds=None, **kwargs):
+        client = self.async_openai_client()
+        return await self.acall(lambda timeout: client.chat.completions.create(timeout=timeout, **kwargs), deadline_seconds)
+
+
+gateway = LLMGateway()
+
+
+class _GatewayCompletions:
+    def create(self, **kwargs):
+        return gateway.chat_completion(**kwargs)
+
+
+class _GatewayChat:
+    completions = _GatewayCompletions()
+
+
+class _GatewayOpenAIClient:
+    """OpenAI-compatible client (chat.completions.create) routed through the gateway"""
+    chat = _GatewayChat()
+
+
+def gateway_openai_client():
+    return _GatewayOpenAIClient()
+
+
+class GatewayChatNVIDIA(ChatNVIDIA):
+    """ChatNVIDIA whose requests share the gateway's session, limits, timeouts and retry policy"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("base_url", BASE_URL)
+        super().__init__(**kwargs)
+        client = getattr(self, "_client", None)
+        if client is not None and hasattr(client, "get_session_fn"):
+            client.get_session_fn = gateway.requests_session
+        else:
+            # Sync calls then have no HTTP timeout and only the retry limits apply
+            print("[LLM GATEWAY] WARNING: ChatNVIDIA client has no get_session_fn; "
+                  "agent requests will not use the gateway session or its per-attempt timeout")
+
+    def _generate(self, *args, **kwargs):
+        parent = super()._generate
+
+        def attempt(timeout):
+            with attempt_timeout(timeout):
+                return parent(*args, **kwargs)
+
+        with llm_call_site(current_call_site("step_execution")):
+            return gateway.call(attempt)
+
+    async def _agenerate(self, *args, **kwargs):
+        parent = super()._agenerate
+
+        # The async client does not use the requests session, so cancel it instead
+        async def attempt(timeout):
+            try:
+                return await asyncio.wait_for(parent(*args, **kwargs), timeout)
+            except asyncio.TimeoutError as e:
+                raise requests.Timeout(f"ChatNVIDIA request timed out after {timeout:.1f}s") from e
+
+        with llm_call_site(current_call_site("step_execution")):
+            return await gateway.acall(attempt)
@@ -0,0 +1,171 @@
+"""
+Write-behind buffer for the logs the agent writes through the create_log tool.
+
+While a run is active for a work order, create_log only appends to that work
+order's buffer; the WorkOrder reference and the ids of its PlanSteps are cached
+for the run, so no query sits between the tool call and the next agent turn.
+The buffer is written with one insert_many when it reaches FLUSH_SIZE entries,
+when its oldest entry is FLUSH_SECONDS old, at every step boundary and when
+the run ends, whether it finished or raised.
+"""
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from models.AgentLog import AgentLog
+from models.PlanStep import PlanStep
+from .log_stream import publish_log
+
+FLUSH_SIZE = int(os.getenv("LOG_BUFFER_FLUSH_SIZE", "20"))
+FLUSH_SECONDS = float(os.getenv("LOG_BUFFER_FLUSH_SECONDS", "2.0"))
+
+DUPLICATE_KEY = 11000
+
+_lock = threading.Lock()
+_active = {}
+
+
+class LogBuffer:
+    def __init__(self, work_order):
+        self.work_order_id = work_order.id
+        self._lock = threading.Lock()
+        self._entries = []
+        self._oldest = None
+        self._step_ids = None
+        self._users = 0
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def _known_step(self, step_id):
+        """Check a step belongs to the work order, reloading the cached ids once on a miss"""
+        if self._step_ids is not None and step_id in self._step_ids:
+            return True
+        # Steps can be added mid-run (e.g. regenerated after a reported issue)
+        self._step_ids = {
+            step['_id'] for step in PlanStep.objects(work_order=self.work_order_id).only('id').as_pymongo()
+        }
+        return step_id in self._step_ids
+
+    def add(self, plan_step_id, action, result, timestamp):
+        """Queue a log entry; raises PlanStep.DoesNotExist for a step outside the work order"""
+        if not ObjectId.is_valid(plan_step_id) or not self._known_step(ObjectId(plan_step_id)):
+            raise PlanStep.DoesNotExist(f"PlanStep {plan_step_id} not found")
+        log = AgentLog(
+            # Assigned up front so a retried flush can recognise entries already written
+            id=ObjectId(),
+            related_step=ObjectId(plan_step_id),
+            work_order=self.work_order_id,
+            timestamp=timestamp,
+            agent_action=action,
+            result=result,
+        )
+        log.validate()
+        with self._lock:
+            if not self._entries:
+                self._oldest = time.monotonic()
+            self._entries.append(log.to_mongo().to_dict())
+            full = len(self._entries) >= FLUSH_SIZE
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write every queued entry with a single insert_many"""
+        with self._lock:
+            entries, self._entries = self._entries, []
+            self._oldest = None
+        if not entries:
+            return 0
+        error = None
+        try:
+            AgentLog._get_collection().insert_many(entries, ordered=False)
+            failed = []
+        except BulkWriteError as e:
+            # A duplicate key means an earlier, interrupted flush already wrote the entry
+            failed_indexes = {
+                write_error['index'] for write_error in e.details.get('writeErrors', [])
+                if write_error.get('code') != DUPLICATE_KEY
+            }
+            failed = [entry for i, entry in enumerate(entries) if i in failed_indexes]
+            entries = [entry for i, entry in enumerate(entries) if i not in failed_indexes]
+            error = e
+        except Exception as e:
+            failed, entries, error = entries, [], e
+        if failed:
+            # Keep the entries for the next flush rather than dropping them
+            print(f"[LOG BUFFER] Failed to write {len(failed)} logs for WorkOrder {self.work_order_id}: {str(error)}")
+            with self._lock:
+                self._entries = failed + self._entries
+                self._oldest = time.monotonic()
+        for entry in entries:
+            publish_log(AgentLog._from_son(entry))
+        if failed:
+            raise error
+        return len(entries)
+
+    def _flush_loop(self):
+        while not self._stop.wait(FLUSH_SECONDS / 2):
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= FLUSH_SECONDS
+            if due:
+                try:
+                    self.flush()
+                except Exception:
+                    pass
+
+    def _start(self):
+        self._flusher = threading.Thread(target=self._flush_loop, name=f"log-buffer-{self.work_order_id}", daemon=True)
+        self._flusher.start()
+
+    def _stop_flusher(self):
+        self._stop.set()
+        self._flusher.join()
+
+
+@contextmanager
+def buffered_logs(work_order):
+    """
+    Route create_log calls for a work order into a buffer for the duration of a run.
+
+    Nested runs for the same work order share one buffer. The buffer is flushed
+    when the outermost run exits, including when it raises; a failure of that
+    flush is logged and never replaces the run's own exception.
+    """
+    with _lock:
+        buffer = _active.get(work_order.id)
+        if buffer is None:
+            buffer = _active[work_order.id] = LogBuffer(work_order)
+            buffer._start()
+        buffer._users += 1
+    try:
+        yield buffer
+    finally:
+        with _lock:
+            buffer._users -= 1
+            last = buffer._users == 0
+            if last:
+                del _active[work_order.id]
+        if last:
+            buffer._stop_flusher()
+        try:
+            buffer.flush()
+        except Exception:
+            # flush() keeps failed entries queued, but nothing flushes a buffer
+            # whose last run has ended
+            with buffer._lock:
+                pending = len(buffer._entries)
+            if last:
+                print(f"[LOG BUFFER] Final flush failed, dropping {pending} logs for WorkOrder {work_order.id}")
+            else:
+                print(f"[LOG BUFFER] Flush failed, {pending} logs for WorkOrder {work_order.id} stay queued")
+            traceback.print_exc()
+
+
+def active_buffer(work_order_id):
+    """The buffer of the run in progress for a work order, or None"""
+    if not ObjectId.is_valid(work_order_id):
+        return None
+    with _lock:
+        return _active.get(ObjectId(work_order_id))
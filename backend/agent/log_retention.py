@@ -0,0 +1,178 @@
+"""
+Retention policy for the agent_log collection.
+
+- Routine agent `info` entries expire through a partial TTL index.
+- Once a work order is closed, each run of consecutive successful/info agent
+  actions is rolled up into a single summary entry.
+- Warnings, errors and technician entries are never expired or rolled up.
+
+Configured with environment variables:
+    LOG_INFO_TTL_DAYS               Age at which agent info entries expire (0 disables, default 30)
+    LOG_ROLLUP_GRACE_MINUTES        How long a work order must be closed before rollup (default 60)
+    LOG_RETENTION_INTERVAL_SECONDS  Interval of the background retention pass (0 disables, default 3600)
+"""
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import OperationFailure
+from models.AgentLog import AgentLog
+from models.WorkOrder import WorkOrder
+
+INFO_TTL_DAYS = float(os.getenv("LOG_INFO_TTL_DAYS", "30"))
+ROLLUP_GRACE_MINUTES = float(os.getenv("LOG_ROLLUP_GRACE_MINUTES", "60"))
+RETENTION_INTERVAL_SECONDS = float(os.getenv("LOG_RETENTION_INTERVAL_SECONDS", "3600"))
+
+TTL_INDEX_NAME = "agent_info_log_ttl"
+# Entries eligible for TTL expiry and rollup
+ROUTINE_FILTER = {"source": "agent", "log_type": "info"}
+ROLLUP_LOG_TYPES = ["info", "success"]
+CLOSED_STATUSES = ["completed"]
+# Lines of detail kept in a summary entry
+SUMMARY_MAX_LINES = 20
+SUMMARY_MAX_LINE_LENGTH = 200
+
+
+def ensure_ttl_index():
+    """Create, update or drop the partial TTL index to match LOG_INFO_TTL_DAYS."""
+    collection = AgentLog._get_collection()
+    existing = collection.index_information().get(TTL_INDEX_NAME)
+    if INFO_TTL_DAYS <= 0:
+        if existing:
+            collection.drop_index(TTL_INDEX_NAME)
+        return
+    expire_after = int(INFO_TTL_DAYS * 86400)
+    if existing is None:
+        collection.create_index(
+            [("timestamp", 1)],
+            name=TTL_INDEX_NAME,
+            expireAfterSeconds=expire_after,
+            partialFilterExpression=ROUTINE_FILTER,
+        )
+    elif existing.get("expireAfterSeconds") != expire_after:
+        collection.database.command(
+            "collMod", collection.name,
+            index={"name": TTL_INDEX_NAME, "expireAfterSeconds": expire_after},
+        )
+
+
+def _summarize(run):
+    lines = []
+    for log in run[:SUMMARY_MAX_LINES]:
+        line = log.agent_action
+        if log.result:
+            line += f": {log.result}"
+        lines.append("- " + line.replace("\n", " ")[:SUMMARY_MAX_LINE_LENGTH])
+    if len(run) > SUMMARY_MAX_LINES:
+        lines.append(f"- ... and {len(run) - SUMMARY_MAX_LINES} more")
+    return "\n".join(lines)
+
+
+def _flush_run(work_order, run):
+    """Replace a run of routine agent logs with one summary entry; returns logs removed"""
+    if len(run) < 2:
+        return 0
+    step_ids = {log.related_step.id if log.related_step else None for log in run}
+    summary = AgentLog(
+        work_order=work_order,
+        # Only keep the step reference when the whole run belongs to one step
+        related_step=run[-1].related_step if len(step_ids) == 1 else None,
+        timestamp=run[-1].timestamp,
+        agent_action=f"Completed {len(run)} agent actions",
+        result=_summarize(run),
+        source="agent",
+        log_type="success",
+        rolled_up_count=sum(log.rolled_up_count or 1 for log in run),
+    )
+    summary.save()
+    AgentLog.objects(id__in=[log.id for log in run]).delete()
+    return len(run)
+
+
+def compact_work_order_logs(work_order):
+    """
+    Roll up each run of consecutive routine agent logs of a closed work order.
+
+    Returns:
+        Number of log entries removed
+    """
+    removed = 0
+    run = []
+    # References are only copied, so skip dereferencing them
+    for log in AgentLog.objects(work_order=work_order).no_dereference().order_by('timestamp', 'id'):
+        if log.source == "agent" and log.log_type in ROLLUP_LOG_TYPES:
+            run.append(log)
+            continue
+        # Warnings, errors and technician entries break the run and are kept as-is
+        removed += _flush_run(work_order, run)
+        run = []
+    removed += _flush_run(work_order, run)
+    return removed
+
+
+def compact_closed_work_orders(limit=500):
+    """
+    Roll up logs of work orders that have been closed for the grace period and
+    changed since their last rollup.
+
+    Returns:
+        (work orders compacted, log entries removed)
+    """
+    now = datetime.now(timezone.utc)
+    closed_before = now - timedelta(minutes=ROLLUP_GRACE_MINUTES)
+    candidates = WorkOrder.objects(
+        status__in=CLOSED_STATUSES,
+        updated_at__lt=closed_before,
+        __raw__={"$or": [
+            {"logs_compacted_at": None},
+            # Changed (e.g. reopened and closed again) since the last rollup
+            {"$expr": {"$lt": ["$logs_compacted_at", "$updated_at"]}},
+        ]},
+    ).only('id', 'logs_compacted_at').limit(limit)
+
+    compacted = 0
+    removed = 0
+    for work_order in candidates:
+        # Claim the work order so concurrent retention passes don't both roll it up.
+        # A queryset update keeps updated_at (and the work order list order) intact.
+        claimed = WorkOrder.objects(
+            id=work_order.id, logs_compacted_at=work_order.logs_compacted_at
+        ).update_one(set__logs_compacted_at=now)
+        if not claimed:
+            continue
+        removed += compact_work_order_logs(work_order)
+        compacted += 1
+    return compacted, removed
+
+
+def run_retention():
+    """One full retention pass: keep the TTL index in sync and roll up closed work orders."""
+    try:
+        ensure_ttl_index()
+    except OperationFailure as e:
+        print(f"[LOG RETENTION] Could not update TTL index: {str(e)}")
+    compacted, removed = compact_closed_work_orders()
+    if compacted:
+        print(f"[LOG RETENTION] Rolled up {removed} log entries across {compacted} closed work orders")
+    return compacted, removed
+
+
+def _retention_loop(stop_event):
+    while not stop_event.wait(RETENTION_INTERVAL_SECONDS):
+        try:
+            run_retention()
+        except Exception:
+            traceback.print_exc()
+
+
+def start_retention():
+    """Run the retention pass once now and then periodically in a background thread."""
+    stop_event = threading.Event()
+    if RETENTION_INTERVAL_SECONDS <= 0:
+        return stop_event
+    try:
+        run_retention()
+    except Exception:
+        traceback.print_exc()
+    threading.Thread(target=_retention_loop, args=(stop_event,), name="log-retention", daemon=True).start()
+    return stop_event
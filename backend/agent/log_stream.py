@@ -0,0 +1,167 @@
+"""
+Fan-out of new AgentLog entries to Server-Sent Events subscribers.
+
+Writers in this process call publish_log() so subscribers see an entry as soon
+as it is saved. Logs written by other processes (e.g. standalone job workers)
+are picked up by a single broadcaster thread that tails the collection by _id,
+so the database sees one small query per interval no matter how many
+dashboards are connected.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from bson import ObjectId
+from models.AgentLog import AgentLog
+
+POLL_INTERVAL_SECONDS = float(os.getenv("LOG_STREAM_POLL_SECONDS", "1.0"))
+HEARTBEAT_SECONDS = 15
+# ObjectIds from different processes are only ordered to the second, so each
+# poll re-reads a short window and drops entries it has already delivered
+OVERLAP_SECONDS = 2
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+_lock = threading.Lock()
+_subscribers = set()
+_recent_ids = deque(maxlen=5000)
+_recent_id_set = set()
+_last_seen_id = None
+_start_id = None
+_broadcaster = None
+
+
+class Subscriber:
+    def __init__(self, work_order_id=None):
+        self.work_order_id = work_order_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, event):
+        if self.work_order_id and event["work_order_id"] != self.work_order_id:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A stalled client must not hold up everyone else; it will resume
+            # from its Last-Event-ID when it reconnects
+            pass
+
+
+def format_event(log_dict):
+    """Render a serialized log as an SSE frame"""
+    return f"id: {log_dict['id']}\nevent: log\ndata: {json.dumps(log_dict)}\n\n"
+
+
+def _remember(log_id):
+    """Record a delivered log id; returns False if it was already delivered"""
+    global _last_seen_id
+    if log_id in _recent_id_set:
+        return False
+    if len(_recent_ids) == _recent_ids.maxlen:
+        _recent_id_set.discard(_recent_ids[0])
+    _recent_ids.append(log_id)
+    _recent_id_set.add(log_id)
+    if _last_seen_id is None or log_id > _last_seen_id:
+        _last_seen_id = log_id
+    return True
+
+
+def _dispatch(log):
+    with _lock:
+        if not _remember(log.id):
+            return
+        subscribers = list(_subscribers)
+    if not subscribers:
+        return
+    # Serialize once for every subscriber
+    log_dict = log.to_dict()
+    event = {"id": log_dict["id"], "work_order_id": log_dict["work_order_id"], "frame": format_event(log_dict)}
+    for subscriber in subscribers:
+        subscriber.offer(event)
+
+
+def publish_log(log):
+    """Push a freshly saved AgentLog to the subscribers in this process."""
+    try:
+        _dispatch(log)
+    except Exception as e:
+        # Streaming is best effort; never fail the write path because of it
+        print(f"[LOG STREAM] Failed to publish log {log.id}: {str(e)}")
+
+
+def _poll_new_logs():
+    with _lock:
+        last_seen_id = _last_seen_id
+    since = ObjectId.from_datetime(last_seen_id.generation_time - timedelta(seconds=OVERLAP_SECONDS))
+    for log in AgentLog.objects(id__gt=max(since, _start_id)).order_by('id'):
+        _dispatch(log)
+
+
+def _broadcast_loop():
+    while True:
+        time.sleep(POLL_INTERVAL_SECONDS)
+        with _lock:
+            if not _subscribers:
+                continue
+        try:
+            _poll_new_logs()
+        except Exception as e:
+            print(f"[LOG STREAM] Polling for new logs failed: {str(e)}")
+
+
+def _ensure_broadcaster():
+    global _broadcaster, _last_seen_id, _start_id
+    with _lock:
+        if _broadcaster is not None:
+            return
+        # Only logs written from now on are broadcast; history is replayed per client
+        _start_id = _last_seen_id = ObjectId()
+        _broadcaster = threading.Thread(target=_broadcast_loop, name="log-stream-broadcaster", daemon=True)
+        _broadcaster.start()
+
+
+def subscribe(work_order_id=None):
+    _ensure_broadcaster()
+    subscriber = Subscriber(work_order_id)
+    with _lock:
+        _subscribers.add(subscriber)
+    return subscriber
+
+
+def unsubscribe(subscriber):
+    with _lock:
+        _subscribers.discard(subscriber)
+
+
+def stream(work_order_id=None, last_event_id=None):
+    """
+    Generator of SSE frames for new logs, optionally scoped to one work order.
+
+    When last_event_id is given, logs written after it are replayed first.
+    """
+    subscriber = subscribe(work_order_id)
+    try:
+        # Tell EventSource how long to wait before reconnecting
+        yield "retry: 3000\n\n"
+        replayed = set()
+        if last_event_id:
+            missed = AgentLog.objects(id__gt=ObjectId(last_event_id))
+            if work_order_id:
+                missed = missed.filter(work_order=ObjectId(work_order_id))
+            for log_dict in AgentLog.dicts_from_raw(list(missed.order_by('id').as_pymongo())):
+                replayed.add(log_dict["id"])
+                yield format_event(log_dict)
+        while True:
+            try:
+                event = subscriber.queue.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Comment frame keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            if event["id"] in replayed:
+                continue
+            yield event["frame"]
+    finally:
+        unsubscribe(subscriber)
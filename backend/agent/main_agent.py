@@ -1,22 +1,34 @@
 from . import tools
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
 from pydantic import BaseModel
 from typing import Optional, List, Any, Sequence, Annotated, TypedDict
 import os
 import json
+import queue
+import threading
+import contextvars
+from contextlib import ExitStack
 from dotenv import load_dotenv
-from openai import OpenAI
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne, DeleteMany
 from langchain.messages import AnyMessage, AIMessage, ToolMessage
 from langchain.agents import create_agent
 from models.WorkOrder import WorkOrder
 from models.PlanStep import PlanStep
 from models.AgentLog import AgentLog
+from .step_counters import set_step_status, add_steps, hold_plan_open, release_plan, abandon_plan, replace_plan_steps
+from .log_stream import publish_log
+from .log_buffer import buffered_logs
+from .step_classifier import classify_plan_steps, apply_decisions, earliest_technician_step
+from .llm_cache import CachedOpenAI, LangChainCache
+from .llm_gateway import gateway_openai_client
+from .llm_cassette import cassette, CassetteOpenAI, CassetteChatNVIDIA
+from .metrics import llm_call_site, agent_invoke_timer
+from .prompt_builder import AGENT_INSTRUCTIONS, planning_messages, regeneration_messages, step_message
+from .plan_stream import PlanStreamParser, chunk_text
 from datetime import datetime, timezone
 
 load_dotenv()
 
-print(os.getenv("NVIDIA_API_KEY"))
-
 class Step(TypedDict):
     description: str
     step_number: int
@@ -35,103 +47,74 @@ class AgentContext(TypedDict):
     step: Step
     messages: list[AnyMessage]
 
-llm = OpenAI(
-    base_url="https://integrate.api.nvidia.com/v1",
-    api_key=os.getenv("NVIDIA_API_KEY")
-)
-
-agent_model = ChatNVIDIA(
-    base_url="https://integrate.api.nvidia.com/v1",
+# Both clients send through the LLM gateway (pooling, rate limiting, deadlines)
+# and answer repeated prompts from the disk-backed completion cache
+if cassette is not None:
+    # Recording and replaying must see every call, so the cache is left out
+    llm = CassetteOpenAI(gateway_openai_client())
+    model_cache = False
+else:
+    llm = CachedOpenAI(gateway_openai_client())
+    model_cache = LangChainCache()
+
+agent_model = CassetteChatNVIDIA(
     model="nvidia/nvidia-nemotron-nano-9b-v2",
     temperature=0.0,
-    api_key=os.getenv("NVIDIA_API_KEY")
+    api_key=os.getenv("NVIDIA_API_KEY"),
+    cache=model_cache
 )
 
-agent_prompt = """
-You are a Data Center AI Assistant responsible for executing maintenance tasks.
-
-Your role:
-- Execute tasks using your available tools whenever possible
-- When you can complete a task with your tools, DO IT immediately - don't just describe what you would do
-- Only defer to a technician when the task requires physical work or capabilities you don't have
-
-This is a demo environment - be proactive with tool usage.
-
-When you call any tool (e.g. reboot_server, shutdown_server, etc.), 
-you must immediately and ALWAYS follow it with a call to the create_log tool.
-
-The create_log tool must include:
-- The plan_step_id and work_order_id you were given
-- A short, natural-language summary of what you just did (the “action”)
-- The result or return value of the tool you just called (the “result”)
-
-Examples of what you CAN do:
-- "Reboot server A45" → Use reboot_server tool with server_id="A45"
-- "Check temperature readings" → Use check_temperature tool
-- "Run diagnostics on server B12" → Use run_diagnostics tool with server_id="B12"
-
-Examples of what requires a TECHNICIAN:
-- "Replace the failed hard drive in rack 3"
-- "Physically inspect the server for damage"
-- "Install new RAM modules"
-
-If you cannot complete a task with your available tools, respond ONLY with:
-{"executor": "technician", "reason": "explanation of why physical access or unavailable capability is needed"}
-
-Otherwise, execute the task using your tools.
-"""
-
-
-
 agent = create_agent(
     model=agent_model,
     tools=[tools.create_log, tools.shutdown_server, tools.reboot_server, tools.check_existing_specs, tools.check_inventory, tools.check_temperature, tools.deploy_update, tools.escalate_to_higher_engineer, tools.order_supplies, tools.run_diagnostics],
-    system_prompt=agent_prompt
+    system_prompt=AGENT_INSTRUCTIONS
 )
 
-def run_agent_from_step(step_id: str, work_order_id: str):
+def run_agent_from_step(step_id: str, work_order_id: str, progress=None):
     work_order = WorkOrder.objects.get(id=work_order_id)
     plan_steps = PlanStep.objects(work_order=work_order).order_by('step_number')
     start_step = PlanStep.objects.get(id=step_id)
-    start_step.status = "success"
-    start_step.save()
-
-    all_steps = [
-        f"Order: {step.step_number}, Description: {step.description}"
-        for step in plan_steps
-    ]
-
-    for step in plan_steps:
-        if step.step_number <= start_step.step_number:
-            continue
-
-        step.status = "in_progress"
-        step.save()
-
-        msg = build_message(work_order, step, all_steps)
-
-        result = agent.invoke({"messages": [msg]})
-        print(result)
-        latest_message = result["messages"][-1]
-        data = {}
-        executor = 'technician'
-        try:
-            data = json.loads(latest_message.content)
-        except:
-            executor = 'agent'
-        print("CONTENT IN RUN AGENT FROM STEP: ", data)
-        print("EXECUTOR: ", executor)
-        step.executor = executor
-        step.save()
-        if step.executor != 'agent':
-            log_human_interaction(work_order, step, data['reason'])
-            break
-        else:
-            step.status = "success"
-            step.executed_at = datetime.now(timezone.utc)
+    set_step_status(start_step, "success")
+
+    with buffered_logs(work_order) as log_buffer:
+        for step in plan_steps:
+            if step.step_number <= start_step.step_number:
+                continue
+
+            set_step_status(step, "in_progress")
+            if progress:
+                progress(stage="executing", current_step=step.step_number)
+
+            if step.executor == 'technician':
+                # Classified when the plan was generated; nothing for the agent to run
+                log_human_interaction(work_order, step, step.executor_reason or "Requires a technician")
+                break
+
+            msg = step_message(work_order, step)
+
+            with agent_invoke_timer(step.step_number):
+                result = agent.invoke({"messages": [msg]})
+            print(result)
+            # Step boundary: write the logs from this step's tool calls
+            log_buffer.flush()
+            latest_message = result["messages"][-1]
+            data = {}
+            executor = 'technician'
+            try:
+                data = json.loads(latest_message.content)
+            except:
+                executor = 'agent'
+            print("CONTENT IN RUN AGENT FROM STEP: ", data)
+            print("EXECUTOR: ", executor)
+            step.executor = executor
             step.save()
+            if step.executor != 'agent':
+                log_human_interaction(work_order, step, data['reason'])
+                break
+            else:
+                set_step_status(step, "success", executed_at=datetime.now(timezone.utc))
 
-def execute_steps_automatically(work_order, plan_steps, start_from_step_number=None):
+def execute_steps_automatically(work_order, plan_steps, start_from_step_number=None, progress=None):
     """
     Automatically execute plan steps, stopping at the first step that requires technician action.
     
@@ -139,171 +122,230 @@ def execute_steps_automatically(work_order, plan_steps, start_from_step_number=N
         work_order: WorkOrder instance
         plan_steps: List of PlanStep instances to execute
         start_from_step_number: Optional step number to start from (inclusive)
+        progress: Optional callback receiving progress fields as keyword arguments
     
     Returns:
         The first step that requires technician action (or None if all completed)
     """
-    all_steps = PlanStep.objects(work_order=work_order).order_by('step_number')
-    all_steps_str = [
-        f"Order: {step.step_number}, Description: {step.description}"
-        for step in all_steps
-    ]
-
-    for step in plan_steps:
-        # Skip if we're starting from a specific step number
-        if start_from_step_number and step.step_number < start_from_step_number:
-            continue
-
-        step.status = "in_progress"
-        step.save()
-
-        msg = build_message(work_order, step, all_steps)
-
-        result = agent.invoke({"messages": [msg]})
-        print(result)
-        latest_message = result["messages"][-1]
-        data = {}
-        executor = 'technician'
-        try:
-            data = json.loads(latest_message.content)
-        except:
-            executor = 'agent'
-        print("CONTENT IN EXECUTE STEPS AUTOMATICALLY: ", data)
-        print("EXECUTOR: ", executor)
-        step.executor = executor
-        step.save()
-        
-        if step.executor != 'agent':
-            # This step requires technician - keep it as in_progress
-            log_human_interaction(work_order, step, data['reason'])
-            return step
-        else:
-            # Agent can execute this step
-            step.status = "success"
-            step.executed_at = datetime.now(timezone.utc)
+    with buffered_logs(work_order) as log_buffer:
+        for step in plan_steps:
+            # Skip if we're starting from a specific step number
+            if start_from_step_number and step.step_number < start_from_step_number:
+                continue
+
+            set_step_status(step, "in_progress")
+            if progress:
+                progress(stage="executing", current_step=step.step_number)
+
+            if step.executor == 'technician':
+                # Classified when the plan was generated; nothing for the agent to run
+                log_human_interaction(work_order, step, step.executor_reason or "Requires a technician")
+                return step
+
+            msg = step_message(work_order, step)
+
+            with agent_invoke_timer(step.step_number):
+                result = agent.invoke({"messages": [msg]})
+            print(result)
+            # Step boundary: write the logs from this step's tool calls
+            log_buffer.flush()
+            latest_message = result["messages"][-1]
+            data = {}
+            executor = 'technician'
+            try:
+                data = json.loads(latest_message.content)
+            except:
+                executor = 'agent'
+            print("CONTENT IN EXECUTE STEPS AUTOMATICALLY: ", data)
+            print("EXECUTOR: ", executor)
+            step.executor = executor
             step.save()
+        
+            if step.executor != 'agent':
+                # This step requires technician - keep it as in_progress
+                log_human_interaction(work_order, step, data['reason'])
+                return step
+            else:
+                # Agent can execute this step
+                set_step_status(step, "success", executed_at=datetime.now(timezone.utc))
 
     return None  # All steps completed by agent
 
-def run_agent(state: Context):
-    prompt = f"""
-You are a data center expert AI assistant. Do not overcomplicate things, but provide enough details so that someone of relative expertise in the field would understand you. Be concise. You received the following ticket:
-
-Title: {state['work_order_title']}
-Description: {state['work_order_description']}
-
-Available tools (You are not able to use these tools directly, but try to generate steps that may be solvable via an orchestration of these tools, your best guess.):
-- create_log
-- shutdown_server
-- reboot_server
-- check_existing_specs
-- check_inventory
-- check_temperature
-- deploy_update
-- escalate_to_higher_engineer
-- order_supplies
-- run_diagnostics
-
-IMPORTANT: Break down the work order into steps that separate automated tasks from tasks requiring human intervention.
-
-STEP STRUCTURE GUIDELINES:
-1. Separate automated tasks (checking, diagnostics, data retrieval, remote operations) from physical tasks (replacement, installation, inspection, manual configuration)
-2. When possible, put automated steps BEFORE human intervention steps
-3. Each step should be clearly either automatable or require physical/human work
-4. Isolate human intervention to the minimum number of steps necessary
-
-Examples:
-- "Check and update Server X08's specifications" → Step 1: "Check current specifications for Server X08" (automatable), Step 2: "Update server specifications in system" (requires human/technician)
-- "Replace failed GPU in Server A12" → Step 1: "Run diagnostics on Server A12 to confirm GPU failure" (automatable), Step 2: "Check inventory for compatible GPU replacement" (automatable), Step 3: "Physically replace GPU card in Server A12" (requires technician)
-- "Reboot server and verify status" → Step 1: "Reboot Server X05" (automatable), Step 2: "Verify server is online and responding" (automatable)
-
-1. Decide the priority (low, medium, high)
-2. Decide the category (reboot, hardware, network, other)
-3. Decide estimated technician expertise (junior, mid, senior)
-4. Generate a step-by-step workflow plan. For each step:
-   - description, a concise one or two sentence description of how to execute the step.
-   - step_number, a whole number representing the order of the step
-   - Structure steps to maximize automation and minimize human intervention
-
-Return a JSON object with:
-- priority
-- category
-- estimated_expertise_level
-- steps: list of steps (each with step_number and description)
-
-DO NOT ESCAPE OR USE ANY SPECIAL NON-VALID JSON STRUCTURE. THIS INCLUDES CODE BLOCKS IN MARKDOWN.
-"""
-
-    result = llm.chat.completions.create(
-        model="nvidia/nvidia-nemotron-nano-9b-v2",
-        messages=[{"role": "system", "content": prompt}]
-    )
-
-    data = json.loads(result.choices[0].message.content)
-    print("--------------------------------")
-    print(result)
-    print()
-    print(data)
-    print("--------------------------------")
-
+def create_work_order(state: Context, fields, progress=None):
     work_order = WorkOrder(
         title=state['work_order_title'],
         description=state['work_order_description'],
-        priority=data['priority'],
-        category=data['category'],
-        estimated_expertise_level=data['estimated_expertise_level'],
+        priority=fields.get('priority', 'medium'),
+        category=fields.get('category', 'other'),
+        estimated_expertise_level=fields.get('estimated_expertise_level', 'mid'),
         status="pending",
         created_at=datetime.now(timezone.utc),
     )
-
     work_order.save()
+    if progress:
+        progress(stage="planned", work_order=work_order)
+    return work_order
 
-    plan_steps = [
-        PlanStep(
-            work_order=work_order,
-            step_number=step['step_number'],
-            description=step['description'],
-            executor="undecided",
-            status="pending",
-            result=None,
-            executed_at=None
-        ) for step in data['steps']
-    ]
-
-    PlanStep.objects.insert(plan_steps)
+def generate_plan(state: Context, plan_queue, progress=None):
+    """
+    Stream the plan for a ticket, saving the WorkOrder and each PlanStep as soon as it is complete.
 
-    all_steps = list(map(lambda x: f"Order: {x['step_number']}, Description: {x['description']}", data['steps']))
-    for i, step in enumerate(plan_steps):
-        current_plan_step = plan_steps[step['step_number']-1]
-        current_plan_step.status = "in_progress"
-        current_plan_step.save()
-        msg = build_message(work_order, step, all_steps)
-        
-        result = agent.invoke({
-            "messages": [msg]
-        })
-        print(result)
-        
-        # print(mapped)
-        # print(result)
-        most_recent_msg = result['messages'][-1]
-
-        content = {}
-        executor = 'technician'
-        try:
-            content = json.loads(most_recent_msg.content)
-        except:
-            executor = 'agent'
-        print("CONTENT: ", content)
-        current_plan_step.executor = executor
-        current_plan_step.save()
-        if current_plan_step.executor != 'agent':
-            log_human_interaction(work_order, current_plan_step, content['reason'])
-            break
+    Puts ("step", plan_step) on plan_queue for every saved step, then
+    ("done", work_order) once the plan is complete, or ("error", exception).
+    """
+    parser = PlanStreamParser()
+    work_order = None
+    plan_open = False
+    plan_steps = []
+    try:
+        with llm_call_site("planning"):
+            stream = llm.chat.completions.create(
+                model="nvidia/nvidia-nemotron-nano-9b-v2",
+                messages=planning_messages(state['work_order_title'], state['work_order_description']),
+                stream=True
+            )
+            for chunk in stream:
+                for step in parser.feed(chunk_text(chunk)):
+                    if work_order is None:
+                        # The fields before "steps" in the answer are complete by now
+                        work_order = create_work_order(state, parser.fields, progress)
+                        hold_plan_open(work_order)
+                        plan_open = True
+                    plan_step = PlanStep(
+                        work_order=work_order,
+                        step_number=step['step_number'],
+                        description=step['description'],
+                        executor="undecided",
+                        status="pending",
+                        result=None,
+                        executed_at=None
+                    )
+                    PlanStep.objects.insert([plan_step])
+                    add_steps(work_order, [plan_step])
+                    # Obvious technician steps are marked before the executor reaches them;
+                    # the step is not shared with the executor until it is queued
+                    apply_decisions([plan_step], classify_plan_steps(llm, work_order, [plan_step], use_llm=False))
+                    plan_steps.append(plan_step)
+                    plan_queue.put(("step", plan_step))
+
+        data = parser.result()
+
+        if work_order is None:
+            work_order = create_work_order(state, data, progress)
         else:
-            current_plan_step.status = "success"
-            current_plan_step.executed_at = datetime.utcnow()
+            late_fields = {
+                field: data[field] for field in ('priority', 'category', 'estimated_expertise_level')
+                if field in data and data[field] != getattr(work_order, field)
+            }
+            if late_fields:
+                WorkOrder.objects(id=work_order.id).update_one(**{f"set__{field}": value for field, value in late_fields.items()})
+            release_plan(work_order)
+            plan_open = False
+        if progress:
+            progress(steps_total=len(plan_steps))
+
+        # One concurrent round of classification calls for the rest of the
+        # plan instead of finding the technician steps one agent turn at a time.
+        # The executor reads the results from MongoDB when it starts each step.
+        technician_step = earliest_technician_step(plan_steps, classify_plan_steps(llm, work_order, plan_steps))
+        if progress and technician_step:
+            progress(technician_step=technician_step.step_number)
+    except Exception as e:
+        if plan_open:
+            # Steps were saved (and may have run) but the plan never finished:
+            # hand the work order to a technician instead of letting it complete
+            abandon_plan(work_order)
+            log = AgentLog(
+                work_order=work_order,
+                agent_action="Plan generation failed",
+                result=f"The plan stopped after {len(plan_steps)} steps: {str(e)}",
+                log_type="error",
+                timestamp=datetime.now(timezone.utc)
+            )
+            log.save()
+            publish_log(log)
+            e = RuntimeError(f"Plan generation for work order {work_order.id} failed after {len(plan_steps)} steps: {str(e)}")
+        plan_queue.put(("error", e))
+    else:
+        plan_queue.put(("done", work_order))
+
+def run_agent(state: Context, progress=None):
+    """
+    Plan a ticket and execute its steps, starting on step 1 while later steps are still being generated.
+
+    Returns:
+        The new WorkOrder
+    """
+    plan_queue = queue.Queue()
+    # Run in a copy of this context so cache bypass and similar settings carry over
+    planner = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(generate_plan, state, plan_queue, progress),
+        name="plan-stream",
+        daemon=True
+    )
+    planner.start()
+
+    stopped = False
+    with ExitStack() as stack:
+        log_buffer = None
+        while True:
+            kind, item = plan_queue.get()
+            if kind == "error":
+                raise item
+            if kind == "done":
+                work_order = item
+                break
+
+            current_plan_step = item
+            work_order = current_plan_step.work_order
+            if log_buffer is None:
+                log_buffer = stack.enter_context(buffered_logs(work_order))
+            if stopped:
+                # Waiting for a technician; the rest of the plan is only saved
+                continue
+
+            set_step_status(current_plan_step, "in_progress")
+            # The planner may have classified the step since it was queued; once
+            # it is in progress the classification can no longer change
+            classified = PlanStep.objects(id=current_plan_step.id).only('executor', 'executor_reason').as_pymongo().first() or {}
+            current_plan_step.executor = classified.get('executor', current_plan_step.executor)
+            current_plan_step.executor_reason = classified.get('executor_reason')
+            if progress:
+                progress(stage="executing", current_step=current_plan_step.step_number)
+            if current_plan_step.executor == 'technician':
+                # Classified when the step was generated; nothing for the agent to run
+                log_human_interaction(work_order, current_plan_step, current_plan_step.executor_reason or "Requires a technician")
+                stopped = True
+                continue
+            msg = step_message(work_order, current_plan_step)
+
+            with agent_invoke_timer(current_plan_step.step_number):
+                result = agent.invoke({
+                    "messages": [msg]
+                })
+            print(result)
+            # Step boundary: write the logs from this step's tool calls
+            log_buffer.flush()
+
+            most_recent_msg = result['messages'][-1]
+
+            content = {}
+            executor = 'technician'
+            try:
+                content = json.loads(most_recent_msg.content)
+            except:
+                executor = 'agent'
+            print("CONTENT: ", content)
+            current_plan_step.executor = executor
             current_plan_step.save()
+            if current_plan_step.executor != 'agent':
+                log_human_interaction(work_order, current_plan_step, content['reason'])
+                stopped = True
+            else:
+                set_step_status(current_plan_step, "success", executed_at=datetime.utcnow())
+
+    return work_order
 
 def regenerate_steps_from_issue(work_order, issue_description, from_step_number, completed_steps):
     """
@@ -318,79 +360,149 @@ def regenerate_steps_from_issue(work_order, issue_description, from_step_number,
     Returns:
         List of new step dictionaries with step_number and description
     """
-    # Build context of completed steps
-    completed_steps_context = ""
-    if completed_steps:
-        completed_steps_context = "\n\nCompleted steps so far:\n"
-        for step in completed_steps:
-            completed_steps_context += f"  Step {step.step_number}: {step.description}\n"
-            if step.result:
-                completed_steps_context += f"    Result: {step.result}\n"
-    
-    prompt = f"""
-You are a data center expert AI assistant. A technician encountered an issue while executing a work order and needs you to regenerate the remaining steps.
-
-Work Order:
-Title: {work_order.title}
-Description: {work_order.description}
-Priority: {work_order.priority}
-Category: {work_order.category}
-Estimated Expertise Level: {work_order.estimated_expertise_level}
-{completed_steps_context}
-
-Issue Encountered:
-The technician encountered an issue at step {from_step_number}. The issue description is:
-{issue_description}
-
-Your task:
-1. Analyze the issue and understand what went wrong
-2. Generate a new set of steps starting from step {from_step_number} that:
-   - Addresses the issue that was encountered
-   - Provides an alternative approach or solution
-   - Continues the work order to completion
-   - Takes into account what was already completed (the completed steps above)
-
-For each new step:
-   - description: A concise one or two sentence description of how to execute the step
-   - step_number: A whole number starting from {from_step_number}
-
-Return a JSON object with:
-- steps: list of steps (each with step_number and description)
-
-DO NOT ESCAPE OR USE ANY SPECIAL NON-VALID JSON STRUCTURE. THIS INCLUDES CODE BLOCKS IN MARKDOWN.
-"""
-
-    result = llm.chat.completions.create(
-        model="nvidia/nvidia-nemotron-nano-9b-v2",
-        messages=[{"role": "system", "content": prompt}]
-    )
+    with llm_call_site("regeneration"):
+        result = llm.chat.completions.create(
+            model="nvidia/nvidia-nemotron-nano-9b-v2",
+            messages=regeneration_messages(work_order, issue_description, from_step_number, completed_steps)
+        )
 
     data = json.loads(result.choices[0].message.content)
     return data['steps']
 
-def build_message(work_order, step, all_steps):
-    msg = {
-            "role": "user",
-            "content": f"""
-Work Order ID: {work_order.id}
-Work Order Title: {work_order.title}
-Work Order Description: {work_order.description}
-Priority: {work_order.priority}
-Category: {work_order.category}
-Estimated Expertise Level: {work_order.estimated_expertise_level}
-
-Current Step:
-- ID: {step['id']}
-- Order: {step['step_number']}
-- Description: {step['description']}
-
-If you can complete this task using your available tools, do so now.
-If you use ANY tools, they must all immediately be followed with a call to create_log, no exceptions.
-If this task requires a human technician (physical work, complex judgment, etc), respond with:
-{{"executor": "technician", "reason": "explanation"}}
-"""
+def normalize_description(description):
+    return " ".join((description or "").lower().split())
+
+def diff_plan(old_steps, new_steps_data, work_order):
+    """
+    Match a regenerated plan tail against the steps it replaces.
+
+    Pending steps whose description is unchanged are kept (with their id and
+    executor classification) and only renumbered if needed; other old steps
+    are deleted and unmatched new steps inserted.
+
+    Returns:
+        (plan_steps, operations, kept, removed, added); plan_steps is the new tail in step order
+    """
+    reusable = {}
+    for step in old_steps:
+        if step.status == "pending":
+            reusable.setdefault(normalize_description(step.description), []).append(step)
+
+    now = datetime.now(timezone.utc)
+    plan_steps, operations, kept, added = [], [], [], []
+    for data in new_steps_data:
+        matches = reusable.get(normalize_description(data['description']))
+        if matches:
+            step = matches.pop(0)
+            if step.step_number != data['step_number']:
+                operations.append(UpdateOne(
+                    {"_id": step.id},
+                    {"$set": {"step_number": data['step_number'], "updated_at": now}}
+                ))
+                step.step_number = data['step_number']
+                step.updated_at = now
+            kept.append(step)
+        else:
+            step = PlanStep(
+                id=ObjectId(),
+                work_order=work_order,
+                step_number=data['step_number'],
+                description=data['description'],
+                executor="undecided",
+                status="pending",
+                result=None,
+                executed_at=None
+            )
+            operations.append(InsertOne(step.to_mongo()))
+            added.append(step)
+        plan_steps.append(step)
+
+    kept_ids = {step.id for step in kept}
+    removed = [step for step in old_steps if step.id not in kept_ids]
+    if removed:
+        operations.insert(0, DeleteMany({"_id": {"$in": [step.id for step in removed]}}))
+    plan_steps.sort(key=lambda step: step.step_number)
+    return plan_steps, operations, kept, removed, added
+
+def handle_reported_issue(work_order, problematic_step, issue_description, progress=None):
+    """
+    Replace the plan from the problematic step onwards and resume automatic execution.
+
+    The regenerated steps are diffed against the current ones: unchanged
+    pending steps keep their ids and classification, and the deletes,
+    renumbers and inserts are written in one transaction.
+    
+    Args:
+        work_order: WorkOrder instance
+        problematic_step: PlanStep at which the technician hit the issue
+        issue_description: Description of the issue encountered
+        progress: Optional callback receiving progress fields as keyword arguments
+    
+    Returns:
+        Dictionary summarizing the deleted, kept, regenerated and first technician steps
+    """
+    # Get all plan steps for this work order, ordered by step_number
+    all_steps = PlanStep.objects(work_order=work_order).order_by('step_number')
+    
+    # Get completed steps before the problematic step (for context)
+    completed_steps = [
+        step for step in all_steps 
+        if step.step_number < problematic_step.step_number and step.status == "success"
+    ]
+    
+    # Steps from the problematic step onwards are replaced by the new plan
+    old_steps = [
+        step for step in all_steps 
+        if step.step_number >= problematic_step.step_number
+    ]
+    
+    if progress:
+        progress(stage="regenerating")
+    
+    # Regenerate steps from the problematic step onwards
+    new_steps_data = regenerate_steps_from_issue(
+        work_order=work_order,
+        issue_description=issue_description,
+        from_step_number=problematic_step.step_number,
+        completed_steps=completed_steps
+    )
+    
+    steps_to_execute, operations, kept_steps, removed_steps, new_plan_steps = diff_plan(
+        old_steps, new_steps_data, work_order
+    )
+    replace_plan_steps(work_order, operations, removed_steps, new_plan_steps)
+
+    # Kept steps already carry their classification
+    decisions = classify_plan_steps(llm, work_order, steps_to_execute)
+    apply_decisions(steps_to_execute, decisions)
+    technician_step = earliest_technician_step(steps_to_execute, decisions)
+    if progress and technician_step:
+        progress(stage="classified", technician_step=technician_step.step_number)
+    
+    # Automatically execute the new steps (agent will do what it can)
+    first_technician_step = execute_steps_automatically(
+        work_order=work_order,
+        plan_steps=steps_to_execute,
+        start_from_step_number=problematic_step.step_number,
+        progress=progress
+    )
+    
+    
+    return {
+        "deleted_steps_count": len(removed_steps),
+        "kept_steps_count": len(kept_steps),
+        "new_steps_count": len(new_plan_steps),
+        "first_technician_step_id": str(first_technician_step.id) if first_technician_step else None,
+        "new_steps": [
+            {
+                "id": str(step.id),
+                "step_number": step.step_number,
+                "description": step.description,
+                "status": step.status,
+                "executor": step.executor
+            } for step in steps_to_execute
+        ]
     }
-    return msg
 
 def log_human_interaction(work_order, plan_step, reasoning):
     print(f"[LOG] Step {work_order.id} | WorkOrder {plan_step.id}")
@@ -399,6 +511,9 @@ def log_human_interaction(work_order, plan_step, reasoning):
         related_step=plan_step,
         agent_action="Human intervention requested",
         result=reasoning,
+        # Not routine, so log retention neither expires nor rolls it up
+        log_type="warning",
         timestamp=datetime.utcnow()
     )
-    log.save()
\ No newline at end of file
+    log.save()
+    publish_log(log)
@@ -0,0 +1,146 @@
+"""
+Prometheus metrics for the agent, its tools, MongoDB and the API.
+
+Metrics live in the default prometheus_client registry and are served by the
+/metrics route (routes/metrics.py), or by start_http_server in processes that
+do not run Flask (scripts/run_job_workers.py).
+
+LLM metrics are labelled with a call site (planning, regeneration,
+classification, step_execution) taken from the llm_call_site() block the
+call runs in.
+"""
+import time
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+from prometheus_client import Counter, Histogram, Gauge
+
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds", "LLM call latency including gateway retries", ["call_site"],
+    buckets=LLM_LATENCY_BUCKETS
+)
+LLM_TOKENS = Histogram(
+    "llm_tokens", "Tokens per LLM call", ["call_site", "kind"], buckets=TOKEN_BUCKETS
+)
+PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Estimated prompt tokens per LLM call, static instructions vs ticket data",
+    ["call_site", "part"], buckets=TOKEN_BUCKETS
+)
+PROMPT_TRUNCATIONS = Counter(
+    "llm_prompt_truncations_total", "Prompts cut down to fit the token budget", ["call_site"]
+)
+LLM_ERRORS = Counter("llm_request_errors_total", "LLM calls that failed after retries", ["call_site"])
+AGENT_INVOKE_SECONDS = Histogram(
+    "agent_invoke_duration_seconds", "agent.invoke duration for one plan step", ["call_site", "step_number"],
+    buckets=LLM_LATENCY_BUCKETS
+)
+TOOL_SECONDS = Histogram("tool_call_duration_seconds", "Agent tool latency", ["tool"], buckets=FAST_BUCKETS)
+TOOL_ERRORS = Counter("tool_call_errors_total", "Agent tool calls that raised", ["tool"])
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ["command"], buckets=FAST_BUCKETS
+)
+MONGO_COMMAND_ERRORS = Counter("mongo_command_errors_total", "MongoDB commands that failed", ["command"])
+STEP_CLASSIFICATIONS = Counter(
+    "step_classifications_total", "Plan steps classified before execution", ["method", "executor"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Flask request latency", ["endpoint", "method", "status"],
+    buckets=FAST_BUCKETS
+)
+
+_call_site = ContextVar("llm_call_site", default=None)
+
+
+@contextmanager
+def llm_call_site(name):
+    """Label the LLM calls made inside the block with a call site"""
+    token = _call_site.set(name)
+    try:
+        yield
+    finally:
+        _call_site.reset(token)
+
+
+def current_call_site(default="unknown"):
+    return _call_site.get() or default
+
+
+def _token_counts(result):
+    """(prompt, completion) token counts from an OpenAI ChatCompletion or a LangChain ChatResult"""
+    usage = getattr(result, "usage", None)
+    if usage is not None:
+        return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    for generation in getattr(result, "generations", None) or []:
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+            return usage.get("input_tokens"), usage.get("output_tokens")
+    return None, None
+
+
+def observe_llm_call(call_site, seconds, result=None, error=None):
+    if error is not None:
+        LLM_ERRORS.labels(call_site).inc()
+        return
+    LLM_REQUEST_SECONDS.labels(call_site).observe(seconds)
+    prompt_tokens, completion_tokens = _token_counts(result)
+    if prompt_tokens is not None:
+        LLM_TOKENS.labels(call_site, "prompt").observe(prompt_tokens)
+    if completion_tokens is not None:
+        LLM_TOKENS.labels(call_site, "completion").observe(completion_tokens)
+
+
+@contextmanager
+def agent_invoke_timer(step_number, call_site="step_execution"):
+    """Time one agent.invoke for a plan step; its model calls are labelled with the call site"""
+    start = time.perf_counter()
+    with llm_call_site(call_site):
+        try:
+            yield
+        finally:
+            AGENT_INVOKE_SECONDS.labels(call_site, str(step_number)).observe(time.perf_counter() - start)
+
+
+def timed_tool(func):
+    """Record latency and errors of an agent tool; apply below @tool"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            TOOL_ERRORS.labels(name).inc()
+            raise
+        finally:
+            TOOL_SECONDS.labels(name).observe(time.perf_counter() - start)
+    return wrapper
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_ERRORS.labels(event.command_name).inc()
+
+
+# Applies to every MongoClient created after this module is imported
+monitoring.register(MongoCommandMetrics())
+
+
+def register_cache_metrics(stats):
+    """Export the LLM completion cache counters, read from stats() at scrape time"""
+    for key in ("hits", "misses", "entries"):
+        Gauge(f"llm_cache_{key}", f"LLM completion cache {key}").set_function(
+            lambda key=key: stats()[key]
+        )
@@ -0,0 +1,118 @@
+"""
+Incremental parsing of a streamed plan.
+
+The planning call returns one JSON object:
+{"priority": ..., "category": ..., "estimated_expertise_level": ..., "steps": [{...}, ...]}
+
+PlanStreamParser is fed the completion text as it streams in and hands back
+each object of "steps" as soon as its closing brace arrives, so the step can
+be saved and executed while the model is still writing the next ones. The
+other top-level fields are collected in parser.fields as they complete.
+"""
+import json
+
+STEPS_KEY = "steps"
+
+
+def chunk_text(chunk):
+    """Content delta carried by a ChatCompletionChunk"""
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+class PlanStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._root_start = None
+        self._root_end = None
+        self._key = None
+        self._expect_key = False
+        self._value_start = None
+        self._step_start = None
+
+    def _end_value(self, end):
+        """A top-level value ended at buffer[end]"""
+        if self._value_start is not None and self._key is not None:
+            self.fields[self._key] = json.loads(self.buffer[self._value_start:end])
+        self._value_start = None
+
+    def feed(self, text):
+        """
+        Add streamed text.
+
+        Returns:
+            The step objects completed by this text, in order
+        """
+        self.buffer += text
+        steps = []
+        while self._pos < len(self.buffer) and self._root_end is None:
+            i = self._pos
+            c = self.buffer[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._expect_key:
+                            self._key = json.loads(self.buffer[self._value_start:i + 1])
+                            self._expect_key = False
+                            self._value_start = None
+                        else:
+                            self._end_value(i + 1)
+                continue
+
+            if self._depth == 0:
+                # Anything before the root object (e.g. a stray code fence) is skipped
+                if c == "{":
+                    self._root_start = i
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._value_start = i
+            elif c in "{[":
+                if self._depth == 1:
+                    self._value_start = i
+                elif self._depth == 2 and c == "{" and self._key == STEPS_KEY:
+                    self._step_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 2 and c == "}" and self._step_start is not None:
+                    steps.append(json.loads(self.buffer[self._step_start:i + 1]))
+                    self._step_start = None
+                elif self._depth == 1:
+                    self._end_value(i + 1)
+                elif self._depth == 0:
+                    # Closing the root ends a bare number/true/false/null value
+                    if self._value_start is not None:
+                        self._end_value(i)
+                    self._root_end = i + 1
+            elif self._depth == 1:
+                if c == ",":
+                    if self._value_start is not None:
+                        self._end_value(i)
+                    self._expect_key = True
+                elif c != ":" and not c.isspace() and self._value_start is None and not self._expect_key:
+                    self._value_start = i
+        return steps
+
+    def result(self):
+        """The whole plan object; raises ValueError if the stream ended before it was complete"""
+        if self._root_end is None:
+            raise ValueError("Plan stream ended before the JSON object was complete")
+        return json.loads(self.buffer[self._root_start:self._root_end])
@@ -0,0 +1,237 @@
+"""
+Prompt construction for planning, regeneration and step execution.
+
+Instructions that never change are kept in static system prompts and the
+per-ticket data goes in a separate user message, so every request starts
+with the same prefix (which the endpoint and the completion cache can reuse)
+and only the short ticket-specific part varies.
+
+Ticket-specific parts are held to a token budget:
+- PROMPT_TOKEN_BUDGET caps the user message of planning and regeneration
+  calls. Completed step context is kept newest first; older steps are cut
+  down to their description, then dropped with a note, until it fits.
+- PROMPT_DESCRIPTION_TOKENS caps the work order description repeated in
+  each step message, PROMPT_STEP_RESULT_TOKENS each completed step result.
+
+Token counts are estimated from length (PROMPT_CHARS_PER_TOKEN characters
+per token) and exported as the llm_prompt_tokens histogram.
+"""
+import os
+from .metrics import PROMPT_TOKENS, PROMPT_TRUNCATIONS
+from .step_classifier import AGENT_TOOLS
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+PROMPT_DESCRIPTION_TOKENS = int(os.getenv("PROMPT_DESCRIPTION_TOKENS", "300"))
+PROMPT_STEP_RESULT_TOKENS = int(os.getenv("PROMPT_STEP_RESULT_TOKENS", "80"))
+CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "4"))
+
+TOOLS_LIST = "\n".join(f"- {name}" for name in ["create_log"] + AGENT_TOOLS)
+
+PLANNING_INSTRUCTIONS = f"""
+You are a data center expert AI assistant. Do not overcomplicate things, but provide enough details so that someone of relative expertise in the field would understand you. Be concise. The user message contains the ticket to plan.
+
+Available tools (You are not able to use these tools directly, but try to generate steps that may be solvable via an orchestration of these tools, your best guess.):
+{TOOLS_LIST}
+
+IMPORTANT: Break down the work order into steps that separate automated tasks from tasks requiring human intervention.
+
+STEP STRUCTURE GUIDELINES:
+1. Separate automated tasks (checking, diagnostics, data retrieval, remote operations) from physical tasks (replacement, installation, inspection, manual configuration)
+2. When possible, put automated steps BEFORE human intervention steps
+3. Each step should be clearly either automatable or require physical/human work
+4. Isolate human intervention to the minimum number of steps necessary
+
+Examples:
+- "Check and update Server X08's specifications" → Step 1: "Check current specifications for Server X08" (automatable), Step 2: "Update server specifications in system" (requires human/technician)
+- "Replace failed GPU in Server A12" → Step 1: "Run diagnostics on Server A12 to confirm GPU failure" (automatable), Step 2: "Check inventory for compatible GPU replacement" (automatable), Step 3: "Physically replace GPU card in Server A12" (requires technician)
+- "Reboot server and verify status" → Step 1: "Reboot Server X05" (automatable), Step 2: "Verify server is online and responding" (automatable)
+
+1. Decide the priority (low, medium, high)
+2. Decide the category (reboot, hardware, network, other)
+3. Decide estimated technician expertise (junior, mid, senior)
+4. Generate a step-by-step workflow plan. For each step:
+   - description, a concise one or two sentence description of how to execute the step.
+   - step_number, a whole number representing the order of the step
+   - Structure steps to maximize automation and minimize human intervention
+
+Return a JSON object with:
+- priority
+- category
+- estimated_expertise_level
+- steps: list of steps (each with step_number and description)
+
+DO NOT ESCAPE OR USE ANY SPECIAL NON-VALID JSON STRUCTURE. THIS INCLUDES CODE BLOCKS IN MARKDOWN.
+"""
+
+REGENERATION_INSTRUCTIONS = """
+You are a data center expert AI assistant. A technician encountered an issue while executing a work order and needs you to regenerate the remaining steps. The user message contains the work order, the steps completed so far and the issue.
+
+Your task:
+1. Analyze the issue and understand what went wrong
+2. Generate a new set of steps starting from the step where the issue was encountered that:
+   - Addresses the issue that was encountered
+   - Provides an alternative approach or solution
+   - Continues the work order to completion
+   - Takes into account what was already completed (the completed steps)
+
+For each new step:
+   - description: A concise one or two sentence description of how to execute the step
+   - step_number: A whole number starting from the step where the issue was encountered
+
+Return a JSON object with:
+- steps: list of steps (each with step_number and description)
+
+DO NOT ESCAPE OR USE ANY SPECIAL NON-VALID JSON STRUCTURE. THIS INCLUDES CODE BLOCKS IN MARKDOWN.
+"""
+
+# System prompt of the execution agent; step messages carry only the work order and step
+AGENT_INSTRUCTIONS = """
+You are a Data Center AI Assistant responsible for executing maintenance tasks.
+
+Your role:
+- Execute tasks using your available tools whenever possible
+- When you can complete a task with your tools, DO IT immediately - don't just describe what you would do
+- Only defer to a technician when the task requires physical work or capabilities you don't have
+
+This is a demo environment - be proactive with tool usage.
+
+When you call any tool (e.g. reboot_server, shutdown_server, etc.), 
+you must immediately and ALWAYS follow it with a call to the create_log tool.
+
+The create_log tool must include:
+- The plan_step_id and work_order_id you were given
+- A short, natural-language summary of what you just did (the “action”)
+- The result or return value of the tool you just called (the “result”)
+
+Examples of what you CAN do:
+- "Reboot server A45" → Use reboot_server tool with server_id="A45"
+- "Check temperature readings" → Use check_temperature tool
+- "Run diagnostics on server B12" → Use run_diagnostics tool with server_id="B12"
+
+Examples of what requires a TECHNICIAN:
+- "Replace the failed hard drive in rack 3"
+- "Physically inspect the server for damage"
+- "Install new RAM modules"
+
+Each user message gives you the work order and the current step to execute.
+
+If you cannot complete a task with your available tools, respond ONLY with:
+{"executor": "technician", "reason": "explanation of why physical access or unavailable capability is needed"}
+
+Otherwise, execute the task using your tools.
+"""
+
+
+def count_tokens(text):
+    """Estimated token count of a string"""
+    return int(len(text or "") / CHARS_PER_TOKEN + 0.999)
+
+
+def truncate_to_tokens(text, max_tokens):
+    text = text or ""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 3)].rstrip() + "..."
+
+
+def record_prompt_size(call_site, static, dynamic):
+    PROMPT_TOKENS.labels(call_site, "static").observe(count_tokens(static))
+    PROMPT_TOKENS.labels(call_site, "dynamic").observe(count_tokens(dynamic))
+
+
+def completed_steps_context(completed_steps, budget):
+    """
+    Completed steps rendered newest first into at most `budget` tokens, returned in step order.
+
+    Steps that do not fit in full are reduced to their description, and the
+    oldest ones are replaced by a count once even that does not fit.
+
+    Returns:
+        (context, truncated)
+    """
+    lines = []
+    used = 0
+    truncated = False
+    cut_down = False
+    steps = sorted(completed_steps, key=lambda step: step.step_number, reverse=True)
+    for index, step in enumerate(steps):
+        full = f"  Step {step.step_number}: {step.description}\n"
+        if step.result:
+            result = truncate_to_tokens(step.result, PROMPT_STEP_RESULT_TOKENS)
+            truncated = truncated or result != step.result
+            full += f"    Result: {result}\n"
+        short = f"  Step {step.step_number}: {truncate_to_tokens(step.description, 30)}\n"
+        # Once a step has been cut down, older steps are not shown in more detail
+        for candidate in ((short,) if cut_down else (full, short)):
+            if used + count_tokens(candidate) <= budget:
+                lines.append(candidate)
+                used += count_tokens(candidate)
+                cut_down = cut_down or candidate is short
+                break
+        else:
+            omitted = len(steps) - index
+            lines.append(f"  ({omitted} earlier completed step{'s' if omitted != 1 else ''} omitted)\n")
+            truncated = True
+            break
+    return "".join(reversed(lines)), truncated or cut_down
+
+
+def planning_messages(title, description):
+    header = f"Title: {title}\nDescription: "
+    description_budget = max(0, PROMPT_TOKEN_BUDGET - count_tokens(header))
+    if count_tokens(description) > description_budget:
+        PROMPT_TRUNCATIONS.labels("planning").inc()
+    ticket = header + truncate_to_tokens(description, description_budget)
+    record_prompt_size("planning", PLANNING_INSTRUCTIONS, ticket)
+    return [
+        {"role": "system", "content": PLANNING_INSTRUCTIONS},
+        {"role": "user", "content": ticket},
+    ]
+
+
+def regeneration_messages(work_order, issue_description, from_step_number, completed_steps):
+    work_order_block = f"""Work Order:
+Title: {work_order.title}
+Description: {truncate_to_tokens(work_order.description, PROMPT_DESCRIPTION_TOKENS)}
+Priority: {work_order.priority}
+Category: {work_order.category}
+Estimated Expertise Level: {work_order.estimated_expertise_level}
+"""
+    issue_block = f"""
+Issue Encountered:
+The technician encountered an issue at step {from_step_number}. The issue description is:
+{truncate_to_tokens(issue_description, PROMPT_DESCRIPTION_TOKENS)}
+
+Regenerate the steps starting from step {from_step_number}.
+"""
+    context = ""
+    if completed_steps:
+        header = "\nCompleted steps so far:\n"
+        budget = PROMPT_TOKEN_BUDGET - count_tokens(work_order_block + header + issue_block)
+        steps_context, truncated = completed_steps_context(completed_steps, max(0, budget))
+        if truncated:
+            PROMPT_TRUNCATIONS.labels("regeneration").inc()
+        context = header + steps_context
+    content = work_order_block + context + issue_block
+    record_prompt_size("regeneration", REGENERATION_INSTRUCTIONS, content)
+    return [
+        {"role": "system", "content": REGENERATION_INSTRUCTIONS},
+        {"role": "user", "content": content},
+    ]
+
+
+def step_message(work_order, step):
+    """User message for one execution agent step; the instructions live in AGENT_INSTRUCTIONS"""
+    content = f"""
+Work Order ID: {work_order.id}
+Work Order Title: {work_order.title}
+Work Order Description: {truncate_to_tokens(work_order.description, PROMPT_DESCRIPTION_TOKENS)}
+
+Current Step:
+- ID: {step['id']}
+- Order: {step['step_number']}
+- Description: {step['description']}
+"""
+    record_prompt_size("step_execution", AGENT_INSTRUCTIONS, content)
+    return {"role": "user", "content": content}
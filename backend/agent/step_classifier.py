@@ -0,0 +1,257 @@
+"""
+Up-front executor classification of plan steps.
+
+As soon as a plan is generated, every step is classified as agent or
+technician work. Steps that obviously need hands on hardware ("Physically
+replace GPU card", "Install new RAM modules") are caught by local rules
+without calling the model; the rest get one LLM call per step, all issued
+concurrently. The execution loops then stop at the first technician step
+without asking the agent about it again, and the work order shows which step
+needs a technician before the automated steps ahead of it have finished
+running.
+"""
+import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from models.PlanStep import PlanStep
+from .metrics import llm_call_site, STEP_CLASSIFICATIONS
+
+CLASSIFY_STEPS_UPFRONT = os.getenv("CLASSIFY_STEPS_UPFRONT", "1") == "1"
+CLASSIFY_WORKERS = int(os.getenv("CLASSIFY_WORKERS", "8"))
+CLASSIFY_MODEL = "nvidia/nvidia-nemotron-nano-9b-v2"
+# Rule score needed to mark a step for a technician without asking the LLM (above 1 disables the rules).
+# Scores are fixed heuristic weights, not calibrated probabilities, so keep the threshold conservative.
+RULE_CONFIDENCE_THRESHOLD = float(os.getenv("STEP_RULE_CONFIDENCE_THRESHOLD", "0.9"))
+
+# Wording that means hands on hardware whatever the object
+PHYSICAL_WORDING = (re.compile(r"\b(physically|manually|by hand|on[- ]site|in person)\b"), 0.95)
+# (pattern, score) for verbs that are physical work when their object is hardware
+PHYSICAL_VERBS = [
+    (re.compile(r"\b(replace|swap|reseat|re-seat|unplug|plug in|rack|unrack|remove|insert)\b"), 0.85),
+    (re.compile(r"\b(install|mount|attach|connect|reconnect|recable|re-cable|label|clean|dust|inspect|examine)\b"), 0.8),
+]
+# Added when a hardware part is the object of the physical verb
+HARDWARE_OBJECT_BONUS = 0.1
+# Parts a technician handles
+HARDWARE = re.compile(
+    r"\b(gpus?|cards?|ram|dimms?|memory modules?|disks?|drives?|ssds?|hdds?|nvme|psus?|power suppl(y|ies)|"
+    r"fans?|cables?|nics?|transceivers?|optics?|sfps?|motherboards?|cpus?|heatsinks?|chassis|blades?|servers? rack)\b"
+)
+# The object phrase of a verb ends at a preposition, conjunction or punctuation
+# ("Remove stale entries | from the disk cache"), and is at most OBJECT_WORDS words
+OBJECT_END = re.compile(r"\b(from|on|onto|in|into|to|with|and|or|for|at|using|via|then|if|so)\b|[,.;:()]")
+OBJECT_WORDS = 6
+# Wording the agent tools cover (software installs, reboots, diagnostics, orders)
+AGENT_CUES = re.compile(
+    r"\b(reboot|restart|shut ?down|power cycle|diagnostics?|temperature|specs|specifications|inventory|deploy|"
+    r"update|upgrade|patch|firmware|software|drivers?|packages?|order|escalate|notify|remotely|remote)\b"
+)
+AGENT_CUE_PENALTY = 0.3
+# Wording that puts the step in software ("Clean up old log files", "Remove the disk from the
+# RAID array with mdadm", "Label the partitions"); the rules stay out and the LLM decides
+SOFTWARE_CUES = re.compile(
+    r"\b(consoles?|logs?|files?|caches?|partitions?|mdadm|ssh|commands?|cli|shell|terminal|scripts?|"
+    r"entries|director(y|ies)|filesystems?|processes|services?)\b"
+)
+
+# Keep in sync with the tools given to the execution agent in main_agent
+AGENT_TOOLS = [
+    "shutdown_server",
+    "reboot_server",
+    "check_existing_specs",
+    "check_inventory",
+    "check_temperature",
+    "deploy_update",
+    "escalate_to_higher_engineer",
+    "order_supplies",
+    "run_diagnostics",
+]
+
+
+def build_classification_prompt(work_order, step, all_steps):
+    tools_list = "\n".join(f"- {name}" for name in AGENT_TOOLS)
+    plan = "\n".join(all_steps)
+    return f"""
+You are deciding who will execute one step of a data center work order plan.
+
+Work Order Title: {work_order.title}
+Work Order Description: {work_order.description}
+
+Full plan:
+{plan}
+
+Step to classify:
+- Order: {step.step_number}
+- Description: {step.description}
+
+An AI agent can execute the step if it can be done remotely with these tools:
+{tools_list}
+
+A technician is required for physical work (replacing, installing, inspecting hardware) or
+capabilities the tools above do not provide.
+
+Respond ONLY with a JSON object:
+{{"executor": "agent" or "technician", "reason": "one sentence explanation"}}
+
+DO NOT ESCAPE OR USE ANY SPECIAL NON-VALID JSON STRUCTURE. THIS INCLUDES CODE BLOCKS IN MARKDOWN.
+"""
+
+
+def _verb_object(text, verb_end):
+    """The object phrase following a verb"""
+    rest = text[verb_end:]
+    end = OBJECT_END.search(rest)
+    if end:
+        rest = rest[:end.start()]
+    return " ".join(rest.split()[:OBJECT_WORDS])
+
+
+def classify_by_rules(description):
+    """
+    Decide from the step wording alone whether it needs a technician.
+
+    A physical verb only counts its hardware bonus when the part is the verb's
+    object ("Replace the failed GPU", not "Remove entries from the disk
+    cache"), and any software cue cancels the rules entirely.
+
+    Returns:
+        (score, reason); score is 0 when no physical wording matched
+    """
+    text = (description or "").lower()
+    if SOFTWARE_CUES.search(text):
+        return 0.0, None
+    best, matched, part = 0.0, None, None
+    pattern, score = PHYSICAL_WORDING
+    match = pattern.search(text)
+    if match:
+        best, matched = score, match.group(1)
+    for pattern, score in PHYSICAL_VERBS:
+        for match in pattern.finditer(text):
+            hardware = HARDWARE.search(_verb_object(text, match.end()))
+            if hardware:
+                score_with_object = min(1.0, score + HARDWARE_OBJECT_BONUS)
+            else:
+                score_with_object = score
+            if score_with_object > best:
+                best, matched = score_with_object, match.group(1)
+                part = hardware.group(0) if hardware else None
+    if matched is None:
+        return 0.0, None
+    # "Install firmware update", "Reboot and reconnect remotely" are agent work
+    if AGENT_CUES.search(text):
+        best -= AGENT_CUE_PENALTY
+    best = round(max(0.0, best), 2)
+    reason = f"Rule match: '{matched}'" + (f" on '{part}'" if part else "") + " requires physical access"
+    return best, reason
+
+
+def classify_step(client, work_order, step, all_steps):
+    """
+    Ask the LLM who should execute a step.
+
+    Returns:
+        (executor, reason); executor is "undecided" if the answer could not be used
+    """
+    result = client.chat.completions.create(
+        model=CLASSIFY_MODEL,
+        temperature=0.0,
+        messages=[{"role": "system", "content": build_classification_prompt(work_order, step, all_steps)}]
+    )
+    try:
+        data = json.loads(result.choices[0].message.content)
+    except (TypeError, ValueError):
+        return "undecided", None
+    executor = data.get("executor") if isinstance(data, dict) else None
+    if executor not in ("agent", "technician"):
+        return "undecided", None
+    return executor, data.get("reason")
+
+
+def classify_plan_steps(client, work_order, plan_steps, use_llm=True):
+    """
+    Classify every pending step of a plan concurrently and store the result in PlanStep.executor.
+
+    Steps the local rules mark as technician work with at least
+    RULE_CONFIDENCE_THRESHOLD confidence skip the LLM. A step whose
+    classification fails stays "undecided" and is decided by the execution
+    agent as before.
+
+    Only steps that are still pending and undecided in MongoDB are written, so
+    a step the execution loop has already started keeps the executor the agent
+    gives it. The PlanStep instances passed in are not modified (another
+    thread may be executing them); apply the returned decisions with
+    apply_decisions() where that is safe.
+
+    Args:
+        client: OpenAI-compatible client used for the classification calls
+        work_order: WorkOrder instance
+        plan_steps: PlanStep instances of the plan, already saved
+        use_llm: False to apply only the local rules (e.g. to a step of a plan still being generated)
+
+    Returns:
+        {step id: (executor, reason)} for the steps that were decided
+    """
+    steps = sorted(
+        (step for step in plan_steps if step.status == "pending" and step.executor == "undecided"),
+        key=lambda step: step.step_number
+    )
+    if not steps:
+        return {}
+
+    decisions = {}
+    for step in steps:
+        confidence, reason = classify_by_rules(step.description)
+        if confidence >= RULE_CONFIDENCE_THRESHOLD:
+            decisions[step.id] = ("technician", reason)
+            STEP_CLASSIFICATIONS.labels("rules", "technician").inc()
+    llm_steps = [step for step in steps if step.id not in decisions] if CLASSIFY_STEPS_UPFRONT and use_llm else []
+
+    all_steps = [
+        f"Order: {step.step_number}, Description: {step.description}"
+        for step in sorted(plan_steps, key=lambda step: step.step_number)
+    ]
+
+    def classify(step):
+        try:
+            # Pool threads do not inherit context, so label the call here
+            with llm_call_site("classification"):
+                executor, reason = classify_step(client, work_order, step, all_steps)
+        except Exception as e:
+            print(f"[CLASSIFY] Step {step.step_number} of WorkOrder {work_order.id} failed: {str(e)}")
+            executor, reason = "undecided", None
+        STEP_CLASSIFICATIONS.labels("llm", executor).inc()
+        return executor, reason
+
+    if llm_steps:
+        with ThreadPoolExecutor(max_workers=min(CLASSIFY_WORKERS, len(llm_steps))) as pool:
+            decisions.update(zip((step.id for step in llm_steps), pool.map(classify, llm_steps)))
+
+    decisions = {step_id: decision for step_id, decision in decisions.items() if decision[0] != "undecided"}
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne(
+            # Leave steps the execution loop has already picked up alone
+            {"_id": step_id, "status": "pending", "executor": "undecided"},
+            {"$set": {"executor": executor, "executor_reason": reason, "updated_at": now}}
+        )
+        for step_id, (executor, reason) in decisions.items()
+    ]
+    if operations:
+        PlanStep._get_collection().bulk_write(operations, ordered=False)
+    return decisions
+
+
+def earliest_technician_step(plan_steps, decisions):
+    """The lowest numbered step decided as technician work, or None"""
+    technician_steps = [step for step in plan_steps if decisions.get(step.id, (None,))[0] == "technician"]
+    return min(technician_steps, key=lambda step: step.step_number, default=None)
+
+
+def apply_decisions(plan_steps, decisions):
+    """Copy classification decisions onto PlanStep instances owned by the calling thread"""
+    for step in plan_steps:
+        if step.id in decisions:
+            step.executor, step.executor_reason = decisions[step.id]
@@ -0,0 +1,240 @@
+"""
+Denormalized step counters on WorkOrder.
+
+Every PlanStep status change goes through set_step_status, which flips the step
+with a conditional update and then adjusts the owning work order's counters
+with $inc, so WorkOrder.status can be kept current without joining plan_step.
+"""
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from models.WorkOrder import WorkOrder
+from models.PlanStep import PlanStep
+
+# Returned by a standalone mongod, which has no transactions
+ILLEGAL_OPERATION = 20
+
+# PlanStep status -> WorkOrder counter tracking it
+STATUS_COUNTERS = {
+    "success": "steps_succeeded",
+    "in_progress": "steps_in_progress",
+}
+
+
+def derive_status(current_status, steps_total, steps_succeeded, steps_in_progress):
+    """Derive a work order's status from its step counters (no steps keeps the current status)"""
+    if not steps_total:
+        return current_status
+    if steps_succeeded >= steps_total:
+        # All steps completed
+        return "completed"
+    if current_status == "escalated":
+        # Escalation is only cleared explicitly or by finishing the plan
+        return current_status
+    if steps_succeeded > 0 or steps_in_progress > 0:
+        # At least one step is complete or in progress
+        return "in_progress"
+    # No steps completed yet
+    return "pending"
+
+
+def _apply_counter_changes(work_order_id, inc, extra_set=None):
+    """$inc the counters of a work order and bring its status in line with them."""
+    now = datetime.now(timezone.utc)
+    updates = {f"inc__{field}": amount for field, amount in inc.items() if amount}
+    updates["set__updated_at"] = now
+    for field, value in (extra_set or {}).items():
+        updates[f"set__{field}"] = value
+    work_order = WorkOrder.objects(id=work_order_id).only(
+        'status', 'steps_total', 'steps_succeeded', 'steps_in_progress'
+    ).modify(new=True, **updates)
+    if work_order is None:
+        return None
+
+    status = derive_status(
+        work_order.status,
+        work_order.steps_total,
+        work_order.steps_succeeded,
+        work_order.steps_in_progress,
+    )
+    if status != work_order.status:
+        # Guarded on the counters we derived from; a concurrent change that
+        # moved them on will set the status itself. updated_at moves past the
+        # counter write's (Mongo stores milliseconds), so an ETag cached
+        # between the two writes does not keep serving the old status.
+        WorkOrder.objects(
+            id=work_order_id,
+            steps_total=work_order.steps_total,
+            steps_succeeded=work_order.steps_succeeded,
+            steps_in_progress=work_order.steps_in_progress,
+        ).update_one(
+            set__status=status,
+            set__updated_at=max(datetime.now(timezone.utc), now + timedelta(milliseconds=1)),
+        )
+    return status
+
+
+def set_step_status(step, status, **fields):
+    """
+    Move a PlanStep to a new status and update its work order's counters.
+
+    Args:
+        step: PlanStep instance
+        status: New PlanStep status
+        **fields: Other PlanStep fields to set in the same update (e.g. executed_at)
+
+    Returns:
+        True if the status changed, False if the step already had it
+    """
+    updates = {f"set__{field}": value for field, value in fields.items()}
+    updates["set__updated_at"] = datetime.now(timezone.utc)
+    previous = PlanStep.objects(id=step.id, status__ne=status).only('status').modify(
+        new=False, set__status=status, **updates
+    )
+    if previous is None and fields:
+        # Status unchanged, still record the other fields
+        PlanStep.objects(id=step.id).update_one(**updates)
+
+    # Keep the in-memory document in sync for callers that save it again later
+    step.status = status
+    for field, value in fields.items():
+        setattr(step, field, value)
+
+    if previous is None:
+        return False
+
+    inc = {}
+    if previous.status in STATUS_COUNTERS:
+        inc[STATUS_COUNTERS[previous.status]] = -1
+    if status in STATUS_COUNTERS:
+        inc[STATUS_COUNTERS[status]] = inc.get(STATUS_COUNTERS[status], 0) + 1
+    extra_set = {"current_step_number": step.step_number} if status == "in_progress" else None
+    _apply_counter_changes(step.work_order.id, inc, extra_set)
+    return True
+
+
+def _counts_for(steps):
+    inc = {"steps_total": len(steps)}
+    for step in steps:
+        if step.status in STATUS_COUNTERS:
+            counter = STATUS_COUNTERS[step.status]
+            inc[counter] = inc.get(counter, 0) + 1
+    return inc
+
+
+def add_steps(work_order, steps):
+    """Account for PlanSteps inserted into a work order's plan."""
+    if steps:
+        _apply_counter_changes(work_order.id, _counts_for(steps))
+
+
+def hold_plan_open(work_order):
+    """
+    Count one placeholder step while a plan is still being generated, so the
+    steps finished so far cannot mark the work order completed.
+    """
+    _apply_counter_changes(work_order.id, {"steps_total": 1})
+
+
+def release_plan(work_order):
+    """Drop the placeholder step once the plan is fully generated"""
+    _apply_counter_changes(work_order.id, {"steps_total": -1})
+
+
+def abandon_plan(work_order):
+    """
+    Escalate a work order whose plan stopped generating part way through.
+
+    The placeholder step from hold_plan_open stays counted, so finishing the
+    steps that were saved can never mark the incomplete plan completed.
+    """
+    _apply_counter_changes(work_order.id, {}, {"status": "escalated"})
+
+
+def remove_steps(work_order, steps):
+    """Account for PlanSteps deleted from a work order's plan."""
+    if steps:
+        inc = {field: -amount for field, amount in _counts_for(steps).items()}
+        _apply_counter_changes(work_order.id, inc)
+
+
+def replace_plan_steps(work_order, operations, removed, added):
+    """
+    Write a plan change and its counter changes in one transaction.
+
+    Readers see either the old plan or the new one, never a plan half way
+    through. Without a replica set (no transactions) the same writes are
+    applied without one.
+
+    Args:
+        work_order: WorkOrder instance
+        operations: pymongo write operations on plan_step, applied in order
+        removed: PlanStep instances the operations delete
+        added: PlanStep instances the operations insert
+    """
+    inc = _counts_for(added)
+    for field, amount in _counts_for(removed).items():
+        inc[field] = inc.get(field, 0) - amount
+    update = {"$set": {"updated_at": datetime.now(timezone.utc)}}
+    if any(inc.values()):
+        update["$inc"] = {field: amount for field, amount in inc.items() if amount}
+
+    def write(session=None):
+        if operations:
+            PlanStep._get_collection().bulk_write(operations, ordered=True, session=session)
+        WorkOrder._get_collection().update_one({"_id": work_order.id}, update, session=session)
+
+    try:
+        with PlanStep._get_db().client.start_session() as session:
+            session.with_transaction(write)
+    except OperationFailure as e:
+        if e.code != ILLEGAL_OPERATION:
+            raise
+        write()
+    # Bring the status in line with the new counters
+    _apply_counter_changes(work_order.id, {})
+
+
+def recompute_step_counters(batch_size=1000):
+    """
+    Rebuild every work order's step counters and status from plan_step in bulk.
+
+    Returns:
+        Number of work orders whose counters were rewritten
+    """
+    counts = {
+        row["_id"]: row for row in PlanStep.objects.aggregate([
+            {"$group": {
+                "_id": "$work_order",
+                "total": {"$sum": 1},
+                "succeeded": {"$sum": {"$cond": [{"$eq": ["$status", "success"]}, 1, 0]}},
+                "in_progress": {"$sum": {"$cond": [{"$eq": ["$status", "in_progress"]}, 1, 0]}},
+                "current_step_number": {"$max": {
+                    "$cond": [{"$eq": ["$status", "in_progress"]}, "$step_number", None]
+                }},
+            }},
+        ])
+    }
+
+    collection = WorkOrder._get_collection()
+    operations = []
+    repaired = 0
+    for wo in collection.find({}, {"status": 1, "current_step_number": 1}):
+        row = counts.get(wo["_id"], {})
+        total = row.get("total", 0)
+        succeeded = row.get("succeeded", 0)
+        in_progress = row.get("in_progress", 0)
+        status = derive_status(wo.get("status", "pending"), total, succeeded, in_progress)
+        operations.append(UpdateOne({"_id": wo["_id"]}, {"$set": {
+            "steps_total": total,
+            "steps_succeeded": succeeded,
+            "steps_in_progress": in_progress,
+            "current_step_number": row.get("current_step_number") or wo.get("current_step_number"),
+            "status": status,
+        }}))
+        if len(operations) >= batch_size:
+            repaired += collection.bulk_write(operations, ordered=False).matched_count
+            operations = []
+    if operations:
+        repaired += collection.bulk_write(operations, ordered=False).matched_count
+    return repaired
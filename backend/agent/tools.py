@@ -7,8 +7,14 @@ from models.AgentLog import AgentLog
 from models.PlanStep import PlanStep
 from mongoengine import DoesNotExist
 from datetime import datetime
+from .log_stream import publish_log
+from .log_buffer import active_buffer
+from .metrics import timed_tool
+from .inventory_index import index as inventory_index, search_items, search_items_by_id, normalize
+from .inventory_reservations import adjust_quantity, InsufficientInventory
 
 @tool(parse_docstring=True)
+@timed_tool
 def create_log(plan_step_id: str, work_order_id: str, action: str, result: str):
     """Logs an action and its result for transparency.
     
@@ -18,6 +24,13 @@ def create_log(plan_step_id: str, work_order_id: str, action: str, result: str):
         action: A short human-readable description of what was done.
         result: The outcome or response returned by the action/tool.
     """
+    buffer = active_buffer(work_order_id)
+    if buffer is not None:
+        # Written in bulk by the run's log buffer, off the agent's critical path
+        buffer.add(plan_step_id, action, result, datetime.utcnow())
+        print(f"[LOG] Step {plan_step_id} | WorkOrder {work_order_id} (buffered)")
+        return "Action logged successfully."
+
     work_order = WorkOrder.objects.get(id=work_order_id)
     plan_step = PlanStep.objects.get(id=plan_step_id)
     log = AgentLog(
@@ -28,10 +41,12 @@ def create_log(plan_step_id: str, work_order_id: str, action: str, result: str):
         result=result,
     )
     log.save()
+    publish_log(log)
     print(f"[LOG] Step {plan_step_id} | WorkOrder {work_order_id}")
     return "Action logged successfully."
 
 @tool(parse_docstring=True)
+@timed_tool
 def shutdown_server(server_id: str) -> str:
     """Shuts down server with given server ID.
     
@@ -45,6 +60,7 @@ def shutdown_server(server_id: str) -> str:
     return f"Server {server_id} shut down successfully."
 
 @tool(parse_docstring=True)
+@timed_tool
 def reboot_server(server_id: str) -> str:
     """Reboots the server with the given server ID.
     
@@ -58,6 +74,7 @@ def reboot_server(server_id: str) -> str:
     return f"Server {server_id} rebooted successfully."
 
 @tool(parse_docstring=True)
+@timed_tool
 def run_diagnostics(server_id: str, diagnostic_type: str = "full") -> str:
     """Runs diagnostic tests on a server to identify issues.
     
@@ -87,6 +104,7 @@ def run_diagnostics(server_id: str, diagnostic_type: str = "full") -> str:
     return f"Diagnostics completed for server {server_id}. Status: All systems operational. No issues detected."
 
 @tool(parse_docstring=True)
+@timed_tool
 def check_inventory(item_name: str = None, location: str = None) -> str:
     """Checks inventory for items. Can search by item name or location.
     
@@ -98,53 +116,68 @@ def check_inventory(item_name: str = None, location: str = None) -> str:
         Inventory information including available quantities and locations.
     """
     try:
-        if item_name and location:
-            items = InventoryItem.objects(name__icontains=item_name, location__icontains=location)
-        elif item_name:
-            items = InventoryItem.objects(name__icontains=item_name)
-        elif location:
-            items = InventoryItem.objects(location__icontains=location)
-        else:
-            items = InventoryItem.objects()
+        items = [InventoryItem.dict_from_raw(item) for item in search_items(item_name, location)]
         
-        if not items or len(items) == 0:
+        if not items:
             return f"No inventory items found{' for ' + item_name if item_name else ''}{' at ' + location if location else ''}."
         
         result = f"Inventory check results ({len(items)} item{'s' if len(items) != 1 else ''} found):\n"
         for item in items:
-            reserved_status = " (Reserved)" if item.reserved else ""
-            available_status = " (Available)" if not item.reserved and item.quantity > 0 else " (Out of Stock)" if item.quantity == 0 else ""
-            result += f"- {item.name}: Quantity {item.quantity}, Location: {item.location or 'N/A'}{reserved_status}{available_status}\n"
+            reserved_status = " (Reserved)" if item["reserved"] else ""
+            available_status = " (Available)" if item["available"] else " (Out of Stock)" if item["quantity"] == 0 else ""
+            result += f"- {item['name']}: Quantity {item['quantity']}, Location: {item['location']}{reserved_status}{available_status}\n"
         
         return result
     except Exception as e:
         return f"Error checking inventory: {str(e)}"
 
 @tool(parse_docstring=True)
+@timed_tool
 def update_inventory(item_name: str, quantity_change: int, location: str = None) -> str:
     """Updates inventory quantity for an item. Use positive numbers to add, negative to subtract.
     
     Args:
-        item_name: Name of the item to update.
+        item_name: Name of the item to update, as it appears in inventory (whole words, no near-misses).
         quantity_change: Amount to change (positive to add, negative to subtract).
-        location: Optional location to filter by.
+        location: Optional location, needed when the item is stocked in several places.
     
     Returns:
         Confirmation message with updated inventory status.
     """
     try:
-        if location:
-            item = InventoryItem.objects(name__icontains=item_name, location__icontains=location).first()
-        else:
-            item = InventoryItem.objects(name__icontains=item_name).first()
-        
+        # Writes only accept an exact (whole word) name match: a fuzzy near-miss
+        # such as "A100 GPU" -> "NVIDIA H100 GPU" would change the wrong part
+        matches = inventory_index.exact_matches(item_name, location)
+        if len(matches) > 1:
+            # A single item named exactly like the query still wins over longer names
+            same_name = [
+                item["_id"] for item in search_items_by_id(matches, ('id', 'name'))
+                if normalize(item["name"]) == normalize(item_name)
+            ]
+            if len(same_name) == 1:
+                matches = same_name
+        if len(matches) != 1:
+            candidates = matches or inventory_index.search(item_name, location, limit=5) or []
+            listed = "".join(
+                f"\n- {item['name']} (Location: {item.get('location') or 'N/A'}, Quantity: {item.get('quantity') or 0})"
+                for item in search_items_by_id(candidates)
+            )
+            problem = f"matches {len(matches)} items" if matches else "not found"
+            hint = " Specify the full item name and location." if matches else ""
+            return (
+                f"Inventory item '{item_name}' {problem}. Cannot update inventory.{hint}"
+                + (f" Candidates:{listed}" if listed else "")
+            )
+        item = InventoryItem.objects(id=matches[0]).first()
         if not item:
             return f"Inventory item '{item_name}' not found. Cannot update inventory."
         
-        current_quantity = item.quantity if item.quantity else 0
-        new_quantity = max(0, current_quantity + quantity_change)  # Prevent negative quantities
-        item.quantity = new_quantity
-        item.save()
+        try:
+            # Conditional $inc: concurrent updates are not lost and stock never goes negative
+            item = adjust_quantity(item.id, quantity_change)
+        except InsufficientInventory as e:
+            return f"Cannot remove {abs(quantity_change)} units of {item.name}: only {e.available} in stock. Inventory unchanged."
+        new_quantity = item.quantity
         
         action = "added" if quantity_change > 0 else "removed"
         location_info = f" at {item.location}" if item.location else ""
@@ -153,6 +186,7 @@ def update_inventory(item_name: str, quantity_change: int, location: str = None)
         return f"Error updating inventory: {str(e)}"
 
 @tool(parse_docstring=True)
+@timed_tool
 def check_existing_specs(server_id: str = None) -> str:
     """Checks server or component specifications from the database.
     
@@ -187,6 +221,7 @@ def check_existing_specs(server_id: str = None) -> str:
         return f"Specification check: {component_type if component_type else 'General'} specifications retrieved. Please specify a server_id for detailed specs."
 
 @tool(parse_docstring=True)
+@timed_tool
 def escalate_to_higher_engineer(work_order_id: str, reason: str, escalation_level: str = "senior") -> str:
     """Escalates a work order to a higher-level engineer or technician.
     
@@ -221,6 +256,7 @@ def escalate_to_higher_engineer(work_order_id: str, reason: str, escalation_leve
         return f"Error escalating work order: {str(e)}"
 
 @tool(parse_docstring=True)
+@timed_tool
 def order_supplies(item_name: str, quantity: int, urgency: str = "normal", supplier: str = None) -> str:
     """Orders supplies for the data center.
     
@@ -247,6 +283,7 @@ def order_supplies(item_name: str, quantity: int, urgency: str = "normal", suppl
         return f"Error creating supply order: {str(e)}"
 
 @tool(parse_docstring=True)
+@timed_tool
 def check_temperature(rack_id: str = None, unit_id: str = None) -> str:
     """Checks the temperature of a rack or unit in the data center.
     
@@ -265,6 +302,7 @@ def check_temperature(rack_id: str = None, unit_id: str = None) -> str:
     return f"Temperature check for {location}: {temp}°F. Status: {status}. Recommended range: 68-78°F."
 
 @tool(parse_docstring=True)
+@timed_tool
 def deploy_update(machine_group: str, update_type: str = "software") -> str:
     """Deploys a software or firmware update to a machine group.
     
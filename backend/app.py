@@ -1,31 +1,68 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from mongoengine import connect
+from models.db import connect_db
 from dotenv import load_dotenv
 import os
+
+# Before the agent and model imports, which read their settings at import time
+load_dotenv()
+
 import agent.main_agent
+from agent.job_queue import start_workers
+from agent.log_retention import start_retention
+from agent.inventory_reservations import start_sweeper
+from agent.llm_cache import cache_stats
+from agent.inventory_index import index as inventory_index
 from routes.work_orders import work_orders_bp
 from routes.auth import auth_bp
 from routes.escalations import escalations_bp
 from routes.inventory import inventory_bp
 from routes.logs import logs_bp
+from routes.jobs import jobs_bp
+from routes.metrics import metrics_bp, init_request_metrics
+from models.indexes import ensure_indexes
 
 app = Flask(__name__)
-CORS(app)
+# X-Next-Cursor carries the work order list's next page; browsers only expose listed headers
+CORS(app, expose_headers=["X-Next-Cursor", "ETag"])
 
-connect(
-    db="datacenter",
-    host=os.getenv("MONGODB_HOST")
-)
+connect_db()
 
 print("Connected to MongoDB!")
 
+# Build every declared index before serving traffic
+ensure_indexes()
+
+# Load the inventory search index up front instead of on the first search
+inventory_index.build()
+
 # Register blueprints
 app.register_blueprint(work_orders_bp)
 app.register_blueprint(auth_bp)
 app.register_blueprint(escalations_bp)
 app.register_blueprint(inventory_bp)
 app.register_blueprint(logs_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(metrics_bp)
+
+# Request latency histograms served at /metrics
+init_request_metrics(app)
+
+# Hit/miss counters of the LLM completion cache
+@app.route('/api/llm_cache', methods=['GET'])
+def get_llm_cache_stats():
+    return jsonify(cache_stats())
+
+# Agent runs are executed by the job workers; set JOB_WORKERS=0 to run them
+# only in a separate process (scripts/run_job_workers.py)
+if int(os.getenv("JOB_WORKERS", "2")) > 0:
+    start_workers()
+
+# TTL expiry and rollup of agent logs (see agent/log_retention.py for settings)
+start_retention()
+
+# Return expired inventory holds to stock (see agent/inventory_reservations.py)
+start_sweeper()
 
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
\ No newline at end of file
+    app.run(port=5000, debug=True)
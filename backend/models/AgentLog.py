@@ -1,5 +1,6 @@
-from mongoengine import Document, StringField, DateTimeField, ReferenceField
+from mongoengine import Document, StringField, DateTimeField, ReferenceField, IntField
 from datetime import datetime, timezone
+from models.PlanStep import PlanStep
 
 class AgentLog(Document):
     work_order = ReferenceField('WorkOrder', required=True)
@@ -9,26 +10,63 @@ class AgentLog(Document):
     related_step = ReferenceField('PlanStep')
     source = StringField(choices=["agent", "technician"], default="agent")
     log_type = StringField(choices=["info", "success", "warning", "error"], default="info")
+    # Number of agent actions folded into this entry by the log retention rollup
+    rolled_up_count = IntField()
+
+    meta = {
+        'indexes': [
+            # Logs of a work order, newest first
+            ('work_order', '-timestamp'),
+            # Cache validator and SSE resume for a work order's logs
+            ('work_order', '-_id'),
+            # Unfiltered log list, newest first
+            '-timestamp',
+        ]
+    }
     
     def to_dict(self):
         """Convert log to dictionary for API responses"""
-        # Format timestamp with timezone handling
-        timestamp_str = None
-        if self.timestamp:
-            # If datetime is naive (no timezone), assume it's UTC and make it timezone-aware
-            if self.timestamp.tzinfo is None:
-                timestamp_str = self.timestamp.replace(tzinfo=timezone.utc).isoformat()
-            else:
-                timestamp_str = self.timestamp.isoformat()
+        # to_mongo() keeps references as ids, so only the step number is looked up
+        return AgentLog.dicts_from_raw([self.to_mongo()])[0]
+
+    @staticmethod
+    def dicts_from_raw(docs):
+        """
+        Convert raw (as_pymongo) log documents to API dictionaries.
+        
+        Step numbers for all related steps are resolved with a single $in query.
+        """
+        step_ids = list({doc["related_step"] for doc in docs if doc.get("related_step")})
+        step_numbers = {}
+        if step_ids:
+            step_numbers = {
+                step["_id"]: step.get("step_number")
+                for step in PlanStep.objects(id__in=step_ids).only('step_number').as_pymongo()
+            }
         
-        return {
-            "id": str(self.id),
-            "work_order_id": str(self.work_order.id) if self.work_order else None,
-            "timestamp": timestamp_str,
-            "message": self.agent_action or "",
-            "result": self.result or "",
-            "source": self.source or "agent",
-            "type": self.log_type or "info",
-            "step_id": str(self.related_step.id) if self.related_step else None,
-            "step_number": self.related_step.step_number if self.related_step else None,
-        }
+        results = []
+        for doc in docs:
+            # Format timestamp with timezone handling
+            timestamp = doc.get("timestamp")
+            timestamp_str = None
+            if timestamp:
+                # If datetime is naive (no timezone), assume it's UTC and make it timezone-aware
+                if timestamp.tzinfo is None:
+                    timestamp_str = timestamp.replace(tzinfo=timezone.utc).isoformat()
+                else:
+                    timestamp_str = timestamp.isoformat()
+            
+            related_step = doc.get("related_step")
+            results.append({
+                "id": str(doc["_id"]),
+                "work_order_id": str(doc["work_order"]) if doc.get("work_order") else None,
+                "timestamp": timestamp_str,
+                "message": doc.get("agent_action") or "",
+                "result": doc.get("result") or "",
+                "source": doc.get("source") or "agent",
+                "type": doc.get("log_type") or "info",
+                "step_id": str(related_step) if related_step else None,
+                "step_number": step_numbers.get(related_step) if related_step else None,
+                "rolled_up_count": doc.get("rolled_up_count"),
+            })
+        return results
@@ -7,15 +7,32 @@ class EscalationMessage(Document):
     source = StringField(choices=["technician", "ai_agent"], required=True)
     engineer = ReferenceField('Technician')  # String reference
     status = StringField(choices=["sent","acknowledged","resolved"], default="sent")
+
+    meta = {
+        'indexes': [
+            # Escalations panel: filter by status, newest first
+            ('status', '-timestamp', '-_id'),
+            ('engineer', '-timestamp', '-_id'),
+            # Escalations of a work order
+            ('work_order_id', '-timestamp'),
+        ]
+    }
     
     def to_dict(self):
         """Convert escalation message to dictionary"""
+        # to_mongo() keeps references as ids, so nothing is dereferenced
+        return EscalationMessage.dict_from_raw(self.to_mongo())
+
+    @staticmethod
+    def dict_from_raw(doc):
+        """Convert a raw (as_pymongo) escalation document to the API dictionary"""
+        timestamp = doc.get("timestamp")
         return {
-            "id": str(self.id),
-            "work_order_id": str(self.work_order_id.id) if self.work_order_id else None,
-            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
-            "message": self.message,
-            "source": self.source,
-            "engineer_id": str(self.engineer.id) if self.engineer else None,
-            "status": self.status
+            "id": str(doc["_id"]),
+            "work_order_id": str(doc["work_order_id"]) if doc.get("work_order_id") else None,
+            "timestamp": timestamp.isoformat() if timestamp else None,
+            "message": doc.get("message"),
+            "source": doc.get("source"),
+            "engineer_id": str(doc["engineer"]) if doc.get("engineer") else None,
+            "status": doc.get("status", "sent")
         }
\ No newline at end of file
@@ -1,20 +1,73 @@
-from mongoengine import Document, StringField, IntField, BooleanField
+from mongoengine import Document, StringField, IntField, BooleanField, DateTimeField
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timezone
+
+KEY_INDEX_NAME = "name_1_location_1"
 
 class InventoryItem(Document):
     name = StringField(required=True)
     quantity = IntField(default=0)
-    location = StringField()
+    # Units held by work order reservations, not counted in quantity
+    reserved_quantity = IntField(default=0)
+    # "" when the item has no location, never null, so (name, location) is a stable key
+    location = StringField(default="")
     cost = StringField()
     reserved = BooleanField(default=False)
+    updated_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+
+    meta = {
+        'indexes': [
+            # Cache validator for the inventory list
+            '-updated_at',
+            # Item key for lookups and import upserts; one item per name and location
+            {'fields': ('name', 'location'), 'unique': True},
+            'location',
+        ]
+    }
+
+    @classmethod
+    def ensure_indexes(cls):
+        """Store missing locations as "" and replace the old non-unique key index before creating the unique one"""
+        collection = cls._get_collection()
+        # Matches both null and missing locations
+        collection.update_many({"location": None}, {"$set": {"location": ""}})
+        existing = collection.index_information().get(KEY_INDEX_NAME)
+        if existing and not existing.get("unique"):
+            collection.drop_index(KEY_INDEX_NAME)
+        try:
+            super().ensure_indexes()
+        except DuplicateKeyError as e:
+            raise RuntimeError(
+                "Several inventory items share a name and location; merge them before starting"
+            ) from e
+
+    def save(self, *args, **kwargs):
+        """Stamp updated_at on every save so readers can use it as a cache validator"""
+        self.updated_at = datetime.now(timezone.utc)
+        # Same key as the import upserts
+        self.name = self.name.strip() if self.name else self.name
+        self.location = (self.location or "").strip()
+        return super().save(*args, **kwargs)
     
+    # Fields read by list endpoints
+    LIST_FIELDS = ('id', 'name', 'quantity', 'reserved_quantity', 'location', 'cost', 'reserved')
+
     def to_dict(self):
         """Convert inventory item to dictionary"""
+        return InventoryItem.dict_from_raw(self.to_mongo())
+
+    @staticmethod
+    def dict_from_raw(doc):
+        """Convert a raw (as_pymongo) inventory document to the API dictionary"""
+        quantity = doc.get("quantity") or 0
+        reserved = doc.get("reserved", False)
         return {
-            "id": str(self.id),
-            "name": self.name,
-            "quantity": self.quantity,
-            "location": self.location or "N/A",
-            "cost": self.cost or "N/A",
-            "reserved": self.reserved,
-            "available": not self.reserved and self.quantity > 0
+            "id": str(doc["_id"]),
+            "name": doc.get("name"),
+            "quantity": quantity,
+            "reserved_quantity": doc.get("reserved_quantity") or 0,
+            "location": doc.get("location") or "N/A",
+            "cost": doc.get("cost") or "N/A",
+            "reserved": reserved,
+            "available": not reserved and quantity > 0
         }
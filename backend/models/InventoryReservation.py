@@ -0,0 +1,48 @@
+from mongoengine import Document, StringField, ReferenceField, DateTimeField, IntField
+from datetime import timezone
+
+class InventoryReservation(Document):
+    item = ReferenceField('InventoryItem', required=True)
+    work_order = ReferenceField('WorkOrder', required=True)
+    quantity = IntField(required=True, min_value=1)
+    status = StringField(choices=["held", "released", "consumed", "expired"], default="held")
+    created_at = DateTimeField(required=True)
+    expires_at = DateTimeField(required=True)
+    ended_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            # Expiry sweeper
+            ('status', 'expires_at'),
+            # Holds of an item / of a work order
+            ('item', 'status'),
+            ('work_order', 'status'),
+        ]
+    }
+
+    def to_dict(self):
+        """Convert reservation to dictionary"""
+        # to_mongo() keeps references as ids, so nothing is dereferenced
+        return InventoryReservation.dict_from_raw(self.to_mongo())
+
+    @staticmethod
+    def dict_from_raw(doc):
+        """Convert a raw (as_pymongo) reservation document to the API dictionary"""
+        def fmt(dt):
+            if not dt:
+                return None
+            # If datetime is naive (no timezone), assume it's UTC and make it timezone-aware
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.isoformat()
+
+        return {
+            "id": str(doc["_id"]),
+            "item_id": str(doc["item"]),
+            "work_order_id": str(doc["work_order"]),
+            "quantity": doc.get("quantity"),
+            "status": doc.get("status", "held"),
+            "created_at": fmt(doc.get("created_at")),
+            "expires_at": fmt(doc.get("expires_at")),
+            "ended_at": fmt(doc.get("ended_at")),
+        }
@@ -0,0 +1,59 @@
+from mongoengine import Document, StringField, ReferenceField, DateTimeField, IntField, DictField
+from datetime import timezone
+
+# Finished jobs are only polled shortly after they end; Mongo's TTL monitor removes them after this
+FINISHED_JOB_TTL_SECONDS = 7 * 24 * 3600
+
+class Job(Document):
+    kind = StringField(choices=["create_work_order", "confirm_step", "report_issue"], required=True)
+    payload = DictField()
+    status = StringField(choices=["queued", "running", "succeeded", "failed"], default="queued")
+    work_order = ReferenceField('WorkOrder')
+    progress = DictField()
+    result = DictField()
+    error = StringField()
+    attempts = IntField(default=0)
+    # Jobs are not retried (see agent/job_queue.py); a claim past this fails the job
+    max_attempts = IntField(default=1)
+    lease_owner = StringField()
+    lease_expires_at = DateTimeField()
+    created_at = DateTimeField()
+    started_at = DateTimeField()
+    finished_at = DateTimeField()
+    updated_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            ('status', 'lease_expires_at', 'created_at'),
+            # Queued and running jobs have no finished_at and never expire
+            {'fields': ['finished_at'], 'expireAfterSeconds': FINISHED_JOB_TTL_SECONDS},
+        ]
+    }
+
+    def to_dict(self):
+        """Convert job to dictionary for API responses"""
+        def fmt(dt):
+            if not dt:
+                return None
+            # If datetime is naive (no timezone), assume it's UTC and make it timezone-aware
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.isoformat()
+
+        # Read the raw id rather than dereferencing the work order
+        work_order_id = self.to_mongo().get("work_order")
+
+        return {
+            "id": str(self.id),
+            "kind": self.kind,
+            "status": self.status,
+            "work_order_id": str(work_order_id) if work_order_id else None,
+            "progress": self.progress or {},
+            "result": self.result or {},
+            "error": self.error,
+            "attempts": self.attempts,
+            "created_at": fmt(self.created_at),
+            "started_at": fmt(self.started_at),
+            "finished_at": fmt(self.finished_at),
+            "updated_at": fmt(self.updated_at),
+        }
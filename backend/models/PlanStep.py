@@ -1,10 +1,28 @@
 from mongoengine import Document, StringField, ReferenceField, DateTimeField, IntField
+from datetime import datetime, timezone
 
 class PlanStep(Document):
     work_order = ReferenceField('WorkOrder')
     step_number = IntField(required=True)
     description = StringField()
     executor = StringField(choices=["agent","technician","undecided"], default="undecided")
+    # Why the step was classified as needing a technician, when decided before execution
+    executor_reason = StringField()
     status = StringField(choices=["pending","in_progress","success","failure"], default="pending")
     result = StringField()
     executed_at = DateTimeField()
+    updated_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+
+    meta = {
+        'indexes': [
+            # Steps of a work order in plan order
+            ('work_order', 'step_number'),
+            # Cache validator for a work order's steps
+            ('work_order', '-updated_at'),
+        ]
+    }
+
+    def save(self, *args, **kwargs):
+        """Stamp updated_at on every save so readers can use it as a cache validator"""
+        self.updated_at = datetime.now(timezone.utc)
+        return super().save(*args, **kwargs)
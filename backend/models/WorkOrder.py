@@ -1,4 +1,5 @@
-from mongoengine import Document, StringField, ListField, ReferenceField, DateTimeField
+from mongoengine import Document, StringField, ListField, ReferenceField, DateTimeField, IntField
+from datetime import datetime, timezone
 
 class WorkOrder(Document):
     title = StringField(required=True)
@@ -13,3 +14,26 @@ class WorkOrder(Document):
     escalation_messages = ListField(ReferenceField('EscalationMessage'))
     created_at = DateTimeField()
     updated_at = DateTimeField()
+    # Maintained with $inc by agent/step_counters.py on every PlanStep status change
+    steps_total = IntField(default=0)
+    steps_succeeded = IntField(default=0)
+    steps_in_progress = IntField(default=0)
+    current_step_number = IntField()
+    # Last time agent/log_retention.py rolled up this work order's logs
+    logs_compacted_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            # Keyset pagination for the work order list (newest first)
+            ('-updated_at', '-_id'),
+            ('status', '-updated_at', '-_id'),
+            ('assigned_technician', '-updated_at', '-_id'),
+            # Closed work orders due for log rollup
+            ('status', 'logs_compacted_at'),
+        ]
+    }
+
+    def save(self, *args, **kwargs):
+        """Stamp updated_at on every save so readers can use it as a cache validator"""
+        self.updated_at = datetime.now(timezone.utc)
+        return super().save(*args, **kwargs)
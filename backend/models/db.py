@@ -0,0 +1,11 @@
+"""MongoDB connection shared by the API, the job workers and the scripts"""
+import os
+from mongoengine import connect
+
+
+def connect_db():
+    """Connect to MONGODB_HOST, using the MONGODB_DB database (default datacenter)"""
+    return connect(
+        db=os.getenv("MONGODB_DB", "datacenter"),
+        host=os.getenv("MONGODB_HOST")
+    )
@@ -0,0 +1,17 @@
+from models.WorkOrder import WorkOrder
+from models.PlanStep import PlanStep
+from models.AgentLog import AgentLog
+from models.EscalationMessage import EscalationMessage
+from models.InventoryItem import InventoryItem
+from models.InventoryReservation import InventoryReservation
+from models.Technician import Technician
+from models.User import User
+from models.Job import Job
+
+# Every model whose meta['indexes'] backs a hot query
+INDEXED_MODELS = [WorkOrder, PlanStep, AgentLog, EscalationMessage, InventoryItem, InventoryReservation, Technician, User, Job]
+
+def ensure_indexes():
+    """Create all declared indexes up front instead of on first collection access"""
+    for model in INDEXED_MODELS:
+        model.ensure_indexes()
@@ -1,9 +1,13 @@
 # /routes/escalations.py
 from flask import Blueprint, request, jsonify
 from mongoengine import DoesNotExist
+from bson import ObjectId
+from bson.errors import InvalidId
 from models.EscalationMessage import EscalationMessage
 from models.WorkOrder import WorkOrder
-from datetime import datetime
+from datetime import datetime, timezone
+import base64
+import json
 
 escalations_bp = Blueprint('escalations', __name__, url_prefix='/api/escalations')
 
@@ -89,20 +93,137 @@ def create_escalation():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+ESCALATION_STATUSES = ["sent", "acknowledged", "resolved"]
+
+def format_datetime(dt):
+    if not dt:
+        return None
+    # If datetime is naive (no timezone), assume it's UTC and make it timezone-aware
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.isoformat()
+
+def encode_cursor(escalation):
+    """Opaque keyset cursor pointing just past the given escalation document"""
+    timestamp = escalation.get("timestamp")
+    raw = json.dumps({
+        "t": timestamp.replace(tzinfo=None).isoformat() if timestamp else None,
+        "id": str(escalation["_id"]),
+    })
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def cursor_match(cursor):
+    """Decode a cursor into a $match selecting the escalations that sort after it"""
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    last_id = ObjectId(data["id"])
+    timestamp = datetime.fromisoformat(data["t"])
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": last_id}},
+    ]}
+
+@escalations_bp.route('/', methods=['GET'])
+def list_escalations():
+    """
+    List escalations across all work orders, joined with their work order titles.
+    
+    Query params:
+        status: comma separated statuses (e.g. sent,acknowledged)
+        since: ISO timestamp, only escalations at or after it
+        engineer: Technician ID the escalation is assigned to
+        limit: page size (default 100, max 500)
+        cursor: next_cursor from the previous page
+    """
+    try:
+        match = {}
+        
+        status = request.args.get('status')
+        if status:
+            statuses = [s.strip() for s in status.split(',') if s.strip()]
+            invalid = [s for s in statuses if s not in ESCALATION_STATUSES]
+            if invalid:
+                return jsonify({"error": f"Invalid status: {', '.join(invalid)}"}), 400
+            match["status"] = {"$in": statuses}
+        
+        since = request.args.get('since')
+        if since:
+            try:
+                match["timestamp"] = {"$gte": datetime.fromisoformat(since.replace('Z', '+00:00'))}
+            except ValueError:
+                return jsonify({"error": "since must be an ISO 8601 timestamp"}), 400
+        
+        engineer = request.args.get('engineer')
+        if engineer:
+            if not ObjectId.is_valid(engineer):
+                return jsonify({"error": "engineer must be a valid id"}), 400
+            match["engineer"] = ObjectId(engineer)
+        
+        try:
+            limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                match = {"$and": [match, cursor_match(cursor)]}
+            except (ValueError, KeyError, TypeError, InvalidId):
+                return jsonify({"error": "Invalid cursor"}), 400
+        
+        # One round trip: indexed match/sort, then a $lookup for just this page's work orders
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"timestamp": -1, "_id": -1}},
+            {"$limit": limit + 1},
+            {"$lookup": {
+                "from": WorkOrder._get_collection_name(),
+                "localField": "work_order_id",
+                "foreignField": "_id",
+                "as": "work_order",
+            }},
+            {"$set": {"work_order": {"$arrayElemAt": ["$work_order", 0]}}},
+            {"$project": {"work_order.agent_plan": 0, "work_order.logs": 0, "work_order.escalation_messages": 0, "work_order.description": 0}},
+        ]
+        escalations = list(EscalationMessage._get_collection().aggregate(pipeline))
+        
+        results = []
+        for escalation in escalations[:limit]:
+            work_order = escalation.get("work_order") or {}
+            results.append({
+                "id": str(escalation["_id"]),
+                "work_order_id": str(escalation["work_order_id"]) if escalation.get("work_order_id") else None,
+                "work_order_title": work_order.get("title"),
+                "work_order_status": work_order.get("status"),
+                "timestamp": format_datetime(escalation.get("timestamp")),
+                "message": escalation.get("message"),
+                "source": escalation.get("source"),
+                "engineer_id": str(escalation["engineer"]) if escalation.get("engineer") else None,
+                "status": escalation.get("status", "sent"),
+            })
+        
+        return jsonify({
+            "escalations": results,
+            "count": len(results),
+            "next_cursor": encode_cursor(escalations[limit - 1]) if len(escalations) > limit else None
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @escalations_bp.route('/work_order/<string:work_order_id>', methods=['GET'])
 def get_escalations_by_work_order(work_order_id):
     """Get all escalation messages for a specific work order"""
     try:
         # Verify work order exists
-        try:
-            work_order = WorkOrder.objects.get(id=work_order_id)
-        except DoesNotExist:
+        if not WorkOrder.objects(id=work_order_id).only('id').as_pymongo().first():
             return jsonify({"error": "WorkOrder not found"}), 404
         
         # Get all escalations for this work order
-        escalations = EscalationMessage.objects(work_order_id=work_order_id)
+        escalations = EscalationMessage.objects(work_order_id=work_order_id).as_pymongo()
         
-        results = [escalation.to_dict() for escalation in escalations]
+        results = [EscalationMessage.dict_from_raw(escalation) for escalation in escalations]
         
         return jsonify({
             "work_order_id": work_order_id,
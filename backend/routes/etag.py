@@ -0,0 +1,28 @@
+# /routes/etag.py
+from flask import request, Response
+import hashlib
+
+def validator_etag(*parts):
+    """Build an ETag from cheap validators (counts, max timestamps/ids) and the query string"""
+    raw = "|".join(str(part) for part in parts) + "|" + request.query_string.decode('utf-8')
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def conditional_response(etag, build_response):
+    """
+    Return 304 Not Modified if the client's If-None-Match still matches,
+    otherwise build the full response and tag it.
+    
+    build_response is only called on a miss, so documents are not loaded or
+    serialized when the client is up to date.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = build_response()
+        if not isinstance(response, Response):
+            # Error tuples are passed through untagged
+            return response
+    response.set_etag(etag, weak=True)
+    # Always revalidate, the validator is cheap
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,20 +1,72 @@
 # /routes/inventory.py
-from flask import Blueprint, request, jsonify
-from mongoengine import DoesNotExist
+import csv
+from flask import Blueprint, request, jsonify, Response
+from mongoengine import DoesNotExist, NotUniqueError
 from models.InventoryItem import InventoryItem
+from models.InventoryReservation import InventoryReservation
+from models.WorkOrder import WorkOrder
+from routes.etag import validator_etag, conditional_response
+from agent.inventory_index import search_items
+from agent.inventory_bulk import import_items, export_items, read_csv, read_ndjson, FORMATS
+from agent.inventory_reservations import adjust_quantity, hold, release, consume, InsufficientInventory
 
 inventory_bp = Blueprint('inventory', __name__, url_prefix='/api/inventory')
 
+# Items are unique by name and location (models/InventoryItem.py)
+DUPLICATE_ITEM_ERROR = "An inventory item with this name and location already exists"
+
 # Get All Inventory Items
 @inventory_bp.route('/', methods=['GET'])
 def get_inventory():
     try:
         items = InventoryItem.objects()
-        results = [item.to_dict() for item in items]
-        return jsonify(results)
+        latest = items.order_by('-updated_at').only('updated_at').as_pymongo().first()
+        etag = validator_etag('inventory', items.count(), latest.get('updated_at') if latest else None)
+        
+        def build_response():
+            results = [InventoryItem.dict_from_raw(item) for item in items.only(*InventoryItem.LIST_FIELDS).as_pymongo()]
+            return jsonify(results)
+        
+        return conditional_response(etag, build_response)
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+# Import Inventory Items in bulk
+# Body: CSV with a header line (text/csv) or NDJSON (application/x-ndjson), or pass ?format=csv|ndjson.
+# Columns: name, location, quantity, cost, reserved. Rows are upserted by name and location.
+@inventory_bp.route('/import', methods=['POST'])
+def import_inventory():
+    try:
+        fmt = request.args.get('format') or ('ndjson' if request.mimetype.endswith('ndjson') else 'csv')
+        if fmt not in FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+        
+        # Read the body as a stream instead of loading it whole
+        rows = read_ndjson(request.stream) if fmt == 'ndjson' else read_csv(request.stream)
+        summary = import_items(rows)
+        if not summary["rows"]:
+            return jsonify({"error": "At least one row is required"}), 400
+        if summary["conflicts"]:
+            # The other rows were written; the summary lists the conflicting ones
+            return jsonify({"error": DUPLICATE_ITEM_ERROR, **summary}), 409
+        return jsonify(summary)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": f"Could not read the import: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+# Export all Inventory Items (?format=csv|ndjson, default csv), streamed row by row
+@inventory_bp.route('/export', methods=['GET'])
+def export_inventory():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    return Response(
+        export_items(fmt),
+        mimetype='application/x-ndjson' if fmt == 'ndjson' else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename=inventory.{fmt}'}
+    )
+
 # Get Single Inventory Item
 @inventory_bp.route('/<string:item_id>', methods=['GET'])
 def get_inventory_item(item_id):
@@ -33,16 +85,8 @@ def search_inventory():
         query = request.args.get('q', '')
         location = request.args.get('location', '')
         
-        if query and location:
-            items = InventoryItem.objects(name__icontains=query, location__icontains=location)
-        elif query:
-            items = InventoryItem.objects(name__icontains=query)
-        elif location:
-            items = InventoryItem.objects(location__icontains=location)
-        else:
-            items = InventoryItem.objects()
-        
-        results = [item.to_dict() for item in items]
+        # Ranked fuzzy matches from the in-memory index, hydrated by id
+        results = [InventoryItem.dict_from_raw(item) for item in search_items(query, location)]
         return jsonify(results)
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -61,6 +105,8 @@ def create_inventory_item():
         )
         item.save()
         return jsonify(item.to_dict()), 201
+    except NotUniqueError:
+        return jsonify({"error": DUPLICATE_ITEM_ERROR}), 409
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
@@ -71,10 +117,17 @@ def update_inventory_item(item_id):
         item = InventoryItem.objects.get(id=item_id)
         data = request.json
         
+        if 'quantity' in data:
+            quantity = int(data['quantity'])
+            if quantity < 0:
+                return jsonify({"error": "quantity cannot be negative"}), 400
+            # Applied as a change from the quantity read, through the same conditional
+            # $inc as PATCH /quantity, so concurrent holds and adjustments are kept
+            change = quantity - (item.quantity or 0)
+            if change:
+                adjust_quantity(item.id, change)
         if 'name' in data:
             item.name = data['name']
-        if 'quantity' in data:
-            item.quantity = int(data['quantity'])
         if 'location' in data:
             item.location = data['location']
         if 'cost' in data:
@@ -82,10 +135,16 @@ def update_inventory_item(item_id):
         if 'reserved' in data:
             item.reserved = bool(data['reserved'])
         
+        # Only the changed fields are written, never quantity
         item.save()
+        item.reload()
         return jsonify(item.to_dict())
     except DoesNotExist:
         return jsonify({"error": "Inventory item not found"}), 404
+    except InsufficientInventory as e:
+        return jsonify({"error": str(e), "available": e.available}), 409
+    except NotUniqueError:
+        return jsonify({"error": DUPLICATE_ITEM_ERROR}), 409
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
@@ -93,17 +152,77 @@ def update_inventory_item(item_id):
 @inventory_bp.route('/<string:item_id>/quantity', methods=['PATCH'])
 def update_inventory_quantity(item_id):
     try:
-        item = InventoryItem.objects.get(id=item_id)
         data = request.json
         quantity_change = int(data.get('quantity_change', 0))
         
-        new_quantity = max(0, item.quantity + quantity_change)
-        item.quantity = new_quantity
-        item.save()
-        
+        item = adjust_quantity(item_id, quantity_change)
         return jsonify(item.to_dict())
     except DoesNotExist:
         return jsonify({"error": "Inventory item not found"}), 404
+    except InsufficientInventory as e:
+        return jsonify({"error": str(e), "available": e.available}), 409
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+# Reserve Inventory for a Work Order
+@inventory_bp.route('/<string:item_id>/reservations', methods=['POST'])
+def reserve_inventory_item(item_id):
+    try:
+        data = request.json
+        work_order_id = data.get('work_order_id')
+        if not work_order_id or not WorkOrder.objects(id=work_order_id).only('id').first():
+            return jsonify({"error": "WorkOrder not found"}), 404
+        quantity = int(data.get('quantity', 1))
+        ttl_minutes = data.get('ttl_minutes')
+        
+        reservation = hold(item_id, work_order_id, quantity, float(ttl_minutes) if ttl_minutes is not None else None)
+        return jsonify(reservation.to_dict()), 201
+    except DoesNotExist:
+        return jsonify({"error": "Inventory item not found"}), 404
+    except InsufficientInventory as e:
+        return jsonify({"error": str(e), "available": e.available}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+# Get Reservations (filter by item_id, work_order_id, status)
+@inventory_bp.route('/reservations', methods=['GET'])
+def get_reservations():
+    try:
+        filters = {}
+        if request.args.get('item_id'):
+            filters['item'] = request.args['item_id']
+        if request.args.get('work_order_id'):
+            filters['work_order'] = request.args['work_order_id']
+        filters['status'] = request.args.get('status', 'held')
+        
+        reservations = InventoryReservation.objects(**filters).order_by('expires_at').as_pymongo()
+        return jsonify([InventoryReservation.dict_from_raw(reservation) for reservation in reservations])
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+def _end_reservation(reservation_id, end):
+    reservation = end(reservation_id)
+    if reservation is None:
+        if not InventoryReservation.objects(id=reservation_id).only('id').first():
+            return jsonify({"error": "Reservation not found"}), 404
+        return jsonify({"error": "Reservation is no longer held"}), 409
+    return jsonify(reservation.to_dict())
+
+# Release Reservation (units go back to stock)
+@inventory_bp.route('/reservations/<string:reservation_id>/release', methods=['POST'])
+def release_reservation(reservation_id):
+    try:
+        return _end_reservation(reservation_id, release)
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+# Consume Reservation (held units were used)
+@inventory_bp.route('/reservations/<string:reservation_id>/consume', methods=['POST'])
+def consume_reservation(reservation_id):
+    try:
+        return _end_reservation(reservation_id, consume)
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
@@ -112,6 +231,10 @@ def update_inventory_quantity(item_id):
 def delete_inventory_item(item_id):
     try:
         item = InventoryItem.objects.get(id=item_id)
+        # Held units belong to work orders; they have to be released or consumed first
+        held = InventoryReservation.objects(item=item.id, status="held").count()
+        if held:
+            return jsonify({"error": f"Inventory item has {held} held reservations; release or consume them first"}), 409
         item.delete()
         return jsonify({"message": "Inventory item deleted"})
     except DoesNotExist:
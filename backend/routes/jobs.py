@@ -0,0 +1,17 @@
+# /routes/jobs.py
+from flask import Blueprint, jsonify
+from mongoengine import DoesNotExist, ValidationError
+from models.Job import Job
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+# Get Job Status
+@jobs_bp.route('/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        job = Job.objects.get(id=job_id)
+        return jsonify(job.to_dict())
+    except (DoesNotExist, ValidationError):
+        return jsonify({"error": "Job not found"}), 404
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -1,10 +1,15 @@
 # /routes/logs.py
-from flask import Blueprint, request, jsonify
-from mongoengine import DoesNotExist
+from flask import Blueprint, request, jsonify, Response
+from mongoengine import DoesNotExist, ValidationError
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+import json
 from models.AgentLog import AgentLog
 from models.WorkOrder import WorkOrder
 from models.PlanStep import PlanStep
 from datetime import datetime, timezone
+from agent.log_stream import stream, publish_log
+from routes.etag import validator_etag, conditional_response
 
 logs_bp = Blueprint('logs', __name__, url_prefix='/api/logs')
 
@@ -17,14 +22,25 @@ def format_datetime(dt):
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.isoformat()
 
+def logs_response(logs, scope):
+    """Serialize logs newest first, or 304 if nothing was added or deleted"""
+    # Logs are append-only, so the newest _id and the count identify the set
+    latest = logs.order_by('-id').only('id').as_pymongo().first()
+    etag = validator_etag('logs', scope, logs.count(), latest['_id'] if latest else None)
+    
+    def build_response():
+        # Raw documents: no per-row dereference of work_order/related_step
+        results = AgentLog.dicts_from_raw(list(logs.order_by('-timestamp').as_pymongo()))
+        return jsonify(results)
+    
+    return conditional_response(etag, build_response)
+
 # Get All Logs for a Work Order
 @logs_bp.route('/work_order/<string:work_order_id>', methods=['GET'])
 def get_work_order_logs(work_order_id):
     try:
         work_order = WorkOrder.objects.get(id=work_order_id)
-        logs = AgentLog.objects(work_order=work_order).order_by('-timestamp')
-        results = [log.to_dict() for log in logs]
-        return jsonify(results)
+        return logs_response(AgentLog.objects(work_order=work_order), work_order.id)
     except DoesNotExist:
         return jsonify({"error": "WorkOrder not found"}), 404
     except Exception as e:
@@ -37,17 +53,33 @@ def get_logs():
         work_order_id = request.args.get('work_order_id')
         if work_order_id:
             work_order = WorkOrder.objects.get(id=work_order_id)
-            logs = AgentLog.objects(work_order=work_order).order_by('-timestamp')
-        else:
-            logs = AgentLog.objects().order_by('-timestamp')
-        
-        results = [log.to_dict() for log in logs]
-        return jsonify(results)
+            return logs_response(AgentLog.objects(work_order=work_order), work_order.id)
+        return logs_response(AgentLog.objects(), None)
     except DoesNotExist:
         return jsonify({"error": "WorkOrder not found"}), 404
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+# Stream new Log Entries as Server-Sent Events (optional: work_order_id query param)
+# Resumes after the Last-Event-ID header (or last_event_id query param) when given
+@logs_bp.route('/stream', methods=['GET'])
+def stream_logs():
+    work_order_id = request.args.get('work_order_id')
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if work_order_id and not ObjectId.is_valid(work_order_id):
+        return jsonify({"error": "Invalid work_order_id"}), 400
+    if last_event_id and not ObjectId.is_valid(last_event_id):
+        return jsonify({"error": "Invalid Last-Event-ID"}), 400
+    return Response(
+        stream(work_order_id=work_order_id, last_event_id=last_event_id),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Disable response buffering in nginx-style proxies
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
 # Create a Log Entry
 @logs_bp.route('/', methods=['POST'])
 def create_log():
@@ -81,6 +113,7 @@ def create_log():
             timestamp=datetime.now(timezone.utc)
         )
         log.save()
+        publish_log(log)
         
         return jsonify(log.to_dict()), 201
     except DoesNotExist:
@@ -88,6 +121,161 @@ def create_log():
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+MAX_BATCH_SIZE = 1000
+LOG_SOURCES = AgentLog.source.choices
+LOG_TYPES = AgentLog.log_type.choices
+
+def parse_batch_body():
+    """
+    Read a batch of log entries from a JSON array or NDJSON body.
+    
+    Returns:
+        List of entries; a line that is not valid JSON is kept as an error string
+    """
+    body = request.get_data(as_text=True)
+    if not request.mimetype.endswith('ndjson'):
+        try:
+            entries = json.loads(body)
+        except ValueError:
+            entries = None
+        if isinstance(entries, list):
+            return entries
+        if isinstance(entries, dict) and isinstance(entries.get('logs'), list):
+            return entries['logs']
+    entries = []
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            entries.append(f"Invalid JSON on line {line_number}")
+    return entries
+
+def validate_batch_entry(entry):
+    """Return an error message for an entry, or None if its fields are valid"""
+    if isinstance(entry, str):
+        return entry
+    if not isinstance(entry, dict):
+        return "Log entry must be an object"
+    if not entry.get('work_order_id'):
+        return "work_order_id is required"
+    if not ObjectId.is_valid(entry['work_order_id']):
+        return "work_order_id must be a valid id"
+    if not entry.get('agent_action'):
+        return "agent_action is required"
+    if entry.get('step_id') and not ObjectId.is_valid(entry['step_id']):
+        return "step_id must be a valid id"
+    if entry.get('source', 'agent') not in LOG_SOURCES:
+        return f"source must be one of {', '.join(LOG_SOURCES)}"
+    if entry.get('log_type', 'info') not in LOG_TYPES:
+        return f"log_type must be one of {', '.join(LOG_TYPES)}"
+    if entry.get('timestamp'):
+        try:
+            datetime.fromisoformat(entry['timestamp'])
+        except (TypeError, ValueError):
+            return "timestamp must be an ISO 8601 datetime"
+    return None
+
+# Create Log Entries in bulk
+# Body: JSON array (or {"logs": [...]}) or NDJSON, one entry per line, same fields as POST /
+# plus an optional ISO timestamp. Responds with one result per entry, in request order.
+@logs_bp.route('/batch', methods=['POST'])
+def create_logs_batch():
+    try:
+        entries = parse_batch_body()
+        if not entries:
+            return jsonify({"error": "At least one log entry is required"}), 400
+        if len(entries) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"A batch may contain at most {MAX_BATCH_SIZE} log entries"}), 400
+        
+        results = [{"index": i} for i in range(len(entries))]
+        valid = []
+        for i, entry in enumerate(entries):
+            error = validate_batch_entry(entry)
+            if error:
+                results[i].update(status=400, error=error)
+            else:
+                valid.append(i)
+        
+        # One $in query each for the referenced work orders and steps
+        work_order_ids = {ObjectId(entries[i]['work_order_id']) for i in valid}
+        existing_work_orders = {
+            wo['_id'] for wo in WorkOrder.objects(id__in=list(work_order_ids)).only('id').as_pymongo()
+        }
+        step_ids = {ObjectId(entries[i]['step_id']) for i in valid if entries[i].get('step_id')}
+        step_work_orders = {}
+        if step_ids:
+            step_work_orders = {
+                step['_id']: step.get('work_order')
+                for step in PlanStep.objects(id__in=list(step_ids)).only('work_order').as_pymongo()
+            }
+        
+        now = datetime.now(timezone.utc)
+        documents = []
+        positions = []
+        for i in valid:
+            entry = entries[i]
+            work_order_id = ObjectId(entry['work_order_id'])
+            if work_order_id not in existing_work_orders:
+                results[i].update(status=404, error="WorkOrder not found")
+                continue
+            related_step = None
+            if entry.get('step_id'):
+                step_id = ObjectId(entry['step_id'])
+                # Same as POST /: a step from another work order is dropped, not an error
+                if step_work_orders.get(step_id) == work_order_id:
+                    related_step = step_id
+            log = AgentLog(
+                work_order=work_order_id,
+                agent_action=entry['agent_action'],
+                result=entry.get('result', ''),
+                related_step=related_step,
+                source=entry.get('source', 'agent'),
+                log_type=entry.get('log_type', 'info'),
+                timestamp=datetime.fromisoformat(entry['timestamp']) if entry.get('timestamp') else now
+            )
+            try:
+                log.validate()
+            except ValidationError as e:
+                results[i].update(status=400, error=str(e))
+                continue
+            documents.append(log.to_mongo().to_dict())
+            positions.append(i)
+        
+        failed_writes = {}
+        if documents:
+            # Unordered: one bad document does not stop the rest of the batch
+            try:
+                AgentLog._get_collection().insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                failed_writes = {error['index']: error.get('errmsg', 'Write failed') for error in e.details.get('writeErrors', [])}
+        
+        inserted = []
+        for offset, (i, document) in enumerate(zip(positions, documents)):
+            if offset in failed_writes:
+                results[i].update(status=500, error=failed_writes[offset])
+            else:
+                results[i].update(status=201, id=str(document['_id']))
+                inserted.append(document)
+        
+        for document in inserted:
+            publish_log(AgentLog._from_son(document))
+        
+        if len(inserted) == len(entries):
+            code = 201
+        elif inserted:
+            code = 207
+        else:
+            code = 400
+        return jsonify({
+            "inserted": len(inserted),
+            "failed": len(entries) - len(inserted),
+            "results": results
+        }), code
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
 # Get Single Log Entry
 @logs_bp.route('/<string:log_id>', methods=['GET'])
 def get_log(log_id):
@@ -0,0 +1,30 @@
+# /routes/metrics.py
+import time
+from flask import Blueprint, Response, request, g
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from agent.metrics import HTTP_REQUEST_SECONDS, register_cache_metrics
+from agent.llm_cache import cache_stats
+
+metrics_bp = Blueprint('metrics', __name__)
+
+register_cache_metrics(cache_stats)
+
+# Prometheus scrape endpoint
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+def init_request_metrics(app):
+    """Record the latency of every request by endpoint (blueprint.view), method and status"""
+    @app.before_request
+    def start_timer():
+        g.request_started_at = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        started_at = g.pop('request_started_at', None)
+        if started_at is not None:
+            HTTP_REQUEST_SECONDS.labels(
+                request.endpoint or 'unmatched', request.method, str(response.status_code)
+            ).observe(time.perf_counter() - started_at)
+        return response
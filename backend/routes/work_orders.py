@@ -1,10 +1,17 @@
 # /routes/work_orders.py
 from flask import Blueprint, request, jsonify
-from mongoengine import DoesNotExist
+from mongoengine import DoesNotExist, Q
+from bson import ObjectId
+from bson.errors import InvalidId
 from models.WorkOrder import WorkOrder
 from models.PlanStep import PlanStep
 from datetime import datetime, timezone
-from agent.main_agent import Context, run_agent, run_agent_from_step, regenerate_steps_from_issue, execute_steps_automatically
+import base64
+import json
+from agent.job_queue import enqueue
+from agent.step_counters import set_step_status
+from agent.inventory_reservations import release_work_order
+from routes.etag import validator_etag, conditional_response
 
 work_orders_bp = Blueprint('work_orders', __name__, url_prefix='/api/work_orders')
 
@@ -15,8 +22,19 @@ def from_step():
     if not data.get('step_id') or not data.get('work_order_id'):
         return jsonify({"error": "step_id and work_order_id are required"}), 400
     try:
-        run_agent_from_step(data.get("step_id"), data.get("work_order_id"))
-        return jsonify({"message": "Step confirmed and agent continued processing"}), 200
+        work_order = WorkOrder.objects.get(id=data.get("work_order_id"))
+        step = PlanStep.objects.get(id=data.get("step_id"), work_order=work_order)
+        # Record the technician's confirmation right away; the job continues the plan
+        set_step_status(step, "success", executed_at=datetime.now(timezone.utc))
+        job = enqueue("confirm_step", {
+            "step_id": data.get("step_id"),
+            "work_order_id": data.get("work_order_id"),
+        }, work_order=work_order)
+        return jsonify({
+            "message": "Step confirmed and agent queued to continue processing",
+            "job_id": str(job.id),
+            "status_url": f"/api/jobs/{job.id}"
+        }), 202
     except DoesNotExist as e:
         return jsonify({"error": f"WorkOrder or PlanStep not found: {str(e)}"}), 404
     except Exception as e:
@@ -32,13 +50,19 @@ def create_workorder():
     # estimated_expertise_level = data.get("estimated_expertise_level", "mid")  # Auto-generated by LLM
     # category = data.get("category", "other")  # Auto-generated by LLM
     
-    context = Context(
-        work_order_title=data.get("title") or data.get("work_order_title"),
-        work_order_description=data.get("description") or data.get("work_order_description") or "",
-        messages=[]
-    )
-    run_agent(context)
-    return jsonify({"message": "Work order created and agent started processing"}), 201
+    title = data.get("title") or data.get("work_order_title")
+    if not title:
+        return jsonify({"error": "title is required"}), 400
+
+    job = enqueue("create_work_order", {
+        "work_order_title": title,
+        "work_order_description": data.get("description") or data.get("work_order_description") or "",
+    })
+    return jsonify({
+        "message": "Work order queued for agent processing",
+        "job_id": str(job.id),
+        "status_url": f"/api/jobs/{job.id}"
+    }), 202
 
 # Helper function to ensure datetime has timezone info
 def format_datetime(dt):
@@ -49,62 +73,115 @@ def format_datetime(dt):
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.isoformat()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Fields read by the list endpoint
+LIST_FIELDS = (
+    'id', 'title', 'description', 'priority', 'status', 'estimated_expertise_level', 'category',
+    'created_at', 'updated_at', 'steps_total', 'steps_succeeded', 'steps_in_progress', 'current_step_number',
+)
+
+# Fields read by the steps endpoint
+STEP_FIELDS = ('id', 'step_number', 'description', 'executor', 'status', 'result', 'executed_at')
+
+def encode_cursor(wo):
+    """Opaque keyset cursor pointing just past the given work order document"""
+    updated_at = wo.get("updated_at")
+    raw = json.dumps({
+        "u": updated_at.replace(tzinfo=None).isoformat() if updated_at else None,
+        "id": str(wo["_id"]),
+    })
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def cursor_filter(cursor):
+    """Decode a cursor into a Q selecting the work orders that sort after it"""
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    last_id = ObjectId(data["id"])
+    if data.get("u") is None:
+        # Work orders without updated_at sort last, ordered by _id
+        return Q(updated_at=None, id__lt=last_id)
+    updated_at = datetime.fromisoformat(data["u"])
+    return (
+        Q(updated_at__lt=updated_at)
+        | Q(updated_at=updated_at, id__lt=last_id)
+        | Q(updated_at=None)
+    )
+
+def split_param(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+def serialize_work_order(wo):
+    created_at = wo.get("created_at")
+    updated_at = wo.get("updated_at") or created_at
+    return {
+        "id": str(wo["_id"]),
+        "title": wo.get("title"),
+        "description": wo.get("description"),
+        "priority": wo.get("priority", "medium"),
+        "status": wo.get("status"),
+        "estimated_expertise_level": wo.get("estimated_expertise_level", "mid"),
+        "category": wo.get("category", "other"),
+        "created_at": format_datetime(created_at),
+        "updated_at": format_datetime(updated_at),
+        "steps_total": wo.get("steps_total", 0),
+        "steps_succeeded": wo.get("steps_succeeded", 0),
+        "steps_in_progress": wo.get("steps_in_progress", 0),
+        "current_step_number": wo.get("current_step_number"),
+    }
+
 # Get All WorkOrders
+# Query params: limit, cursor, status, priority, category (comma separated), assigned_technician
+# The cursor for the next page is returned in the X-Next-Cursor header.
 @work_orders_bp.route('/', methods=['GET'])
 def get_workorders():
-    workorders = WorkOrder.objects()
-    results = []
-    for wo in workorders:
-        # Calculate status based on step completion
-        steps = PlanStep.objects(work_order=wo).order_by('step_number')
-        status = wo.status  # Default to current status
-        
-        if steps:
-            completed_steps = [s for s in steps if s.status == "success"]
-            in_progress_steps = [s for s in steps if s.status == "in_progress"]
-            
-            if len(completed_steps) == len(steps):
-                # All steps completed
-                status = "completed"
-            elif len(completed_steps) > 0 or len(in_progress_steps) > 1:
-                # At least one step is complete or in progress
-                status = "in_progress"
-            else:
-                # No steps completed yet
-                status = "pending"
-            
-            # Update work order status if it changed
-            if wo.status != status:
-                wo.status = status
-                wo.updated_at = datetime.now(timezone.utc)
-                wo.save()
-                # Reload to get the updated timestamp
-                wo.reload()
-        
-        # Get timestamps for sorting
-        updated_at = wo.updated_at if wo.updated_at else wo.created_at
-        created_at = wo.created_at
-        
-        results.append({
-            "id": str(wo.id),
-            "title": wo.title,
-            "description": wo.description,
-            "priority": wo.priority,
-            "status": status,
-            "estimated_expertise_level": wo.estimated_expertise_level,
-            "category": wo.category,
-            "created_at": format_datetime(created_at),
-            "updated_at": format_datetime(updated_at) or format_datetime(created_at),
-            "_sort_key": updated_at if updated_at else created_at,  # Internal sorting key
-        })
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    query = Q()
+    statuses = split_param('status')
+    if statuses:
+        query &= Q(status__in=statuses)
+    priorities = split_param('priority')
+    if priorities:
+        query &= Q(priority__in=priorities)
+    categories = split_param('category')
+    if categories:
+        query &= Q(category__in=categories)
+    technician_id = request.args.get('assigned_technician')
+    if technician_id:
+        if not ObjectId.is_valid(technician_id):
+            return jsonify({"error": "assigned_technician must be a valid id"}), 400
+        query &= Q(assigned_technician=ObjectId(technician_id))
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            query &= cursor_filter(cursor)
+        except (ValueError, KeyError, TypeError, InvalidId):
+            return jsonify({"error": "Invalid cursor"}), 400
+    
+    # Every write to a work order bumps updated_at, so the newest updated_at
+    # and the count of the filtered set only change when the page can
+    filtered = WorkOrder.objects(query)
+    latest = filtered.order_by('-updated_at').only('updated_at').as_pymongo().first()
+    etag = validator_etag('work_orders', filtered.count(), latest.get('updated_at') if latest else None)
     
-    # Sort results by _sort_key descending (newest first)
-    # Remove _sort_key before returning
-    results.sort(key=lambda x: x['_sort_key'] if x['_sort_key'] else datetime.min.replace(tzinfo=timezone.utc), reverse=True)
-    for result in results:
-        result.pop('_sort_key', None)
+    def build_response():
+        # Status and step counters are maintained on the document, so this is a
+        # single indexed query without touching plan_step
+        workorders = list(filtered.order_by('-updated_at', '-id').only(*LIST_FIELDS).limit(limit + 1).as_pymongo())
+        
+        response = jsonify([serialize_work_order(wo) for wo in workorders[:limit]])
+        if len(workorders) > limit:
+            response.headers['X-Next-Cursor'] = encode_cursor(workorders[limit - 1])
+        return response
     
-    return jsonify(results)
+    return conditional_response(etag, build_response)
 
 # Report Issue and Regenerate Steps
 @work_orders_bp.route('/issue', methods=['POST'])
@@ -120,85 +197,20 @@ def report_issue():
         work_order = WorkOrder.objects.get(id=data['work_order_id'])
         
         # Get the problematic step
-        problematic_step = PlanStep.objects.get(id=data['step_id'], work_order=work_order)
-        
-        # Get all plan steps for this work order, ordered by step_number
-        all_steps = PlanStep.objects(work_order=work_order).order_by('step_number')
-        
-        # Get completed steps before the problematic step (for context)
-        completed_steps = [
-            step for step in all_steps 
-            if step.step_number < problematic_step.step_number and step.status == "success"
-        ]
+        PlanStep.objects.get(id=data['step_id'], work_order=work_order)
         
-        # Delete all steps from the problematic step onwards
-        steps_to_delete = [
-            step for step in all_steps 
-            if step.step_number >= problematic_step.step_number
-        ]
-        
-        for step in steps_to_delete:
-            step.delete()
-        
-        # Regenerate steps from the problematic step onwards
-        new_steps_data = regenerate_steps_from_issue(
-            work_order=work_order,
-            issue_description=data['issue_description'],
-            from_step_number=problematic_step.step_number,
-            completed_steps=completed_steps
-        )
-        
-        # Create new PlanSteps
-        new_plan_steps = [
-            PlanStep(
-                work_order=work_order,
-                step_number=step['step_number'],
-                description=step['description'],
-                executor="undecided",
-                status="pending",
-                result=None,
-                executed_at=None
-            ) for step in new_steps_data
-        ]
-        
-        # Bulk insert the new steps
-        PlanStep.objects.insert(new_plan_steps)
-        
-        # Refresh steps from database to get IDs and ensure we have the latest data
-        refreshed_steps = PlanStep.objects(work_order=work_order).order_by('step_number')
-        steps_to_execute = [
-            step for step in refreshed_steps 
-            if step.step_number >= problematic_step.step_number
-        ]
-        
-        # Automatically execute the new steps (agent will do what it can)
-        first_technician_step = execute_steps_automatically(
-            work_order=work_order,
-            plan_steps=steps_to_execute,
-            start_from_step_number=problematic_step.step_number
-        )
-        
-        # Update work order status if needed
-        work_order.updated_at = datetime.now(timezone.utc)
-        if work_order.status == "completed":
-            work_order.status = "in_progress"
-        work_order.save()
+        # Regeneration and re-execution run on the job workers
+        job = enqueue("report_issue", {
+            "step_id": data['step_id'],
+            "work_order_id": data['work_order_id'],
+            "issue_description": data['issue_description'],
+        }, work_order=work_order)
         
         return jsonify({
-            "message": "Steps regenerated successfully",
-            "deleted_steps_count": len(steps_to_delete),
-            "new_steps_count": len(new_plan_steps),
-            "first_technician_step_id": str(first_technician_step.id) if first_technician_step else None,
-            "new_steps": [
-                {
-                    "id": str(step.id),
-                    "step_number": step.step_number,
-                    "description": step.description,
-                    "status": step.status,
-                    "executor": step.executor
-                } for step in new_plan_steps
-            ]
-        }), 200
+            "message": "Issue reported, step regeneration queued",
+            "job_id": str(job.id),
+            "status_url": f"/api/jobs/{job.id}"
+        }), 202
         
     except DoesNotExist as e:
         return jsonify({"error": f"WorkOrder or PlanStep not found: {str(e)}"}), 404
@@ -219,7 +231,11 @@ def get_workorder(workorder_id):
             "estimated_expertise_level": wo.estimated_expertise_level,
             "category": wo.category,
             "created_at": format_datetime(wo.created_at),
-            "updated_at": format_datetime(wo.updated_at)
+            "updated_at": format_datetime(wo.updated_at),
+            "steps_total": wo.steps_total,
+            "steps_succeeded": wo.steps_succeeded,
+            "steps_in_progress": wo.steps_in_progress,
+            "current_step_number": wo.current_step_number
         })
     except DoesNotExist:
         return jsonify({"error": "WorkOrder not found"}), 404
@@ -229,19 +245,25 @@ def get_workorder(workorder_id):
 def get_workorder_steps(workorder_id):
     try:
         wo = WorkOrder.objects.get(id=workorder_id)
-        steps = PlanStep.objects(work_order=wo).order_by('step_number')
-        results = []
-        for step in steps:
-            results.append({
-                "id": str(step.id),
-                "step_number": step.step_number,
-                "description": step.description,
-                "executor": step.executor,
-                "status": step.status,
-                "result": step.result,
-                "executed_at": format_datetime(step.executed_at)
-            })
-        return jsonify(results)
+        steps = PlanStep.objects(work_order=wo)
+        latest = steps.order_by('-updated_at').only('updated_at').as_pymongo().first()
+        etag = validator_etag('steps', wo.id, steps.count(), latest.get('updated_at') if latest else None)
+        
+        def build_response():
+            results = []
+            for step in steps.order_by('step_number').only(*STEP_FIELDS).as_pymongo():
+                results.append({
+                    "id": str(step["_id"]),
+                    "step_number": step.get("step_number"),
+                    "description": step.get("description"),
+                    "executor": step.get("executor", "undecided"),
+                    "status": step.get("status", "pending"),
+                    "result": step.get("result"),
+                    "executed_at": format_datetime(step.get("executed_at"))
+                })
+            return jsonify(results)
+        
+        return conditional_response(etag, build_response)
     except DoesNotExist:
         return jsonify({"error": "WorkOrder not found"}), 404
 
@@ -269,6 +291,8 @@ def update_workorder(workorder_id):
 def delete_workorder(workorder_id):
     try:
         wo = WorkOrder.objects.get(id=workorder_id)
+        # Return the work order's held parts to stock
+        release_work_order(wo.id)
         wo.delete()
         return jsonify({"message": "WorkOrder deleted"})
     except DoesNotExist:
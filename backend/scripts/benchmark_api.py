@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Load and latency benchmark for the REST API.
+
+Starts the Flask app from app.py on a local port against a dedicated MongoDB
+database (MONGODB_HOST, database "benchmark" by default), seeds it with a
+configurable volume of work orders, steps, logs, inventory, escalations and
+users, then drives concurrent load against each endpoint in turn.
+
+For every endpoint it reports request count, errors, throughput, latency
+percentiles (p50/p95/p99) and the MongoDB commands issued, as JSON on stdout
+or in --output, so runs from different commits can be diffed.
+
+Usage:
+    python scripts/benchmark_api.py --work-orders 500 --concurrency 16 --requests 1000 --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# Add parent directory to path to import models
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+load_dotenv()
+
+ENDPOINTS = ["work_orders", "logs", "inventory_search", "escalations", "auth_login"]
+BENCHMARK_PASSWORD = "benchmark-password"
+SEARCH_TERMS = ["GPU", "SSD", "DDR", "Switch", "Cable", "PSU", "Fan", "NVMe"]
+# Connection housekeeping, not work done for a request
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "buildInfo", "saslStart", "saslContinue"}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands sent to one database"""
+
+    def __init__(self, database):
+        self.database = database
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.database_name == self.database and event.command_name not in IGNORED_COMMANDS:
+            with self._lock:
+                self.counts[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.counts)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="benchmark", help="Database to seed and run against (dropped first)")
+    parser.add_argument("--work-orders", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=5, help="Plan steps per work order")
+    parser.add_argument("--logs", type=int, default=20, help="Agent logs per work order")
+    parser.add_argument("--escalations", type=int, default=1, help="Escalations per work order")
+    parser.add_argument("--inventory", type=int, default=500)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per endpoint")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma separated subset of " + ", ".join(ENDPOINTS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args()
+
+
+def seed_database(args, rng):
+    from models.WorkOrder import WorkOrder
+    from models.PlanStep import PlanStep
+    from models.AgentLog import AgentLog
+    from models.EscalationMessage import EscalationMessage
+    from models.InventoryItem import InventoryItem
+    from models.User import User
+
+    now = datetime.now(timezone.utc)
+    statuses = ["pending", "in_progress", "completed", "escalated"]
+    work_orders = []
+    for i in range(args.work_orders):
+        created_at = now - timedelta(minutes=rng.randint(1, 60 * 24 * 7))
+        status = rng.choice(statuses)
+        succeeded = args.steps if status == "completed" else rng.randint(0, args.steps - 1) if args.steps else 0
+        work_orders.append(WorkOrder(
+            title=f"Benchmark work order {i}",
+            description=f"Server {rng.randint(1, 400)} in rack {rng.randint(1, 40)} reports errors",
+            priority=rng.choice(["low", "medium", "high"]),
+            category=rng.choice(["reboot", "hardware", "network", "other"]),
+            status=status,
+            created_at=created_at,
+            updated_at=created_at + timedelta(minutes=rng.randint(0, 600)),
+            steps_total=args.steps,
+            steps_succeeded=succeeded,
+            steps_in_progress=0 if status == "completed" else 1,
+            current_step_number=min(succeeded + 1, args.steps) if args.steps else None,
+        ))
+    if work_orders:
+        WorkOrder.objects.insert(work_orders, load_bulk=False)
+    work_orders = list(WorkOrder.objects.only('id', 'created_at', 'steps_succeeded'))
+
+    steps, logs, escalations = [], [], []
+    for wo in work_orders:
+        steps.extend(
+            PlanStep(
+                work_order=wo,
+                step_number=n,
+                description=f"Step {n}",
+                executor=rng.choice(["agent", "technician"]),
+                status="success" if n <= wo.steps_succeeded else "pending",
+            ) for n in range(1, args.steps + 1)
+        )
+        for n in range(args.logs):
+            logs.append(AgentLog(
+                work_order=wo,
+                timestamp=wo.created_at + timedelta(seconds=n * 30),
+                agent_action=f"Ran diagnostics pass {n}",
+                result="ok",
+                source=rng.choice(["agent", "technician"]),
+                log_type=rng.choice(["info", "success", "warning", "error"]),
+            ))
+        for n in range(args.escalations):
+            escalations.append(EscalationMessage(
+                work_order_id=wo,
+                timestamp=wo.created_at + timedelta(minutes=n),
+                message=f"Needs a senior engineer ({n})",
+                source=rng.choice(["technician", "ai_agent"]),
+                status=rng.choice(["sent", "acknowledged", "resolved"]),
+            ))
+    if steps:
+        PlanStep.objects.insert(steps, load_bulk=False)
+    # Link some logs to steps so the step number lookup is part of the measurement
+    step_ids = [step["_id"] for step in PlanStep.objects.only('id').as_pymongo()]
+    for log in logs:
+        if step_ids and rng.random() < 0.5:
+            log.related_step = rng.choice(step_ids)
+    if logs:
+        AgentLog.objects.insert(logs, load_bulk=False)
+    if escalations:
+        EscalationMessage.objects.insert(escalations, load_bulk=False)
+
+    items = [
+        InventoryItem(
+            name=f"{rng.choice(SEARCH_TERMS)} model {i}",
+            quantity=rng.randint(0, 200),
+            location=f"Storage Room {rng.choice('ABCD')}",
+            cost=str(rng.randint(10, 40000)),
+        ) for i in range(args.inventory)
+    ]
+    if items:
+        InventoryItem.objects.insert(items, load_bulk=False)
+
+    for i in range(args.users):
+        user = User(
+            username=f"bench{i}",
+            email=f"bench{i}@example.com",
+            name=f"Benchmark User {i}",
+            role=rng.choice(["technician", "engineer"]),
+        )
+        user.set_password(BENCHMARK_PASSWORD)
+        user.save()
+
+    return [str(wo.id) for wo in work_orders]
+
+
+def build_scenarios(args, work_order_ids):
+    """Endpoint name -> function(rng) returning (method, path, json body)"""
+    return {
+        "work_orders": lambda rng: ("GET", "/api/work_orders/?limit=50" + rng.choice(["", "&status=pending", "&status=in_progress,escalated"]), None),
+        "logs": lambda rng: ("GET", f"/api/logs/work_order/{rng.choice(work_order_ids)}", None),
+        "inventory_search": lambda rng: ("GET", f"/api/inventory/search?q={rng.choice(SEARCH_TERMS)}", None),
+        "escalations": lambda rng: ("GET", "/api/escalations/?limit=100" + rng.choice(["", "&status=sent"]), None),
+        "auth_login": lambda rng: ("POST", "/api/auth/login", {
+            "email": f"bench{rng.randrange(max(args.users, 1))}@example.com",
+            "password": BENCHMARK_PASSWORD,
+        }),
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_endpoint(base_url, scenario, args, counter, seed):
+    import requests
+
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def send(i):
+        rng = random.Random(seed * 1_000_003 + i)
+        method, path, body = scenario(rng)
+        start = time.perf_counter()
+        try:
+            response = session().request(method, base_url + path, json=body, timeout=60)
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        return time.perf_counter() - start, status
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(send, range(args.warmup)))
+        before = counter.snapshot()
+        started = time.perf_counter()
+        samples = list(pool.map(send, range(args.warmup, args.warmup + args.requests)))
+        elapsed = time.perf_counter() - started
+        commands = counter.snapshot() - before
+
+    latencies = sorted(duration * 1000 for duration, _ in samples)
+    errors = sum(1 for _, status in samples if status is None or status >= 400)
+    total_commands = sum(commands.values())
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3) if latencies else None,
+            "p95": round(percentile(latencies, 95), 3) if latencies else None,
+            "p99": round(percentile(latencies, 99), 3) if latencies else None,
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "max": round(latencies[-1], 3) if latencies else None,
+        },
+        "mongo_ops": {
+            "total": total_commands,
+            "per_request": round(total_commands / len(samples), 2) if samples else None,
+            "by_command": dict(sorted(commands.items())),
+        },
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    args = parse_args()
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        raise ValueError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+    if args.db == "datacenter":
+        raise ValueError("Refusing to drop the datacenter database; pass a dedicated --db")
+
+    # The app connects on import: point it at the benchmark database and keep
+    # agent workers, log retention and the reservation sweeper from adding background load
+    os.environ["MONGODB_DB"] = args.db
+    os.environ["JOB_WORKERS"] = "0"
+    os.environ["LOG_RETENTION_INTERVAL_SECONDS"] = "0"
+    os.environ["INVENTORY_RESERVATION_SWEEP_SECONDS"] = "0"
+    counter = CommandCounter(args.db)
+    monitoring.register(counter)
+
+    from mongoengine.connection import get_db
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from app import app
+
+    get_db().client.drop_database(args.db)
+    from models.indexes import ensure_indexes
+    ensure_indexes()
+
+    rng = random.Random(args.seed)
+    seed_started = time.perf_counter()
+    work_order_ids = seed_database(args, rng)
+    print(f"Seeded {args.db} in {time.perf_counter() - seed_started:.1f}s", file=sys.stderr)
+    # The app built the search index before the drop, and the bulk seed inserts fire
+    # no save signals; rebuild it so search is measured against the seeded items
+    from agent.inventory_index import index as inventory_index
+    inventory_index.build()
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    scenarios = build_scenarios(args, work_order_ids)
+    results = {}
+    try:
+        for name in endpoints:
+            results[name] = run_endpoint(base_url, scenarios[name], args, counter, args.seed)
+            latency = results[name]["latency_ms"]
+            print(
+                f"{name:18} {results[name]['throughput_rps']:>9} req/s  p50 {latency['p50']}ms  "
+                f"p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+                f"mongo ops/req {results[name]['mongo_ops']['per_request']}  errors {results[name]['errors']}",
+                file=sys.stderr
+            )
+    finally:
+        server.shutdown()
+
+    report = {
+        "commit": current_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"\n❌ Error running benchmark: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
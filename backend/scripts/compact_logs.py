@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Run one agent log retention pass: sync the TTL index on routine agent logs and
+roll up the logs of closed work orders. Useful from cron when the API runs
+with LOG_RETENTION_INTERVAL_SECONDS=0.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import models
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+# Before the agent and model imports, which read their settings at import time
+load_dotenv()
+
+from models.db import connect_db
+from agent.log_retention import run_retention
+
+# Connect to MongoDB
+connect_db()
+
+if __name__ == "__main__":
+    try:
+        compacted, removed = run_retention()
+        print(f"Rolled up {removed} log entries across {compacted} closed work orders.")
+    except Exception as e:
+        print(f"Error compacting logs: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
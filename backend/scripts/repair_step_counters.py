@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Repair script to recompute the denormalized step counters on every work order.
+Run this after a crash or manual database edits left steps_total/steps_succeeded/
+steps_in_progress out of sync with the plan_step collection.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import models
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+# Before the agent and model imports, which read their settings at import time
+load_dotenv()
+
+from models.db import connect_db
+from agent.step_counters import recompute_step_counters
+
+# Connect to MongoDB
+connect_db()
+
+if __name__ == "__main__":
+    try:
+        print("Recomputing work order step counters...")
+        repaired = recompute_step_counters()
+        print(f"Step counters rewritten for {repaired} work orders.")
+    except Exception as e:
+        print(f"Error repairing step counters: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Run the agent job workers in a standalone process.
+Use this together with JOB_WORKERS=0 on the API servers to keep LLM work off the web workers.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import models
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+from models.db import connect_db
+
+load_dotenv()
+
+# Imported before connecting so the MongoDB command listener sees this client
+import agent.metrics
+from prometheus_client import start_http_server
+
+# Connect to MongoDB
+connect_db()
+
+from agent.job_queue import start_workers
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv("JOB_WORKER_PROCESS_THREADS", "4"))
+    if os.getenv("METRICS_PORT"):
+        # No Flask app here, so serve /metrics from prometheus_client directly
+        start_http_server(int(os.getenv("METRICS_PORT")))
+    stop_event = start_workers(count)
+    print(f"Started {count} job workers. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+        print("Stopping job workers...")
@@ -2,27 +2,34 @@
 """
 Seed script to populate the database with realistic data center inventory items.
 Run this script to populate the inventory with common data center components.
+
+Pass a CSV or NDJSON catalog (same columns as POST /api/inventory/import) to
+load it instead:
+    python scripts/seed_inventory.py catalog.csv
+
+Items are upserted by name and location in batched bulk writes, the same path
+as the import endpoint.
 """
 
 import os
 import sys
+import time
 from pathlib import Path
 
 # Add parent directory to path to import models
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from dotenv import load_dotenv
-from mongoengine import connect
-from models.InventoryItem import InventoryItem
-from datetime import datetime
 
+# Before the agent and model imports, which read their settings at import time
 load_dotenv()
 
+from models.db import connect_db
+from models.InventoryItem import InventoryItem
+from agent.inventory_bulk import import_items, read_csv, read_ndjson
+
 # Connect to MongoDB
-connect(
-    db="datacenter",
-    host=os.getenv("MONGODB_HOST")
-)
+connect_db()
 
 # Realistic data center inventory items with quantities
 INVENTORY_ITEMS = [
@@ -100,51 +107,34 @@ INVENTORY_ITEMS = [
     {"name": "Server Screw Set (M3, M4, M5)", "quantity": 89, "location": "Storage Room M", "cost": "15", "reserved": False},
 ]
 
-def seed_inventory():
-    """Seed the database with inventory items."""
+def seed_inventory(catalog_path=None):
+    """Seed the database with inventory items, from a catalog file when one is given."""
     print("Starting inventory seeding...")
     
     # Clear existing inventory (optional - comment out if you want to keep existing items)
     # InventoryItem.objects().delete()
     # print("Cleared existing inventory items.")
     
-    created_count = 0
-    updated_count = 0
-    
-    for item_data in INVENTORY_ITEMS:
-        # Check if item already exists
-        existing_item = InventoryItem.objects(name=item_data["name"]).first()
-        
-        if existing_item:
-            # Update existing item
-            existing_item.quantity = item_data["quantity"]
-            existing_item.location = item_data["location"]
-            existing_item.cost = item_data["cost"]
-            existing_item.reserved = item_data["reserved"]
-            existing_item.save()
-            updated_count += 1
-            print(f"Updated: {item_data['name']} - Quantity: {item_data['quantity']}")
-        else:
-            # Create new item
-            inventory_item = InventoryItem(
-                name=item_data["name"],
-                quantity=item_data["quantity"],
-                location=item_data["location"],
-                cost=item_data["cost"],
-                reserved=item_data["reserved"]
-            )
-            inventory_item.save()
-            created_count += 1
-            print(f"Created: {item_data['name']} - Quantity: {item_data['quantity']} - Location: {item_data['location']}")
-    
-    print(f"\nInventory seeding complete!")
-    print(f"Created: {created_count} items")
-    print(f"Updated: {updated_count} items")
+    start = time.perf_counter()
+    if catalog_path:
+        with open(catalog_path, "rb") as f:
+            rows = read_ndjson(f) if catalog_path.endswith((".ndjson", ".jsonl")) else read_csv(f)
+            summary = import_items(rows)
+    else:
+        summary = import_items(enumerate(INVENTORY_ITEMS, start=1))
+    
+    print(f"\nInventory seeding complete in {time.perf_counter() - start:.2f}s!")
+    print(f"Created: {summary['created']} items")
+    print(f"Updated: {summary['updated']} items")
+    if summary["failed"]:
+        print(f"Failed: {summary['failed']} rows")
+        for error in summary["errors"]:
+            print(f"  Line {error['line']}: {error['error']}")
     print(f"Total items in inventory: {InventoryItem.objects().count()}")
 
 if __name__ == "__main__":
     try:
-        seed_inventory()
+        seed_inventory(sys.argv[1] if len(sys.argv) > 1 else None)
     except Exception as e:
         print(f"Error seeding inventory: {str(e)}")
         import traceback
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Verify that every hot query shape used by the API is served by an index.
+Runs explain() on each shape and exits non-zero if any winning plan contains a COLLSCAN.
+"""
+
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add parent directory to path to import models
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+# Before the agent and model imports, which read their settings at import time
+load_dotenv()
+
+from mongoengine import Q
+from models.db import connect_db
+from models.indexes import ensure_indexes
+from models.WorkOrder import WorkOrder
+from models.PlanStep import PlanStep
+from models.AgentLog import AgentLog
+from models.EscalationMessage import EscalationMessage
+from models.InventoryItem import InventoryItem
+from models.User import User
+from models.Job import Job
+
+# Connect to MongoDB
+connect_db()
+
+SAMPLE_ID = ObjectId()
+NOW = datetime.now(timezone.utc)
+
+# (name, callable returning the explain output) for each route's query shape
+QUERY_SHAPES = [
+    ("GET /api/work_orders", lambda: WorkOrder.objects().order_by('-updated_at', '-id').limit(51).explain()),
+    ("GET /api/work_orders?status=", lambda: WorkOrder.objects(status__in=["pending", "in_progress"]).order_by('-updated_at', '-id').limit(51).explain()),
+    ("GET /api/work_orders?assigned_technician=", lambda: WorkOrder.objects(assigned_technician=SAMPLE_ID).order_by('-updated_at', '-id').limit(51).explain()),
+    ("GET /api/work_orders (etag)", lambda: WorkOrder.objects().order_by('-updated_at').limit(1).explain()),
+    ("GET /api/work_orders/<id>/steps", lambda: PlanStep.objects(work_order=SAMPLE_ID).order_by('step_number').explain()),
+    ("GET /api/work_orders/<id>/steps (etag)", lambda: PlanStep.objects(work_order=SAMPLE_ID).order_by('-updated_at').limit(1).explain()),
+    ("GET /api/logs", lambda: AgentLog.objects().order_by('-timestamp').explain()),
+    ("GET /api/logs/work_order/<id>", lambda: AgentLog.objects(work_order=SAMPLE_ID).order_by('-timestamp').explain()),
+    ("GET /api/logs/work_order/<id> (etag)", lambda: AgentLog.objects(work_order=SAMPLE_ID).order_by('-id').limit(1).explain()),
+    ("GET /api/logs/stream", lambda: AgentLog.objects(id__gt=SAMPLE_ID).order_by('id').explain()),
+    ("GET /api/escalations/work_order/<id>", lambda: EscalationMessage.objects(work_order_id=SAMPLE_ID).explain()),
+    ("GET /api/escalations?status=", lambda: EscalationMessage.objects(status__in=["sent", "acknowledged"]).order_by('-timestamp', '-id').limit(101).explain()),
+    ("GET /api/escalations?engineer=", lambda: EscalationMessage.objects(engineer=SAMPLE_ID).order_by('-timestamp', '-id').limit(101).explain()),
+    ("GET /api/inventory (etag)", lambda: InventoryItem.objects().order_by('-updated_at').limit(1).explain()),
+    # Inventory search matches in memory (agent/inventory_index.py); these are its only queries
+    ("GET /api/inventory/search (hydrate)", lambda: InventoryItem.objects(id__in=[SAMPLE_ID]).explain()),
+    ("inventory index refresh", lambda: InventoryItem.objects(updated_at__gte=NOW).only('id', 'name', 'location', 'updated_at').explain()),
+    ("seed_inventory name/location lookup", lambda: InventoryItem.objects(name="NVIDIA A100 GPU", location="Storage Room A").explain()),
+    ("POST /api/auth/login", lambda: User.objects(email="tech@example.com").explain()),
+    ("job worker claim", lambda: Job.objects(Q(status="queued") | Q(status="running", lease_expires_at__lt=NOW)).order_by('created_at').limit(1).explain()),
+]
+
+
+def winning_plans(explain):
+    """Yield every winning plan in an explain document (find or aggregate, sharded or not)"""
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield value
+            elif key != "rejectedPlans":
+                yield from winning_plans(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from winning_plans(item)
+
+
+def plan_stages(plan):
+    """Collect the stage names of a plan tree (classic and SBE explain formats)"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+
+def verify():
+    ensure_indexes()
+    failures = 0
+    for name, explain in QUERY_SHAPES:
+        stages = []
+        for plan in winning_plans(explain()):
+            stages.extend(plan_stages(plan))
+        status = "FAIL" if "COLLSCAN" in stages else "ok"
+        if status == "FAIL":
+            failures += 1
+        print(f"[{status:>4}] {name}: {' > '.join(dict.fromkeys(stages)) or 'no plan'}")
+    return failures
+
+
+if __name__ == "__main__":
+    failures = verify()
+    if failures:
+        print(f"\n{failures} query shape(s) fall back to COLLSCAN.")
+        sys.exit(1)
+    print("\nAll query shapes use an index.")
@@ -0,0 +1,55 @@
+"""
+Table tests for the local step classification rules.
+
+Run from backend/: python -m unittest discover tests
+"""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agent.step_classifier import classify_by_rules, RULE_CONFIDENCE_THRESHOLD
+
+# Steps the rules must leave to the LLM / agent
+SOFTWARE_STEPS = [
+    "Clean up old log files on the boot disk",
+    "Remove stale entries from the disk cache",
+    "Remove the failed disk from the RAID array with mdadm",
+    "Connect to the server console and check the NIC link status",
+    "Label the new partitions on the NVMe drive",
+    "Install firmware update on the GPU",
+    "Reboot the server and reconnect remotely",
+    "Check the temperature readings of Server A12",
+    "Replace the configuration on the switch",
+    "Locate the server in rack 3",
+]
+
+# Steps the rules mark as technician work without asking the LLM
+PHYSICAL_STEPS = [
+    "Physically replace GPU card in Server A12",
+    "Replace the failed GPU in Server A12",
+    "Install new RAM modules",
+    "Reseat the NIC in slot 2",
+    "Swap the failed power supply",
+    "Manually inspect the server for damage",
+]
+
+
+class ClassifyByRulesTest(unittest.TestCase):
+    def test_software_steps_stay_below_threshold(self):
+        for description in SOFTWARE_STEPS:
+            with self.subTest(description=description):
+                score, _ = classify_by_rules(description)
+                self.assertLess(score, RULE_CONFIDENCE_THRESHOLD)
+
+    def test_physical_steps_reach_threshold(self):
+        for description in PHYSICAL_STEPS:
+            with self.subTest(description=description):
+                score, reason = classify_by_rules(description)
+                self.assertGreaterEqual(score, RULE_CONFIDENCE_THRESHOLD)
+                self.assertTrue(reason.startswith("Rule match:"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { motion } from 'framer-motion'
 import StatusChip from './StatusChip'
 import StatCard from './StatCard'
@@ -8,6 +8,7 @@ import InventoryBadge from './InventoryBadge'
 import IssueReportForm from './IssueReportForm'
 import { useReducedMotion } from '../hooks/useReducedMotion'
 import { useAuth } from '../contexts/AuthContext'
+import { waitForJob } from '../utils/api'
 
 function WorkOrderDetails({ workOrderId, onLogsClick, onAssignClick, onIssueEscalate }) {
   const { isEngineer } = useAuth()
@@ -21,19 +22,29 @@ function WorkOrderDetails({ workOrderId, onLogsClick, onAssignClick, onIssueEsca
   const [selectedStepIndex, setSelectedStepIndex] = useState(null)
   const [loadingStepId, setLoadingStepId] = useState(null)
   const [isSubmittingIssue, setIsSubmittingIssue] = useState(false)
+  // Background agent job started from this view ({ label, status, progress })
+  const [agentJob, setAgentJob] = useState(null)
+  const jobAbortRef = useRef(null)
   const prefersReducedMotion = useReducedMotion()
 
   useEffect(() => {
     if (workOrderId) {
       fetchWorkOrderDetails()
     }
+    // Stop following a job when switching work orders or unmounting
+    return () => {
+      jobAbortRef.current?.abort()
+      jobAbortRef.current = null
+      setAgentJob(null)
+    }
   }, [workOrderId])
 
-  const fetchWorkOrderDetails = async () => {
+  const fetchWorkOrderDetails = async ({ silent = false } = {}) => {
     if (!workOrderId) return
 
     try {
-      setLoading(true)
+      // Silent refreshes (while the agent runs) keep the current view on screen
+      if (!silent) setLoading(true)
       setError(null)
 
       // Fetch work order
@@ -97,6 +108,40 @@ function WorkOrderDetails({ workOrderId, onLogsClick, onAssignClick, onIssueEsca
     }
   }
 
+  // The backend answers 202 with a job_id and runs the agent in the background:
+  // poll the job, refresh as the agent moves through the steps and once it finishes
+  const followJob = async (jobId, label) => {
+    jobAbortRef.current?.abort()
+    const controller = new AbortController()
+    jobAbortRef.current = controller
+    setAgentJob({ label, status: 'queued', progress: {} })
+
+    let lastStep = null
+    try {
+      await waitForJob(jobId, {
+        signal: controller.signal,
+        onUpdate: (job) => {
+          setAgentJob({ label, status: job.status, progress: job.progress || {} })
+          const step = job.progress?.current_step
+          if (step != null && step !== lastStep) {
+            lastStep = step
+            fetchWorkOrderDetails({ silent: true })
+          }
+        },
+      })
+    } catch (err) {
+      if (err.name === 'AbortError') return
+      console.error(`Error while ${label.toLowerCase()}:`, err)
+      alert(`${label} failed: ${err.message}`)
+    } finally {
+      if (jobAbortRef.current === controller) {
+        jobAbortRef.current = null
+        setAgentJob(null)
+      }
+    }
+    await fetchWorkOrderDetails({ silent: true })
+  }
+
   const handleRunStep = async (stepIndex) => {
     const step = steps[stepIndex]
     // Simulate step execution with detailed logs
@@ -141,6 +186,7 @@ function WorkOrderDetails({ workOrderId, onLogsClick, onAssignClick, onIssueEsca
       })
 
       if (response.ok) {
+        const job = await response.json()
         // Create a log entry for step completion
         try {
           const step = steps.find(s => s.id === stepId)
@@ -160,8 +206,12 @@ function WorkOrderDetails({ workOrderId, onLogsClick, onAssignClick, onIssueEsca
           console.error('Error creating log:', logErr)
         }
         
-        // Refresh steps after confirmation
-        await fetchWorkOrderDetails()
+        // The confirmation is recorded right away; the agent continues in the background
+        await fetchWorkOrderDetails({ silent: true })
+        setLoadingStepId(null)
+        if (job.job_id) {
+          await followJob(job.job_id, 'Continuing the plan')
+        }
       } else {
         const error = await response.json()
         throw new Error(error.error || 'Failed to confirm step')
@@ -268,7 +318,7 @@ function WorkOrderDetails({ workOrderId, onLogsClick, onAssignClick, onIssueEsca
         })
 
         if (response.ok) {
-          const result = await response.json()
+          const job = await response.json()
           
           // Create a log entry for issue reporting and step regeneration
           try {
@@ -279,7 +329,7 @@ function WorkOrderDetails({ workOrderId, onLogsClick, onAssignClick, onIssueEsca
                 work_order_id: workOrderId,
                 step_id: step.id,
                 agent_action: `Issue reported for Step ${step.step_number || issueReport.stepIndex + 1}: ${issueReport.description}`,
-                result: 'Steps regenerated by AI based on issue description',
+                result: 'Step regeneration queued for the AI agent',
                 source: 'technician',
                 log_type: 'warning',
               }),
@@ -291,8 +341,13 @@ function WorkOrderDetails({ workOrderId, onLogsClick, onAssignClick, onIssueEsca
           // Close the modal first
           setIssueFormOpen(false)
           setSelectedStepIndex(null)
-          // Refresh steps after regeneration
-          await fetchWorkOrderDetails()
+          setIsSubmittingIssue(false)
+          // Regeneration runs in the background; refresh the steps once it is done
+          if (job.job_id) {
+            await followJob(job.job_id, 'Regenerating steps')
+          } else {
+            await fetchWorkOrderDetails({ silent: true })
+          }
         } else {
           const error = await response.json()
           throw new Error(error.error || 'Failed to report issue')
@@ -461,6 +516,16 @@ function WorkOrderDetails({ workOrderId, onLogsClick, onAssignClick, onIssueEsca
         {/* Steps Timeline */}
         <div className="bg-bg-elevated border border-border rounded-lg shadow-sm p-6 relative">
           <h2 className="text-h2 text-text-primary mb-6">Procedure Steps</h2>
+          {agentJob && (
+            <div className="mb-4 flex items-center space-x-2 text-sm text-text-secondary">
+              <span className="inline-block w-2 h-2 rounded-full bg-accent-500 animate-pulse" />
+              <span>
+                {agentJob.label}
+                {agentJob.progress?.current_step != null ? ` (step ${agentJob.progress.current_step})` : ''}
+                {agentJob.status === 'queued' ? ' (queued)' : '...'}
+              </span>
+            </div>
+          )}
           {steps.length === 0 ? (
             <div className="text-sm text-text-tertiary text-center py-8">
               No steps available yet. The agent is generating steps...
@@ -1,13 +1,18 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { motion } from 'framer-motion'
 import WorkOrderRow from './WorkOrderRow'
 import { useReducedMotion } from '../hooks/useReducedMotion'
+import { fetchWorkOrdersPage, appendWorkOrders, WORK_ORDER_PAGE_SIZE, WORK_ORDER_MAX_PAGE_SIZE } from '../utils/api'
 
-function WorkOrdersList({ selectedId, onSelect, searchQuery = '' }) {
+// refreshKey: change it to reload the first page (e.g. after creating a work order)
+function WorkOrdersList({ selectedId, onSelect, searchQuery = '', refreshKey = 0 }) {
   const [workOrders, setWorkOrders] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [filter, setFilter] = useState('all')
   const [error, setError] = useState(null)
+  const loadedCountRef = useRef(0)
   const prefersReducedMotion = useReducedMotion()
 
   useEffect(() => {
@@ -18,7 +23,7 @@ function WorkOrdersList({ selectedId, onSelect, searchQuery = '' }) {
     }, 5000)
     
     return () => clearInterval(interval)
-  }, [])
+  }, [filter, refreshKey])
 
   const fetchWorkOrders = async (showLoading = false) => {
     try {
@@ -26,10 +31,14 @@ function WorkOrdersList({ selectedId, onSelect, searchQuery = '' }) {
         setLoading(true)
       }
       setError(null)
-      const response = await fetch('/api/work_orders')
-      if (!response.ok) throw new Error('Failed to fetch work orders')
-      const data = await response.json()
-      setWorkOrders(data)
+      // A refresh re-reads the rows already loaded, up to the largest page the API serves
+      const limit = showLoading
+        ? WORK_ORDER_PAGE_SIZE
+        : Math.min(Math.max(loadedCountRef.current, WORK_ORDER_PAGE_SIZE), WORK_ORDER_MAX_PAGE_SIZE)
+      const page = await fetchWorkOrdersPage({ limit, status: filter })
+      loadedCountRef.current = page.workOrders.length
+      setWorkOrders(page.workOrders)
+      setNextCursor(page.nextCursor)
     } catch (err) {
       setError(err.message)
       console.error('Error fetching work orders:', err)
@@ -40,6 +49,25 @@ function WorkOrdersList({ selectedId, onSelect, searchQuery = '' }) {
     }
   }
 
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return
+    try {
+      setLoadingMore(true)
+      const page = await fetchWorkOrdersPage({ cursor: nextCursor, status: filter })
+      setWorkOrders(prev => {
+        const merged = appendWorkOrders(prev, page.workOrders)
+        loadedCountRef.current = merged.length
+        return merged
+      })
+      setNextCursor(page.nextCursor)
+    } catch (err) {
+      setError(err.message)
+      console.error('Error fetching work orders:', err)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const filteredWorkOrders = workOrders
     .filter(wo => {
       const matchesFilter = filter === 'all' || wo.status === filter
@@ -121,6 +149,17 @@ function WorkOrdersList({ selectedId, onSelect, searchQuery = '' }) {
             />
           ))
         )}
+        {nextCursor && (
+          <div className="p-4 flex justify-center">
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="px-3 py-1.5 text-xs font-medium rounded bg-bg-secondary text-text-secondary hover:bg-bg-tertiary transition-all duration-150 disabled:opacity-50"
+            >
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   )
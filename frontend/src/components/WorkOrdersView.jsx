@@ -1,21 +1,25 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { fetchWorkOrdersPage, appendWorkOrders } from '../utils/api';
 
 function WorkOrdersView() {
     const [workOrders, setWorkOrders] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [filter, setFilter] = useState('all');
     const navigate = useNavigate();
 
     useEffect(() => {
         fetchWorkOrders();
-    }, []);
+    }, [filter]);
 
+    // First page of the selected status; later pages are appended by loadMore
     const fetchWorkOrders = async () => {
         try {
-            const response = await fetch('/api/work_orders');
-            const data = await response.json();
-            setWorkOrders(data);
+            const page = await fetchWorkOrdersPage({ status: filter });
+            setWorkOrders(page.workOrders);
+            setNextCursor(page.nextCursor);
         } catch (error) {
             console.error('Error fetching work orders:', error);
         } finally {
@@ -23,6 +27,20 @@ function WorkOrdersView() {
         }
     };
 
+    const loadMore = async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchWorkOrdersPage({ cursor: nextCursor, status: filter });
+            setWorkOrders((prev) => appendWorkOrders(prev, page.workOrders));
+            setNextCursor(page.nextCursor);
+        } catch (error) {
+            console.error('Error fetching work orders:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const filteredWorkOrders =
         filter === 'all'
             ? workOrders
@@ -133,7 +151,7 @@ function WorkOrdersView() {
                         <p className="text-slate-500">No work orders found</p>
                     </div>
                 ) : (
-                    filteredWorkOrders.toReversed(workOrder => -workOrder.created_at).map((workOrder) => (
+                    filteredWorkOrders.map((workOrder) => (
                         <div
                             key={workOrder.id}
                             className="bg-white border border-slate-200 rounded-lg shadow-sm hover:bg-slate-50 transition-colors"
@@ -203,6 +221,18 @@ function WorkOrdersView() {
                     ))
                 )}
             </div>
+
+            {nextCursor && (
+                <div className="mt-6 flex justify-center">
+                    <button
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                        className="px-4 py-2 text-sm font-medium rounded bg-white text-slate-600 border border-slate-200 hover:bg-slate-50 transition-colors disabled:opacity-50"
+                    >
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                </div>
+            )}
         </div>
     );
 }
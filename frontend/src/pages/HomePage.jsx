@@ -15,9 +15,28 @@ import EscalatedIssues from '../components/EscalatedIssues'
 import ApprovalRequests from '../components/ApprovalRequests'
 import { useToast } from '../hooks/useToast'
 import { useAuth } from '../contexts/AuthContext'
+import { waitForJob } from '../utils/api'
+
+// Open escalations across all work orders, with work order titles, in one request
+async function loadEscalatedIssues() {
+  const response = await fetch('/api/escalations?status=sent,acknowledged')
+  if (!response.ok) throw new Error('Failed to fetch escalations')
+  const data = await response.json()
+  // Transform API escalations to match component format
+  return data.escalations.map(escalation => ({
+    id: escalation.id,
+    workOrderId: escalation.work_order_id,
+    workOrderTitle: escalation.work_order_title || 'Unknown',
+    description: escalation.message,
+    timestamp: escalation.timestamp,
+    source: escalation.source,
+    status: escalation.status,
+  }))
+}
 
 function HomePage() {
   const [selectedWorkOrderId, setSelectedWorkOrderId] = useState(null)
+  const [workOrdersRefreshKey, setWorkOrdersRefreshKey] = useState(0)
   const [selectedWorkOrder, setSelectedWorkOrder] = useState(null)
   const [searchQuery, setSearchQuery] = useState('')
   const [logsDrawerOpen, setLogsDrawerOpen] = useState(false)
@@ -36,41 +55,7 @@ function HomePage() {
     // Fetch escalated issues from API
     const fetchEscalatedIssues = async () => {
       try {
-        // Get all work orders with escalated status
-        const workOrdersResponse = await fetch('/api/work_orders')
-        if (workOrdersResponse.ok) {
-          const workOrders = await workOrdersResponse.json()
-          const escalatedWorkOrderIds = workOrders
-            .filter(wo => wo.status === 'escalated')
-            .map(wo => wo.id)
-          
-          // Fetch escalations for each escalated work order
-          const allEscalations = []
-          for (const workOrderId of escalatedWorkOrderIds) {
-            try {
-              const escalationsResponse = await fetch(`/api/escalations/work_order/${workOrderId}`)
-              if (escalationsResponse.ok) {
-                const data = await escalationsResponse.json()
-                const workOrder = workOrders.find(wo => wo.id === workOrderId)
-                // Transform API escalations to match component format
-                data.escalations.forEach(escalation => {
-                  allEscalations.push({
-                    id: escalation.id,
-                    workOrderId: workOrderId,
-                    workOrderTitle: workOrder?.title || 'Unknown',
-                    description: escalation.message,
-                    timestamp: escalation.timestamp,
-                    source: escalation.source,
-                    status: escalation.status,
-                  })
-                })
-              }
-            } catch (err) {
-              console.error(`Error fetching escalations for work order ${workOrderId}:`, err)
-            }
-          }
-          setEscalatedIssues(allEscalations)
-        }
+        setEscalatedIssues(await loadEscalatedIssues())
       } catch (err) {
         console.error('Error loading escalated issues:', err)
       }
@@ -84,43 +69,45 @@ function HomePage() {
     }
   }, [isEngineer])
 
-  // Fetch logs for selected work order or all logs
+  // Fetch logs for selected work order or all logs, then stream new ones
   useEffect(() => {
+    const transformLog = (log) => ({
+      id: log.id,
+      message: log.message || log.agent_action || '',
+      type: log.type || log.log_type || 'info',
+      source: log.source || 'agent',
+      timestamp: log.timestamp,
+      result: log.result || '',
+      step_id: log.step_id,
+      step_number: log.step_number,
+    })
+
+    let eventSource = null
+    let cancelled = false
+
+    const subscribeToLogs = (lastEventId) => {
+      const params = new URLSearchParams()
+      if (selectedWorkOrderId) params.set('work_order_id', selectedWorkOrderId)
+      if (lastEventId) params.set('last_event_id', lastEventId)
+      eventSource = new EventSource(`/api/logs/stream?${params.toString()}`)
+      eventSource.addEventListener('log', (event) => {
+        const newLog = transformLog(JSON.parse(event.data))
+        // Newest first, skipping entries we already have
+        setLogs(prevLogs => prevLogs.some(log => log.id === newLog.id) ? prevLogs : [newLog, ...prevLogs])
+      })
+    }
+
     const fetchLogs = async () => {
       try {
-        if (selectedWorkOrderId) {
-          // Fetch logs for selected work order
-          const response = await fetch(`/api/logs/work_order/${selectedWorkOrderId}`)
-          if (response.ok) {
-            const logsData = await response.json()
-            // Transform API logs to match frontend format
-            const transformedLogs = logsData.map(log => ({
-              message: log.message || log.agent_action || '',
-              type: log.type || log.log_type || 'info',
-              source: log.source || 'agent',
-              timestamp: log.timestamp,
-              result: log.result || '',
-              step_id: log.step_id,
-              step_number: log.step_number,
-            }))
-            setLogs(transformedLogs)
-          }
-        } else {
-          // Fetch all logs
-          const response = await fetch('/api/logs')
-          if (response.ok) {
-            const logsData = await response.json()
-            const transformedLogs = logsData.map(log => ({
-              message: log.message || log.agent_action || '',
-              type: log.type || log.log_type || 'info',
-              source: log.source || 'agent',
-              timestamp: log.timestamp,
-              result: log.result || '',
-              step_id: log.step_id,
-              step_number: log.step_number,
-            }))
-            setLogs(transformedLogs)
-          }
+        const url = selectedWorkOrderId ? `/api/logs/work_order/${selectedWorkOrderId}` : '/api/logs'
+        const response = await fetch(url)
+        if (response.ok) {
+          const logsData = await response.json()
+          if (cancelled) return
+          // Transform API logs to match frontend format
+          setLogs(logsData.map(transformLog))
+          // Resume the stream right after the newest log we loaded
+          subscribeToLogs(logsData.length > 0 ? logsData[0].id : null)
         }
       } catch (err) {
         console.error('Error fetching logs:', err)
@@ -128,9 +115,10 @@ function HomePage() {
     }
     
     fetchLogs()
-    // Refresh logs every 3 seconds
-    const interval = setInterval(fetchLogs, 3000)
-    return () => clearInterval(interval)
+    return () => {
+      cancelled = true
+      if (eventSource) eventSource.close()
+    }
   }, [selectedWorkOrderId])
 
   useEffect(() => {
@@ -208,16 +196,19 @@ function HomePage() {
       })
 
       if (response.ok) {
-        const result = await response.json()
-        addToast('Work order created successfully', 'success', `Agent is generating steps for: ${formData.title}`)
+        const job = await response.json()
+        addToast('Work order queued', 'success', `Agent is generating steps for: ${formData.title}`)
         
-        // Get the work order ID from the response or fetch it
-        // The work order was just created, so we need to get its ID
-        // For now, logs will be fetched automatically by the useEffect
-        // Refresh the work orders list by triggering a re-fetch
-        setTimeout(() => {
-          window.location.reload()
-        }, 1000)
+        // The agent creates the work order in the background (202 + job_id);
+        // wait until it exists, then reload the first page of the list and open it
+        try {
+          const created = await waitForJob(job.job_id, { until: (status) => Boolean(status.work_order_id) })
+          setWorkOrdersRefreshKey(key => key + 1)
+          setSelectedWorkOrderId(created.work_order_id)
+        } catch (jobErr) {
+          addToast('Work order creation failed', 'error', jobErr.message)
+          return
+        }
       } else {
         const error = await response.json()
         throw new Error(error.error || 'Failed to create work order')
@@ -269,37 +260,10 @@ function HomePage() {
     // This callback is just for notifications
     addToast('Issue escalated to engineer', 'info', 'Engineers have been notified')
     // Refresh escalated issues list
-    const workOrdersResponse = await fetch('/api/work_orders')
-    if (workOrdersResponse.ok) {
-      const workOrders = await workOrdersResponse.json()
-      const escalatedWorkOrderIds = workOrders
-        .filter(wo => wo.status === 'escalated')
-        .map(wo => wo.id)
-      
-      const allEscalations = []
-      for (const woId of escalatedWorkOrderIds) {
-        try {
-          const escalationsResponse = await fetch(`/api/escalations/work_order/${woId}`)
-          if (escalationsResponse.ok) {
-            const data = await escalationsResponse.json()
-            const workOrder = workOrders.find(wo => wo.id === woId)
-            data.escalations.forEach(escalation => {
-              allEscalations.push({
-                id: escalation.id,
-                workOrderId: woId,
-                workOrderTitle: workOrder?.title || 'Unknown',
-                description: escalation.message,
-                timestamp: escalation.timestamp,
-                source: escalation.source,
-                status: escalation.status,
-              })
-            })
-          }
-        } catch (err) {
-          console.error(`Error fetching escalations:`, err)
-        }
-      }
-      setEscalatedIssues(allEscalations)
+    try {
+      setEscalatedIssues(await loadEscalatedIssues())
+    } catch (err) {
+      console.error(`Error fetching escalations:`, err)
     }
   }
 
@@ -344,6 +308,7 @@ function HomePage() {
               selectedId={selectedWorkOrderId}
               onSelect={setSelectedWorkOrderId}
               searchQuery={searchQuery}
+              refreshKey={workOrdersRefreshKey}
             />
           }
           rightPane={
@@ -22,3 +22,84 @@ export async function apiCall(url, options = {}) {
   return response
 }
 
+// Page sizes of GET /api/work_orders (DEFAULT_PAGE_SIZE and MAX_PAGE_SIZE in routes/work_orders.py)
+export const WORK_ORDER_PAGE_SIZE = 50
+export const WORK_ORDER_MAX_PAGE_SIZE = 200
+
+/**
+ * Fetch one page of work orders, newest first.
+ * Pass the nextCursor of the previous page to get the page after it;
+ * nextCursor is null on the last page.
+ */
+export async function fetchWorkOrdersPage({ cursor, limit = WORK_ORDER_PAGE_SIZE, status, signal } = {}) {
+  const params = new URLSearchParams({ limit: String(limit) })
+  if (cursor) {
+    params.set('cursor', cursor)
+  }
+  if (status && status !== 'all') {
+    params.set('status', status)
+  }
+
+  const response = await fetch(`/api/work_orders?${params}`, { signal })
+  if (!response.ok) {
+    throw new Error('Failed to fetch work orders')
+  }
+  return {
+    workOrders: await response.json(),
+    nextCursor: response.headers.get('X-Next-Cursor'),
+  }
+}
+
+/**
+ * Append a page to the work orders already loaded, skipping any that moved
+ * between pages while they were being read
+ */
+export function appendWorkOrders(loaded, page) {
+  const seen = new Set(loaded.map(wo => wo.id))
+  return [...loaded, ...page.filter(wo => !seen.has(wo.id))]
+}
+
+
+const JOB_POLL_INTERVAL_MS = 1500
+const JOB_TIMEOUT_MS = 10 * 60 * 1000
+
+/**
+ * Poll a background job (/api/jobs/<id>) until it finishes.
+ * Agent work (creating work orders, confirming steps, reporting issues) is
+ * queued by the backend, which answers 202 with a job_id right away.
+ *
+ * Resolves with the finished job (or the first job for which `until(job)` is
+ * true), rejects with the job's error if it failed.
+ * onUpdate is called with the job after every poll; pass an AbortSignal to stop polling.
+ */
+export async function waitForJob(jobId, { onUpdate, until, signal, interval = JOB_POLL_INTERVAL_MS, timeout = JOB_TIMEOUT_MS } = {}) {
+  const deadline = Date.now() + timeout
+
+  while (true) {
+    if (signal?.aborted) {
+      throw new DOMException('Stopped waiting for job', 'AbortError')
+    }
+
+    const response = await fetch(`/api/jobs/${jobId}`, { signal })
+    if (!response.ok) {
+      const error = await response.json().catch(() => ({}))
+      throw new Error(error.error || 'Failed to fetch job status')
+    }
+    const job = await response.json()
+    if (onUpdate) {
+      onUpdate(job)
+    }
+
+    if (job.status === 'succeeded' || (until && until(job))) {
+      return job
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Job failed')
+    }
+    if (Date.now() > deadline) {
+      throw new Error('Timed out waiting for the agent to finish')
+    }
+
+    await new Promise(resolve => setTimeout(resolve, interval))
+  }
+}